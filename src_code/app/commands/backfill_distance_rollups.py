@@ -0,0 +1,29 @@
+# app/commands/backfill_distance_rollups.py
+"""
+Rebuild `distance_hourly` rollups from raw analytics_data.
+
+Run from src_code/:
+    python -m app.commands.backfill_distance_rollups --days 2
+    python -m app.commands.backfill_distance_rollups --imei 862360073414729 --days 30
+
+Safe to re-run: every touched hour is overwritten with the recomputed value.
+"""
+import asyncio
+import argparse
+from app.models import init_db
+from app.services.DistanceRollupService import backfill
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill hourly distance rollups")
+    parser.add_argument("--imei", action="append", help="IMEI to backfill (repeatable). Defaults to every IMEI with data in range.")
+    parser.add_argument("--days", type=int, default=2, help="How many days of history to rebuild")
+    args = parser.parse_args()
+
+    await init_db()
+    total = await backfill(imeis=args.imei, days=args.days)
+    print(f"distance_hourly backfill done: {total} hourly rows written")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
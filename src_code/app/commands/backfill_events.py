@@ -0,0 +1,31 @@
+# app/commands/backfill_events.py
+"""
+Rebuild `device_events` (overspeed / temperature / battery / SOS / signal episodes) from raw
+analytics_data.
+
+Run from src_code/:
+    python -m app.commands.backfill_events --days 7
+    python -m app.commands.backfill_events --imei 862360073414729 --days 30
+
+Safe to re-run: each device is re-extracted from the first episode still running at the
+start of the range, replacing everything after it.
+"""
+import asyncio
+import argparse
+from app.models import init_db
+from app.services.EventService import backfill
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill device event episodes")
+    parser.add_argument("--imei", action="append", help="IMEI to backfill (repeatable). Defaults to every IMEI with data in range.")
+    parser.add_argument("--days", type=int, default=7, help="How many days of history to rebuild")
+    args = parser.parse_args()
+
+    await init_db()
+    total = await backfill(imeis=args.imei, days=args.days)
+    print(f"device_events backfill done: {total} episodes written")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
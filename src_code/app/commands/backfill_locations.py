@@ -0,0 +1,34 @@
+# app/commands/backfill_locations.py
+"""
+Set the GeoJSON `location` field on analytics_data packets that lack it.
+
+Run from src_code/:
+    python -m app.commands.backfill_locations
+    python -m app.commands.backfill_locations --batch-size 2000
+
+Resumable: progress is checkpointed after every batch; re-running continues from there.
+Not needed for the time-series collection: the time-series copy writes location itself.
+"""
+import asyncio
+import argparse
+from app.models import init_db
+from app.config.config import settings
+from app.services.GeoService import backfill
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill GeoJSON locations on analytics_data")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if settings.ANALYTICS_TIMESERIES_ENABLED:
+        print("Time-series mode: locations are written by ingest and the time-series copy; nothing to do")
+        return
+
+    await init_db()
+    updated, skipped = await backfill(args.batch_size)
+    print(f"location backfill done: {updated} packets updated, {skipped} without a usable fix")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
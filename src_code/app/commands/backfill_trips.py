@@ -0,0 +1,30 @@
+# app/commands/backfill_trips.py
+"""
+Rebuild `device_trips` (trip / stop segments) from raw analytics_data.
+
+Run from src_code/:
+    python -m app.commands.backfill_trips --days 7
+    python -m app.commands.backfill_trips --imei 862360073414729 --days 30
+
+Safe to re-run: each device is re-segmented from the last segment that closed before the
+range, replacing everything after it.
+"""
+import asyncio
+import argparse
+from app.models import init_db
+from app.services.TripService import backfill
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill trip / stop segments")
+    parser.add_argument("--imei", action="append", help="IMEI to backfill (repeatable). Defaults to every IMEI with data in range.")
+    parser.add_argument("--days", type=int, default=7, help="How many days of history to rebuild")
+    args = parser.parse_args()
+
+    await init_db()
+    total = await backfill(imeis=args.imei, days=args.days)
+    print(f"device_trips backfill done: {total} closed segments written")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
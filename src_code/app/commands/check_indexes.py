@@ -0,0 +1,27 @@
+# app/commands/check_indexes.py
+"""
+Compare declared indexes (app/models/*.INDEXES) with what exists in Mongo.
+
+Run from src_code/:
+    python -m app.commands.check_indexes            # report only
+    python -m app.commands.check_indexes --apply    # also build missing indexes, then drop retired ones
+"""
+import json
+import asyncio
+import argparse
+from app.models import init_db, get_db
+from app.models.IndexRegistry import ensure_indexes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Report / apply the declared index registry")
+    parser.add_argument("--apply", action="store_true", help="Build missing indexes and drop retired ones")
+    args = parser.parse_args()
+
+    await init_db()
+    report = await ensure_indexes(get_db(), apply=args.apply)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+# app/commands/migrate_analytics_timeseries.py
+"""
+Copy analytics_data into the native time-series collection (ANALYTICS_TIMESERIES_COLLECTION).
+
+Run from src_code/:
+    python -m app.commands.migrate_analytics_timeseries
+    python -m app.commands.migrate_analytics_timeseries --follow          # keep tailing until stopped
+    python -m app.commands.migrate_analytics_timeseries --stats-only
+
+Resumable: progress is checkpointed after every batch; re-running continues from there.
+See app/services/AnalyticsTimeseriesService.py for the cut-over steps.
+"""
+import json
+import asyncio
+import argparse
+from app.models import init_db, get_db
+from app.services.AnalyticsTimeseriesService import migrate, storage_report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate analytics_data to a time-series collection")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--overlap-sec", type=int, default=300, help="Re-verify this much history behind the checkpoint on resume, and behind the newest copied packet after each --follow catch-up")
+    parser.add_argument("--follow", action="store_true", help="Keep copying new packets after catching up")
+    parser.add_argument("--stats-only", action="store_true", help="Only print storage / index sizes of both collections")
+    args = parser.parse_args()
+
+    await init_db()
+    if not args.stats_only:
+        copied, skipped = await migrate(args.batch_size, args.overlap_sec, args.follow)
+        print(f"time-series copy done: {copied} copied, {skipped} skipped (no device_timestamp)")
+    print(json.dumps(await storage_report(get_db()), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+# app/commands/migrate_telemetry_v2.py
+"""
+Upgrade analytics_data packets to the v2 shape (typed numeric fields + location).
+
+Run from src_code/:
+    python -m app.commands.migrate_telemetry_v2
+    python -m app.commands.migrate_telemetry_v2 --batch-size 2000
+
+Resumable: progress is checkpointed after every batch; re-running continues from there.
+Not needed for the time-series collection: the time-series copy writes v2 documents.
+"""
+import asyncio
+import argparse
+from app.models import init_db
+from app.config.config import settings
+from app.services.TelemetrySchemaService import migrate
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate analytics_data to telemetry schema v2")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if settings.ANALYTICS_TIMESERIES_ENABLED:
+        print("Time-series mode: packets are written as v2 by ingest and the time-series copy; nothing to do")
+        return
+
+    await init_db()
+    upgraded = await migrate(args.batch_size)
+    print(f"telemetry v2 migration done: {upgraded} packets upgraded")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
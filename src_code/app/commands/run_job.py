@@ -0,0 +1,40 @@
+# app/commands/run_job.py
+"""
+Run a scheduled job once, now, under the same Redis lease the scheduler uses.
+
+Run from src_code/:
+    python -m app.commands.run_job daily_uptime
+    python -m app.commands.run_job daily_alerts --reset     # forget the checkpoint, redo the backfill window
+
+Exits without running if another replica holds the job's lease.
+"""
+import json
+import asyncio
+import argparse
+from app.models import init_db, get_db
+from app.models.JobState import JobState
+from app.middleware.redis_rate_limiter import init_redis
+from app.services.JobSchedulerService import register_job, run_job
+from app.services.JobRegistry import JOB_REGISTRY
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a scheduled job once")
+    parser.add_argument("name", choices=sorted(JOB_REGISTRY))
+    parser.add_argument("--reset", action="store_true", help="Clear the job's checkpoint before running")
+    args = parser.parse_args()
+
+    await init_db()
+    await init_redis()
+    for name, job in JOB_REGISTRY.items():
+        register_job(name, job)
+
+    if args.reset:
+        await get_db().get_collection(JobState).update_one({"name": args.name}, {"$set": {"checkpoint": None}})
+
+    result = await run_job(args.name)
+    print(json.dumps(result, indent=2) if result else f"{args.name} not run: lease held elsewhere or Redis unavailable")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,9 @@
+# Cron schedule (minute hour day-of-month month day-of-week, IST) per scheduled job.
+# Jobs not listed here never run on a timer; they can still be run with app.commands.run_job.
+JOB_SCHEDULE = {
+    "daily_uptime": "20 0 * * *",       # after midnight IST, once yesterday is complete
+    "daily_distance": "25 0 * * *",
+    "daily_alerts": "30 0 * * *",
+    "geo_grid": "*/15 * * * *",        # adds every complete hour (see GridRollupService)
+    "trip_rebuild": "* * * * *",        # devices marked by late packets (see TripService)
+}
@@ -0,0 +1,7 @@
+# Result cache TTL (seconds) per resolver. The TTL is also the time bucket in the cache
+# key, so a cached result is never served past one bucket even without new packets.
+RESULT_CACHE_TTL = {
+    "analyticsHealth": 60,          # health window moves with every packet
+    "analyticsUptime": 150,         # one normal sending interval
+    "analyticsDistance24": 300,     # hourly buckets; the open hour only grows slowly
+}
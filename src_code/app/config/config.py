@@ -119,6 +119,30 @@ class Settings(BaseSettings):
     TATA_API_KEY: str
     TATA_INITIATOR_ID: str
     TATA_COOKIE: str
+
+    # Analytics
+    ENSURE_INDEXES_ON_STARTUP: bool = True
+    DISTANCE_ROLLUPS_ENABLED: bool = False
+    LAST_STATE_REDIS_ENABLED: bool = False    # share last-known state across workers via Redis
+    LAST_STATE_STALE_SEC: int = 600           # lastPositions marks a device stale after this
+    RECENT_WINDOW_MAX_DEVICES: int = 10000    # health ring buffers held in memory (~9 KB each)
+    RECENT_WINDOW_IDLE_SEC: int = 3600        # drop a device's buffer after this long unread
+    RESULT_CACHE_ENABLED: bool = False        # Redis result cache (TTLs in config/ResultCacheTTL.py)
+    ANALYTICS_TIMESERIES_ENABLED: bool = False            # read telemetry from the time-series collection
+    ANALYTICS_TIMESERIES_COLLECTION: str = "analytics_data_ts"
+    ANALYTICS_TAIL_POLL_SEC: float = 2.0                  # time-series mode: insert poll period
+    ANALYTICS_TAIL_OVERLAP_SEC: int = 10                  # ...re-read window for ObjectId clock skew between writers
+    INSERT_QUEUE_SIZE: int = 10000            # inserts buffered for the insert handlers (backpressure past this)
+    SCHEDULER_ENABLED: bool = False           # run materialization jobs (schedules in config/JobSchedule.py)
+    SCHEDULER_TICK_SEC: int = 30
+    JOB_LEASE_TTL_SEC: int = 60               # Redis lease per job; renewed while the job runs
+    MATERIALIZE_BACKFILL_DAYS: int = 7        # days a daily job fills in on its first run
+    TRIPS_ENABLED: bool = False               # segment GPS streams into trips/stops on ingest
+    GEOFENCE_ENGINE_ENABLED: bool = False     # evaluate geofence_data polygons on ingest
+    GEOFENCE_RELOAD_SEC: int = 60             # full polygon reload (picks up other workers' changes)
+    GEO_LOCATION_ENABLED: bool = False        # set GeoJSON location on inserted packets
+    TELEMETRY_V2_ENABLED: bool = False        # upgrade inserted packets to schema v2 (includes location)
+    DEVICE_EVENTS_ENABLED: bool = False       # extract overspeed/temperature/battery/SOS/signal episodes on ingest
     class Config:
         env_file = str(ENV_FILE)
         extra = "allow"
@@ -2,121 +2,178 @@
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from bson import ObjectId
-from dateutil import parser
 from typing import Any
+from functools import lru_cache
 
 from app.models import get_db
-from app.models.AnalyticsData import AnalyticsData
+from app.models.AnalyticsData import AnalyticsData, analytics_collection
 from app.controllers.APIResponse import APIResponse
+from app.utils.timestamps import iso_format
+from app.utils.telemetry import SCHEMA_VERSION, parse_temperature
+
+def _id_str(v: Any):
+    return str(v or "")
+
+
+# API key -> (Mongo document key, converter). Order is the response key order.
+# A (typed key, text key) source reads the typed v2 field as is and falls back to
+# converting the text for packets not upgraded to v2 yet (see app.utils.telemetry).
+SERIALIZE_FIELDS = {
+    "id": ("_id", _id_str),
+    "topic": ("topic", None),
+    "imei": ("imei", None),
+    "interval": ("interval", None),
+
+    "geoid": ("Geoid", None),
+    "packet": ("packet", None),
+    "latitude": ("latitude", None),
+    "longitude": ("longitude", None),
+    "speed": ("speed", None),
+
+    "battery": ("Battery", None),
+    "signal": ("Signal", None),
+    "temperature": (("temperature", "raw_temperature"), parse_temperature),
+    "alert": ("Alert", None),
+
+    # UI HEADER → ALWAYS device_timestamp (server IST time) in ISO
+    "deviceTimestamp": ("device_timestamp", iso_format),
+
+    # device raw timestamp (string as device sent)
+    "deviceRawTimestamp": ("device_raw_timestamp", None),
+
+    # UI LIST SORTING → using device_timestamp as the canonical sortable timestamp
+    "timestamp": ("device_timestamp", iso_format),
+
+    # RAW flattened fields (camelCase)
+    "rawPacket": ("raw_packet", None),
+    "rawImei": ("raw_imei", None),
+    "rawAlert": ("raw_Alert", None),
+    "rawTemperature": ("raw_temperature", None),
+    "rawSpeed": ("raw_speed", None),
+    "rawSignal": ("raw_Signal", None),
+    "rawBattery": ("raw_Battery", None),
+    "rawGeoid": ("raw_Geoid", None),
+    "rawLatitude": ("raw_latitude", None),
+    "rawLongitude": ("raw_longitude", None),
+    "rawInterval": ("raw_interval", None),
+    "rawBody": ("raw_body", None),
+    "rawPhone1": ("raw_phonenum1", None),
+    "rawPhone2": ("raw_phonenum2", None),
+    "rawControlPhone": ("raw_controlroomnum", None),
+    "rawNormalSendingInterval": ("raw_NormalSendingInterval", None),
+    "rawSOSSendingInterval": ("raw_SOSSendingInterval", None),
+    "rawNormalScanningInterval": ("raw_NormalScanningInterval", None),
+    "rawAirplaneInterval": ("raw_AirplaneInterval", None),
+    "rawSpeedLimit": ("raw_SpeedLimit", None),
+    "rawLowbatLimit": ("raw_LowbatLimit", None),
+    "type": ("type", None),
+}
+
+
+def projection_for(fields) -> dict:
+    """Mongo projection covering only the given API keys (unknown keys are ignored)."""
+    sources = set()
+    for f in fields:
+        if f not in SERIALIZE_FIELDS:
+            continue
+        src = SERIALIZE_FIELDS[f][0]
+        if isinstance(src, tuple):
+            sources.update(src)
+            sources.add("schema_version")
+        else:
+            sources.add(src)
+    if not sources:
+        return {"_id": 1}
+
+    projection = {src: 1 for src in sources}
+    if "_id" not in sources:
+        projection["_id"] = 0
+    return projection
+
+
+@lru_cache(maxsize=256)
+def compile_serializer(fields: tuple[str, ...] | None = None):
+    """
+    Row mapper for a fixed set of API keys, resolved against SERIALIZE_FIELDS once.
+    Compile per request and apply per row: the hot loop is a single dict comprehension,
+    with typed v2 fields only re-derived from their text on packets that are not v2.
+    """
+    keys = SERIALIZE_FIELDS if fields is None else fields
+    plan, fallbacks = [], []
+    for key in keys:
+        if key not in SERIALIZE_FIELDS:
+            continue
+        src, convert = SERIALIZE_FIELDS[key]
+        if isinstance(src, tuple):
+            typed, text = src
+            plan.append((key, typed, None))
+            fallbacks.append((key, text, convert))
+        else:
+            plan.append((key, src, convert))
+    plan, fallbacks = tuple(plan), tuple(fallbacks)
+
+    def to_row(doc) -> dict:
+        get = doc.get
+        row = {key: convert(get(src)) if convert else get(src) for key, src, convert in plan}
+        if fallbacks and get("schema_version") != SCHEMA_VERSION:
+            for key, text, convert in fallbacks:
+                row[key] = convert(get(text))
+        return row
+
+    return to_row
+
+
+def serialize_document(doc: dict, fields=None) -> dict:
+    """Serialize a raw analytics_data document; with `fields`, only those API keys are built."""
+    return compile_serializer(None if fields is None else tuple(fields))(doc)
 
-def parse_date(v: Any):
-    if not v:
-        return None
-    # If it's already a datetime, return isoformat
-    try:
-        if hasattr(v, "isoformat"):
-            return v.isoformat()
-        return parser.parse(str(v)).isoformat()
-    except:
-        return str(v)
 
 def serialize(rec: AnalyticsData):
-    # rec is an ODMantic model instance
+    # rec is an ODMantic model instance (ODMantic exposes _id as 'id')
     d = rec.dict()
+    d["_id"] = d.pop("id", None)
+    return serialize_document(d)
+
+
+async def find_serialized(query: dict, fields=None, sort=None, skip: int = 0, limit: int = 0) -> list[dict]:
+    """Raw-cursor read: projected find + compiled field mapper (see SERIALIZE_FIELDS)."""
+    to_row = compile_serializer(None if fields is None else tuple(fields))
+    cursor = analytics_collection(get_db()).find(
+        query, projection_for(SERIALIZE_FIELDS if fields is None else fields), sort=sort, skip=skip, limit=limit
+    )
+    return [to_row(d) async for d in cursor]
 
-    # Convert _id → string (ODMantic uses 'id' attribute)
-    d["id"] = str(d.get("id") or d.get("_id") or "")
-    d.pop("_id", None)
-
-    # Use device_timestamp (datetime) as canonical sorting/display timestamp
-    device_ts = d.get("device_timestamp")  # this is a datetime object (tz-aware) or None
-
-    return {
-        "id": d.get("id"),
-        "topic": d.get("topic"),
-        "imei": d.get("imei"),
-        "interval": d.get("interval"),
-
-        "geoid": d.get("Geoid"),
-        "packet": d.get("packet"),
-        "latitude": d.get("latitude"),
-        "longitude": d.get("longitude"),
-        "speed": d.get("speed"),
-
-        "battery": d.get("Battery"),
-        "signal": d.get("Signal"),
-        "alert": d.get("Alert"),
-
-        # UI HEADER → ALWAYS device_timestamp (server IST time) in ISO
-        "deviceTimestamp": parse_date(device_ts),
-
-        # device raw timestamp (string as device sent)
-        "deviceRawTimestamp": d.get("device_raw_timestamp"),
-
-        # UI LIST SORTING → using device_timestamp as the canonical sortable timestamp
-        "timestamp": parse_date(device_ts),
-
-        # RAW flattened fields (camelCase)
-        "rawPacket": d.get("raw_packet"),
-        "rawImei": d.get("raw_imei"),
-        "rawAlert": d.get("raw_Alert"),
-        "rawTemperature": d.get("raw_temperature"),
-        "rawSpeed": d.get("raw_speed"),
-        "rawSignal": d.get("raw_Signal"),
-        "rawBattery": d.get("raw_Battery"),
-        "rawGeoid": d.get("raw_Geoid"),
-        "rawLatitude": d.get("raw_latitude"),
-        "rawLongitude": d.get("raw_longitude"),
-        "rawInterval": d.get("raw_interval"),
-        "rawBody": d.get("raw_body"),
-        "rawPhone1": d.get("raw_phonenum1"),
-        "rawPhone2": d.get("raw_phonenum2"),
-        "rawControlPhone": d.get("raw_controlroomnum"),
-        "rawNormalSendingInterval": d.get("raw_NormalSendingInterval"),
-        "rawSOSSendingInterval": d.get("raw_SOSSendingInterval"),
-        "rawNormalScanningInterval": d.get("raw_NormalScanningInterval"),
-        "rawAirplaneInterval": d.get("raw_AirplaneInterval"),
-        "rawSpeedLimit": d.get("raw_SpeedLimit"),
-        "rawLowbatLimit": d.get("raw_LowbatLimit"),
-        "type": d.get("type"),
-    }
 
 class AnalyticsDataController:
+    # Read-only endpoints iterate the raw Motor cursor and map through the compiled
+    # field table — no ODMantic model is built per row.
 
     async def all(self, request: Request):
-        db = get_db()
-        recs = await db.find(AnalyticsData)
-        return JSONResponse(APIResponse.success("ok", [serialize(r) for r in recs]))
+        return JSONResponse(APIResponse.success("ok", await find_serialized({})))
 
     async def by_id(self, id: str, request: Request):
         db = get_db()
         try:
-            rec = await db.find_one(AnalyticsData, {"_id": ObjectId(id)})
+            doc = await analytics_collection(db).find_one({"_id": ObjectId(id)}, projection_for(SERIALIZE_FIELDS))
         except:
             return JSONResponse(APIResponse.error("Invalid ID", 400), 400)
 
-        if not rec:
+        if not doc:
             return JSONResponse(APIResponse.error("Not found", 404), 404)
 
-        return JSONResponse(APIResponse.success("ok", serialize(rec)))
+        return JSONResponse(APIResponse.success("ok", serialize_document(doc)))
 
     async def by_topic(self, topic: str, request: Request):
-        db = get_db()
-        recs = await db.find(AnalyticsData, {"topic": topic})
-        return JSONResponse(APIResponse.success("ok", [serialize(r) for r in recs]))
+        return JSONResponse(APIResponse.success("ok", await find_serialized({"topic": topic})))
 
     async def by_imei(self, imei: str, request: Request):
-        db = get_db()
-        recs = await db.find(AnalyticsData, {"imei": imei})
-        return JSONResponse(APIResponse.success("ok", [serialize(r) for r in recs]))
+        return JSONResponse(APIResponse.success("ok", await find_serialized({"imei": imei})))
 
     async def paginated(self, skip: int, limit: int, request: Request):
-        db = get_db()
-        recs = await db.find(AnalyticsData)
-        sliced = recs[skip:skip + limit]
-        return JSONResponse(APIResponse.success("ok", [serialize(r) for r in sliced]))
+        rows = await find_serialized({}, sort=[("device_timestamp", -1)], skip=skip, limit=limit)
+        return JSONResponse(APIResponse.success("ok", rows))
 
     async def count(self, request: Request):
         db = get_db()
-        count = await db.count(AnalyticsData)
+        count = await analytics_collection(db).estimated_document_count()
         return JSONResponse(APIResponse.success("ok", {"count": count}))
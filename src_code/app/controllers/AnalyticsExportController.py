@@ -0,0 +1,41 @@
+# app/controllers/AnalyticsExportController.py
+from datetime import datetime
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.helpers.CursorHelper import CursorHelper
+from app.controllers.APIResponse import APIResponse
+from app.services.AnalyticsExportService import (
+    export_fields,
+    export_query,
+    iter_documents,
+    stream_csv,
+    stream_ndjson,
+)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class AnalyticsExportController:
+
+    @staticmethod
+    async def export(imei: str | None = None, topic: str | None = None, start: datetime | None = None,
+                     end: datetime | None = None, fields: str | None = None, format: str = "ndjson",
+                     cursor: str | None = None, limit: int = 0):
+        # Everything that can fail is checked here: once streaming starts the status is already sent
+        if format not in MEDIA_TYPES:
+            return JSONResponse(APIResponse.error("format must be ndjson or csv", 400), 400)
+        try:
+            keys = export_fields(fields)
+            if cursor:
+                CursorHelper.decode(cursor)
+        except ValueError as e:
+            return JSONResponse(APIResponse.error(str(e), 400), 400)
+
+        documents = iter_documents(export_query(imei, topic, start, end), keys, cursor, limit)
+        body = stream_csv(documents, keys) if format == "csv" else stream_ndjson(documents, keys)
+
+        filename = f"telemetry-{imei or 'all'}.{format}"
+        return StreamingResponse(
+            body,
+            media_type=MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
@@ -3,15 +3,15 @@
 import json
 import logging
 from app.models import get_db
-from zoneinfo import ZoneInfo
+from app.config.config import settings
 from fastapi import HTTPException
 from datetime import datetime, timezone
 from app.models.GeofenceData import GeofenceData
 from app.models.DeviceCommand import DeviceCommand
 from app.libraries.MqttConnector import mqtt_connector
 from app.constants.CommandDefinitions import COMMAND_DEFINITIONS
-
-IST = ZoneInfo("Asia/Kolkata")
+from app.services.GeofenceService import refresh_imei as refresh_geofences
+from app.utils.timestamps import IST
 
 class CommandController:
 
@@ -89,6 +89,8 @@ class CommandController:
         # 🔥 SAVE GEOFENCE DATA ON SUCCESSFUL API RESPONSE
         if command_req.command == "SET_GEOFENCE":
             await db.save(GeofenceData(imei=command_req.imei, geofence_number=command_req.params["geofence_number"], geofence_id=command_req.params["geofence_id"], coordinates=command_req.params["coordinates"], created_at=created_at_ist))
+            if settings.GEOFENCE_ENGINE_ENABLED:
+                await refresh_geofences(db, command_req.imei)
 
         return {
             "status": "SENT",
@@ -1,5 +1,5 @@
 from app.models import get_db
-from app.models.AnalyticsData import AnalyticsData
+from app.models.AnalyticsData import AnalyticsData, analytics_collection
 
 class CommandResponseController:
 
@@ -7,10 +7,10 @@ class CommandResponseController:
     async def get_config_or_misc(imei: str, limit: int = 1000):
         db = get_db()
 
-        return await db.find(
-            AnalyticsData,
-            AnalyticsData.type == "config_or_misc",
-            AnalyticsData.topic == f"{imei}/pub",
-            sort=AnalyticsData.device_timestamp.desc(),
+        docs = await analytics_collection(db).find(
+            {"type": "config_or_misc", "topic": f"{imei}/pub"},
+            sort=[("device_timestamp", -1)],
             limit=limit
-        )
+        ).to_list(None)
+
+        return [AnalyticsData.model_validate_doc(d) for d in docs]
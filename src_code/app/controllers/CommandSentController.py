@@ -1,5 +1,6 @@
 from app.models import get_db
 from fastapi import HTTPException
+from app.helpers.CursorHelper import CursorHelper
 from app.models.DeviceCommand import DeviceCommand
 
 
@@ -16,6 +17,22 @@ class CommandSentController:
             limit=limit
         )
 
+    @staticmethod
+    async def page_by_imei(imei: str, limit: int = 100, cursor: str | None = None):
+        db = get_db()
+
+        try:
+            commands, next_cursor, has_more = await CursorHelper.page(db, DeviceCommand, {"imei": imei}, "created_at", limit, cursor)
+        except ValueError:
+            raise HTTPException(400, "Invalid cursor")
+
+        return {
+            "imei": imei,
+            "data": commands,
+            "nextCursor": next_cursor,
+            "hasMore": has_more
+        }
+
     @staticmethod
     async def latest_by_imei(imei: str):
         db = get_db()
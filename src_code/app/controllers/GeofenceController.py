@@ -1,4 +1,6 @@
 from app.models import get_db
+from fastapi import HTTPException
+from app.helpers.CursorHelper import CursorHelper
 from app.models.GeofenceData import GeofenceData
 
 
@@ -20,3 +22,22 @@ class GeofenceController:
             "count": len(geofences),
             "data": geofences
         }
+
+    @staticmethod
+    async def page_by_imei(imei: str, limit: int = 100, cursor: str | None = None):
+        db = get_db()
+
+        try:
+            geofences, next_cursor, has_more = await CursorHelper.page(
+                db, GeofenceData, {"imei": imei}, "created_at", limit, cursor, descending=False
+            )
+        except ValueError:
+            raise HTTPException(400, "Invalid cursor")
+
+        return {
+            "imei": imei,
+            "count": len(geofences),
+            "data": geofences,
+            "nextCursor": next_cursor,
+            "hasMore": has_more
+        }
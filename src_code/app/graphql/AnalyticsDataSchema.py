@@ -1,31 +1,28 @@
 # app/graphql/AnalyticsDataSchema.py
 import strawberry
+from typing import Annotated
+from strawberry.types import Info
 from bson import ObjectId
-from dateutil import parser
-from zoneinfo import ZoneInfo
 from app.models import get_db
-from statistics import stdev, mean
-from collections import defaultdict
+from app.helpers.CursorHelper import CursorHelper
 from math import radians, sin, cos, atan2, sqrt
-from app.models.AnalyticsData import AnalyticsData
+from app.models.AnalyticsData import analytics_collection
 from datetime import datetime, timedelta, timezone
-from app.controllers.AnalyticsDataController import serialize
-
-IST = ZoneInfo("Asia/Kolkata")
-
-# -----------------------------
-# TIMESTAMP UTIL
-# -----------------------------
-def parse_iso_to_ist(dt_str):
-    if not dt_str:
-        return None
-    try:
-        dt = parser.parse(str(dt_str))
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=IST)
-        return dt.astimezone(IST)
-    except:
-        return None
+from app.helpers.GraphQLHelper import GraphQLHelper
+from app.utils.timestamps import IST, iso_format, to_ist_naive
+from app.controllers.AnalyticsDataController import serialize_document, projection_for, compile_serializer
+from app.graphql.AnalyticsLoaders import AnalyticsLoaders
+from app.services.AnalyticsBatchService import distance24_by_imei, MAX_BATCH_IMEIS
+from app.services.LastKnownStateService import last_positions
+from app.services.UptimeService import window_hours
+from app.services.MaterializationService import daily_stats
+from app.services.JobSchedulerService import job_status
+from app.services.TripService import device_trips
+from app.services.TrackService import device_track
+from app.services.GeoService import devices_near, within_query, MAX_NEAR_MINUTES, MAX_WITHIN_ROWS
+from app.services.GridRollupService import heatmap
+from app.services.GeofenceReportService import dwell_report
+from app.services.EventService import device_events, event_counts
 
 # -----------------------------
 # HAVERSINE
@@ -54,140 +51,148 @@ def haversine_km(lat1, lon1, lat2, lon2):
 async def compute_distance_last_24_hours(db, imei):
     now_ist = datetime.now(timezone.utc).astimezone(IST)
     cutoff = now_ist - timedelta(hours=24)
+    return (await distance24_by_imei(db, [imei], cutoff)).get(imei, [])
 
-    recs = await db.find(AnalyticsData, {"imei": imei, "device_timestamp": {"$gte": cutoff}}, sort=AnalyticsData.device_timestamp.asc())
-    if not recs:
-        return []
-
-    points = []
-    for r in recs:
-        raw_ts = (
-            getattr(r, "device_timestamp", None)
-            or getattr(r, "deviceTimestamp", None)
-            or getattr(r, "timestamp", None)
-        )
-
-        dt = parse_iso_to_ist(raw_ts)
-        if not dt or dt < cutoff:
-            continue
-
-        points.append({
-            "dt": dt,
-            "lat": getattr(r, "latitude", None),
-            "lon": getattr(r, "longitude", None),
-        })
-
-    if not points:
-        return []
-
-    points.sort(key=lambda x: x["dt"])
-
-    # Remove consecutive identical points
-    unique_pts = []
-    last = (None, None)
-
-    for p in points:
-        lat, lon = p["lat"], p["lon"]
-        try:
-            latf, lonf = float(lat), float(lon)
-        except:
-            unique_pts.append(p)
-            last = (lat, lon)
-            continue
-
-        if last == (latf, lonf):
-            continue
-
-        unique_pts.append(p)
-        last = (latf, lonf)
-
-    if len(unique_pts) < 2:
-        return []
+@strawberry.type
+class AnalyticsDataType:
+    # Defaults let resolvers build the type from only the fields the query selected
+    id: str | None = None
+    topic: str | None = None
+    imei: str | None = None
+    interval: int | None = None
 
-    buckets = defaultdict(float)
-    running = 0.0
+    geoid: str | None = None
+    packet: str | None = None
 
-    for i in range(1, len(unique_pts)):
-        a = unique_pts[i-1]
-        b = unique_pts[i]
+    latitude: str | None = None
+    longitude: str | None = None
+    speed: float | None = None
 
-        if not a["lat"] or not a["lon"] or not b["lat"] or not b["lon"]:
-            continue
+    battery: str | None = None
+    signal: str | None = None
+    temperature: float | None = None
+    alert: str | None = None
 
-        dist = haversine_km(a["lat"], a["lon"], b["lat"], b["lon"])
-        hour_key = b["dt"].replace(minute=0, second=0, microsecond=0)
-        buckets[hour_key] += dist
+    # PRIMARY field used by frontend for sorting/display
+    timestamp: str | None = None
+
+    deviceTimestamp: str | None = None
+    deviceRawTimestamp: str | None = None
+
+    rawPacket: str | None = None
+    rawImei: str | None = None
+    rawAlert: str | None = None
+    rawTemperature: str | None = None
+    rawSpeed: str | None = None
+    rawSignal: str | None = None
+    rawBattery: str | None = None
+    rawGeoid: str | None = None
+    rawLatitude: str | None = None
+    rawLongitude: str | None = None
+    rawInterval: str | None = None
+    rawBody: str | None = None
+    rawPhone1: str | None = None
+    rawPhone2: str | None = None
+    rawControlPhone: str | None = None
+    rawNormalSendingInterval: str | None = None
+    rawSOSSendingInterval: str | None = None
+    rawNormalScanningInterval: str | None = None
+    rawAirplaneInterval: str | None = None
+    rawSpeedLimit: str | None = None
+    rawLowbatLimit: str | None = None
+    type: str | None = None
 
-    out = []
-    current = cutoff.replace(minute=0, second=0, microsecond=0)
 
-    for i in range(24):
-        slot = current + timedelta(hours=i + 1)
-        dist = round(buckets.get(slot, 0.0), 3)
-        running += dist
-        out.append({
-            "hour": slot.strftime("%H:00"),
-            "dateHour": slot.isoformat(),
-            "distance": dist,
-            "cumulative": round(running, 3)
-        })
+@strawberry.type
+class AnalyticsDataPageType:
+    items: list[AnalyticsDataType]
+    nextCursor: str | None
+    hasMore: bool
 
-    return out
 
 @strawberry.type
-class AnalyticsDataType:
-    id: str | None
-    topic: str | None
-    imei: str | None
-    interval: int | None
+class DistanceBucketType:
+    hour: str | None
+    dateHour: str | None
+    distance: float | None
+    cumulative: float | None
 
-    geoid: str | None
-    packet: str | None
+@strawberry.type
+class LastPositionType:
+    imei: str
+    latitude: str | None
+    longitude: str | None
+    speed: float | None
+    deviceTimestamp: str | None
+    ageSec: float | None          # seconds since device_timestamp
+    stale: bool                   # no fix within staleAfterSec
+    source: str                   # memory | redis | mongo
+    cachedAt: float               # epoch seconds the state was cached / read
 
+@strawberry.type
+class NearbyDeviceType:
+    # Newest fix of the device inside the circle
+    imei: str
     latitude: str | None
     longitude: str | None
     speed: float | None
+    deviceTimestamp: str | None
+    distanceKm: float
 
-    battery: str | None
-    signal: str | None
-    alert: str | None
+@strawberry.type
+class HeatmapCellType:
+    # Grid cell centre and edge (degrees); signal is the GSM Signal value of the packets
+    lat: float
+    lon: float
+    sizeDeg: float
+    packets: int
+    meanSignal: float | None
+    minSignal: float | None
 
-    # PRIMARY field used by frontend for sorting/display
-    timestamp: str | None
+@strawberry.type
+class DwellIntervalType:
+    start: str
+    end: str
 
-    deviceTimestamp: str | None
-    deviceRawTimestamp: str | None
-
-    rawPacket: str | None
-    rawImei: str | None
-    rawAlert: str | None
-    rawTemperature: str | None
-    rawSpeed: str | None
-    rawSignal: str | None
-    rawBattery: str | None
-    rawGeoid: str | None
-    rawLatitude: str | None
-    rawLongitude: str | None
-    rawInterval: str | None
-    rawBody: str | None
-    rawPhone1: str | None
-    rawPhone2: str | None
-    rawControlPhone: str | None
-    rawNormalSendingInterval: str | None
-    rawSOSSendingInterval: str | None
-    rawNormalScanningInterval: str | None
-    rawAirplaneInterval: str | None
-    rawSpeedLimit: str | None
-    rawLowbatLimit: str | None
-    type: str | None
+@strawberry.type
+class GeofenceDwellDayType:
+    # Time inside one of the device's active geofences on one IST day
+    geofenceId: str
+    geofenceNumber: str
+    day: str
+    insideSec: float
+    intervals: list[DwellIntervalType]
+    cached: bool                  # served from geofence_dwell_daily
 
+@strawberry.type
+class DeviceEventType:
+    # One debounced episode (device_events); endTs is null while it is still open
+    type: str
+    startTs: str
+    endTs: str | None
+    durationSec: float
+    peak: float | None            # max speed / temperature, min battery / signal
+    threshold: float | None
+    packets: int
+    latitude: float | None
+    longitude: float | None
+    open: bool
 
 @strawberry.type
-class DistanceBucketType:
-    hour: str | None
-    dateHour: str | None
-    distance: float | None
-    cumulative: float | None
+class EventCountType:
+    type: str
+    count: int
+    durationSec: float
+
+@strawberry.input
+class LatLngInput:
+    lat: float
+    lng: float
+
+@strawberry.type
+class DistanceSeriesType:
+    imei: str
+    buckets: list[DistanceBucketType]
 
 @strawberry.type
 class AnalyticsHealthType:
@@ -196,334 +201,446 @@ class AnalyticsHealthType:
     movementStats: list[str]
     temperatureHealthIndex: float
     temperatureStatus: str
+    imei: str | None = None
+
+@strawberry.type
+class GapBucketType:
+    minSec: float
+    maxSec: float | None          # null = open-ended
+    count: int
+
+@strawberry.type
+class HourlyCoverageType:
+    hour: str                     # slot start (IST), slots are whole hours from the window start
+    receivedPackets: int
+    coverage: float               # received / expected for the hour, capped at 1
 
 @strawberry.type
 class UptimeAnalyticsType:
+    imei: str | None
     score: float
     expectedPackets: int
     receivedPackets: int
     largestGapSec: float
     dropouts: int
+    expectedIntervalSec: int | None = None
+    windowHours: int | None = None
+    gapHistogram: list[GapBucketType] = strawberry.field(default_factory=list)
+    hourlyCoverage: list[HourlyCoverageType] = strawberry.field(default_factory=list)
 
-def safe_float(x):
-    try:
-        return float(str(x).replace("c", "").replace("C", "").strip())
-    except:
-        return None
-
-
-def compute_gps_score(packets):
-    # use ONLY last 10 Normal packets
-    normals = [p for p in packets if p.get("packet") == "N"]
-    normals = normals[:10]
-
-    if len(normals) < 3:
-        return 0.0  # not enough data
-
-    lats = [safe_float(p.get("latitude")) for p in normals if safe_float(p.get("latitude"))]
-    lons = [safe_float(p.get("longitude")) for p in normals if safe_float(p.get("longitude"))]
-    signals = [safe_float(p.get("signal")) for p in normals if safe_float(p.get("signal"))]
-
-    if len(lats) < 3 or len(lons) < 3:
-        return 0.0
-
-    lat_jitter = stdev(lats)
-    lon_jitter = stdev(lons)
-    avg_signal = mean(signals) if signals else 0
-
-    # Scoring rule
-    score = 100
-    score -= lat_jitter * 5
-    score -= lon_jitter * 5
-    score -= max(0, 100 - avg_signal)
-
-    return max(0, min(100, round(score, 2)))
 
+@strawberry.type
+class AlertCountType:
+    alert: str
+    count: int
 
-def classify_movement(speed):
-    if speed is None:
-        return "unknown"
+@strawberry.type
+class DailyStatsType:
+    # Materialized nightly (analytics_daily); fields are null until their job has run for the day
+    imei: str
+    day: str
+    uptimeScore: float | None = None
+    receivedPackets: int | None = None
+    expectedPackets: int | None = None
+    largestGapSec: float | None = None
+    dropouts: int | None = None
+    distanceKm: float | None = None
+    alertTotal: int | None = None
+    alertCounts: list[AlertCountType] = strawberry.field(default_factory=list)
 
-    s = float(speed)
+@strawberry.type
+class JobStatusType:
+    name: str
+    schedule: str | None
+    lastSlot: str | None
+    lastStatus: str | None
+    lastDurationMs: int | None
+    lastRows: int | None
+    lastError: str | None
+    runs: int
+    failures: int
 
-    if s <= 1:
-        return "stationary"
-    if s <= 5:
-        return "crawling"
-    if s <= 45:
-        return "cruising"
-    if s <= 70:
-        return "highway"
-    return "overspeed"
+@strawberry.type
+class TripType:
+    # A trip or stop segment (device_trips); open is the device's current, still growing segment
+    kind: str
+    startTs: str
+    endTs: str
+    startLat: float
+    startLon: float
+    endLat: float
+    endLon: float
+    distanceKm: float
+    durationSec: float
+    maxSpeed: float
+    avgSpeed: float
+    points: int
+    open: bool
 
+@strawberry.type
+class TrackType:
+    # Encoded polyline (precision 5) of the simplified track; offsetsSec[i] is point i's
+    # time in seconds after startTs
+    imei: str
+    startTs: str | None
+    endTs: str | None
+    polyline: str
+    offsetsSec: list[int]
+    points: int
+    sourcePoints: int
+    toleranceM: float
+
+
+def trip_type(doc: dict) -> TripType:
+    return TripType(
+        kind=doc["kind"],
+        startTs=iso_format(doc["start_ts"]),
+        endTs=iso_format(doc["end_ts"]),
+        startLat=doc["start_lat"],
+        startLon=doc["start_lon"],
+        endLat=doc["end_lat"],
+        endLon=doc["end_lon"],
+        distanceKm=doc.get("distance_km", 0.0),
+        durationSec=doc.get("duration_sec", 0.0),
+        maxSpeed=doc.get("max_speed", 0.0),
+        avgSpeed=doc.get("avg_speed", 0.0),
+        points=doc.get("points", 0),
+        open=doc.get("open", False),
+    )
 
-def compute_temperature_health(packets):
-    temps = [safe_float(p.get("rawTemperature")) for p in packets if safe_float(p.get("rawTemperature"))]
-    if not temps:
-        return (100, "normal")
 
-    latest = temps[0]
-    thi = 100
+def device_event_type(doc: dict) -> DeviceEventType:
+    return DeviceEventType(
+        type=doc["type"],
+        startTs=iso_format(doc["start_ts"]),
+        endTs=iso_format(doc["end_ts"]) if doc.get("end_ts") else None,
+        durationSec=doc.get("duration_sec", 0.0),
+        peak=doc.get("peak"),
+        threshold=doc.get("threshold"),
+        packets=doc.get("packets", 0),
+        latitude=doc.get("latitude"),
+        longitude=doc.get("longitude"),
+        open=doc.get("open", False),
+    )
 
-    # High temperature penalty
-    if latest > 60:
-        thi -= 50
-    elif latest > 50:
-        thi -= 30
-    elif latest > 45:
-        thi -= 15
 
-    # Temperature rising quickly?
-    if len(temps) >= 3 and (temps[0] - temps[2] > 5):
-        thi -= 20
+def daily_stats_type(doc: dict) -> DailyStatsType:
+    return DailyStatsType(
+        imei=doc["imei"],
+        day=doc["day"].date().isoformat(),
+        uptimeScore=doc.get("uptime_score"),
+        receivedPackets=doc.get("received_packets"),
+        expectedPackets=doc.get("expected_packets"),
+        largestGapSec=doc.get("largest_gap_sec"),
+        dropouts=doc.get("dropouts"),
+        distanceKm=doc.get("distance_km"),
+        alertTotal=doc.get("alert_total"),
+        alertCounts=[AlertCountType(alert=a, count=n) for a, n in (doc.get("alert_counts") or {}).items()],
+    )
 
-    thi = max(0, min(100, thi))
 
-    status = (
-        "critical" if thi < 40 else
-        "warning" if thi < 60 else
-        "warm" if thi < 80 else
-        "normal"
+def uptime_type(row: dict) -> UptimeAnalyticsType:
+    return UptimeAnalyticsType(**{
+        **row,
+        "gapHistogram": [GapBucketType(**b) for b in row.get("gapHistogram", [])],
+        "hourlyCoverage": [HourlyCoverageType(**h) for h in row.get("hourlyCoverage", [])],
+    })
+
+def loaders_for(info: Info) -> AnalyticsLoaders:
+    """The request's DataLoaders, created on first use and kept in the GraphQL context."""
+    context = info.context
+    if not isinstance(context, dict):
+        return AnalyticsLoaders(get_db())
+    if "loaders" not in context:
+        context["loaders"] = AnalyticsLoaders(context.get("db") or get_db())
+    return context["loaders"]
+
+
+def batch_imeis(imeis: list[str]) -> list[str]:
+    imeis = list(dict.fromkeys(imeis))
+    if len(imeis) > MAX_BATCH_IMEIS:
+        raise ValueError(f"At most {MAX_BATCH_IMEIS} imeis per request")
+    return imeis
+
+
+def filter_query(imei: str | None, type: str | None) -> dict:
+    """analyticsDataByFilter: packets carrying all three phone numbers, optionally by device / type."""
+    query = {}
+    if imei:
+        query["imei"] = imei
+    if type:
+        query["type"] = type
+    query["raw_phonenum1"] = {"$nin": [None, ""]}
+    query["raw_phonenum2"] = {"$nin": [None, ""]}
+    query["raw_controlroomnum"] = {"$nin": [None, ""]}
+    return query
+
+
+def feed_query(imei: str | None, topic: str | None) -> dict:
+    """analyticsDataPage before the cursor is applied."""
+    query = {}
+    if imei:
+        query["imei"] = imei
+    if topic:
+        query["topic"] = topic
+    return query
+
+
+async def find_projected(info: Info, query: dict, limit: int = 0, skip: int = 0) -> list[AnalyticsDataType]:
+    """Newest-first find that fetches and serializes only the fields the query selected."""
+    fields = GraphQLHelper.requested_fields(info)
+    to_row = compile_serializer(tuple(fields))
+    cursor = analytics_collection(get_db()).find(
+        query, projection_for(fields), sort=[("device_timestamp", -1)], skip=skip, limit=limit
     )
+    return [AnalyticsDataType(**to_row(d)) async for d in cursor]
 
-    return (thi, status)
 
 @strawberry.type
 class Query:
 
     @strawberry.field
-    async def analyticsData(self) -> list[AnalyticsDataType]:
-        db = get_db()
-        recs = await db.find(AnalyticsData, sort=AnalyticsData.device_timestamp.desc(), limit=500)
-        return [AnalyticsDataType(**serialize(r)) for r in recs]
+    async def analyticsData(self, info: Info) -> list[AnalyticsDataType]:
+        return await find_projected(info, {}, limit=500)
 
     @strawberry.field
-    async def analyticsDataById(self, id: str) -> AnalyticsDataType | None:
+    async def analyticsDataById(self, info: Info, id: str) -> AnalyticsDataType | None:
         try:
-            rec = await get_db().find_one(AnalyticsData, {"_id": ObjectId(id)})
+            oid = ObjectId(id)
         except:
             return None
-        return AnalyticsDataType(**serialize(rec)) if rec else None
+        fields = GraphQLHelper.requested_fields(info)
+        doc = await analytics_collection(get_db()).find_one({"_id": oid}, projection_for(fields))
+        return AnalyticsDataType(**serialize_document(doc, fields)) if doc else None
 
     @strawberry.field
-    async def analyticsDataByTopic(self, topic: str, limit: int = 1000) -> list[AnalyticsDataType]:
-        db = get_db()
-        recs = await db.find(AnalyticsData, {"topic": topic}, sort=AnalyticsData.device_timestamp.desc(), limit=limit)
-        return [AnalyticsDataType(**serialize(r)) for r in recs]
+    async def analyticsDataByTopic(self, info: Info, topic: str, limit: int = 1000) -> list[AnalyticsDataType]:
+        return await find_projected(info, {"topic": topic}, limit=limit)
     
     @strawberry.field
-    async def latestAnalyticsData(self, imei: str) -> AnalyticsDataType | None:
-        db = get_db()
-    
-        recs = await db.find(
-            AnalyticsData,
-            {"imei": imei},
-            sort=AnalyticsData.device_timestamp.desc(),
-            limit=1
-        )
-    
-        if not recs:
-            return None
-    
-        return AnalyticsDataType(**serialize(recs[0]))
+    async def latestAnalyticsData(self, info: Info, imei: str) -> AnalyticsDataType | None:
+        fields = tuple(GraphQLHelper.requested_fields(info))
+        doc = await loaders_for(info).latest.load(imei)
+        return AnalyticsDataType(**compile_serializer(fields)(doc)) if doc else None
+
+    @strawberry.field
+    async def latestAnalyticsDataBatch(self, info: Info, imeis: list[str]) -> list[AnalyticsDataType | None]:
+        # One entry per distinct IMEI, in request order; null when the device has no packets
+        fields = tuple(GraphQLHelper.requested_fields(info))
+        to_row = compile_serializer(fields)
+        docs = await loaders_for(info).latest.load_many(batch_imeis(imeis))
+        return [AnalyticsDataType(**to_row(d)) if d else None for d in docs]
     
     @strawberry.field
-    async def analyticsDataByFilter(self, imei: str | None = None, type: str | None = None) -> list[AnalyticsDataType]:
-
-        db = get_db()
-        query = {}
+    async def lastPositions(self, imeis: list[str] | None = None, staleAfterSec: int | None = None) -> list[LastPositionType]:
+        # Map view: every registered device when imeis is omitted
+        rows = await last_positions(get_db(), batch_imeis(imeis) if imeis is not None else None, staleAfterSec)
+        return [LastPositionType(**r) for r in rows]
 
-        if imei:
-            query["imei"] = imei
-
-        if type:
-            query["type"] = type
-
-        query["raw_phonenum1"] = {"$nin": [None, ""]}
-        query["raw_phonenum2"] = {"$nin": [None, ""]}
-        query["raw_controlroomnum"] = {"$nin": [None, ""]}
+    @strawberry.field
+    async def analyticsDataByFilter(self, info: Info, imei: str | None = None, type: str | None = None) -> list[AnalyticsDataType]:
+        return await find_projected(info, filter_query(imei, type), limit=500)
 
-        recs = await db.find(AnalyticsData, query, sort=AnalyticsData.device_timestamp.desc(), limit=500)
-        return [AnalyticsDataType(**serialize(r)) for r in recs]
+    @strawberry.field
+    async def analyticsDataByImei(self, info: Info, imei: str) -> list[AnalyticsDataType]:
+        return await find_projected(info, {"imei": imei}, limit=500)
 
     @strawberry.field
-    async def analyticsDataByImei(self, imei: str) -> list[AnalyticsDataType]:
-        db = get_db()
-        recs = await db.find(AnalyticsData, {"imei": imei}, sort=AnalyticsData.device_timestamp.desc(), limit=500)
-        return [AnalyticsDataType(**serialize(r)) for r in recs]
+    async def analyticsDataPaginated(self, info: Info, skip: int, limit: int) -> list[AnalyticsDataType]:
+        return await find_projected(info, {}, limit=limit, skip=skip)
 
     @strawberry.field
-    async def analyticsDataPaginated(self, skip: int, limit: int) -> list[AnalyticsDataType]:
-        db = get_db()
-        recs = await db.find(AnalyticsData, sort=AnalyticsData.device_timestamp.desc(), skip=skip, limit=limit)
-        return [AnalyticsDataType(**serialize(r)) for r in recs]
+    async def analyticsDataPage(self, info: Info, limit: int = 100, cursor: str | None = None, imei: str | None = None, topic: str | None = None) -> AnalyticsDataPageType:
+        query = feed_query(imei, topic)
+        fields = GraphQLHelper.requested_fields(info, "items")
+        docs, next_cursor, has_more = await CursorHelper.page_documents(
+            analytics_collection(get_db()), query, "device_timestamp", max(1, min(limit, 1000)), cursor,
+            projection=projection_for(fields),
+        )
+        to_row = compile_serializer(tuple(fields))
+        items = [AnalyticsDataType(**to_row(d)) for d in docs]
+        return AnalyticsDataPageType(items=items, nextCursor=next_cursor, hasMore=has_more)
 
     @strawberry.field
     async def analyticsDataCount(self) -> int:
-        return await get_db().count(AnalyticsData)
+        return await analytics_collection(get_db()).estimated_document_count()
 
     @strawberry.field
-    async def analyticsDistance24(self, imei: str) -> list[DistanceBucketType]:
-        db = get_db()
-        buckets = await compute_distance_last_24_hours(db, imei)
-        return [DistanceBucketType(hour=b["hour"], dateHour=b["dateHour"], distance=b["distance"], cumulative=b["cumulative"]) for b in buckets]
+    async def analyticsDistance24(self, info: Info, imei: str) -> list[DistanceBucketType]:
+        buckets = await loaders_for(info).distance24.load(imei)
+        return [DistanceBucketType(**b) for b in buckets]
 
     @strawberry.field
-    async def analyticsHealth(self, imei: str) -> AnalyticsHealthType:
-        # Fetch model objects
-        db = get_db()
-
-        recs = await db.find(AnalyticsData, {"imei": imei}, sort=AnalyticsData.device_timestamp.desc(), limit=200)
-
-        if not recs:
-            return AnalyticsHealthType(
-                gpsScore=0,
-                movement=[],
-                movementStats=[],
-                temperatureHealthIndex=100,
-                temperatureStatus="normal",
-            )
+    async def analyticsDistance24Batch(self, info: Info, imeis: list[str]) -> list[DistanceSeriesType]:
+        imeis = batch_imeis(imeis)
+        series = await loaders_for(info).distance24.load_many(imeis)
+        return [
+            DistanceSeriesType(imei=imei, buckets=[DistanceBucketType(**b) for b in buckets])
+            for imei, buckets in zip(imeis, series)
+        ]
 
-        # Convert to dict form (serialize)
-        recs = [serialize(r) for r in recs]
-
-        # Sort newest → oldest
-        recs.sort(
-            key=lambda r: (
-                    r.get("device_timestamp")
-                    or r.get("deviceTimestamp")
-                    or r.get("timestamp")
-                    or ""
-            ),
-            reverse=True,
-        )
+    @strawberry.field
+    async def analyticsHealth(self, info: Info, imei: str) -> AnalyticsHealthType:
+        return AnalyticsHealthType(**await loaders_for(info).health.load(imei), imei=imei)
+
+    @strawberry.field
+    async def analyticsHealthBatch(self, info: Info, imeis: list[str]) -> list[AnalyticsHealthType]:
+        imeis = batch_imeis(imeis)
+        rows = await loaders_for(info).health.load_many(imeis)
+        return [AnalyticsHealthType(**r, imei=imei) for imei, r in zip(imeis, rows)]
 
-        # Compute components
-        gps_score = compute_gps_score(recs)
+    @strawberry.field
+    async def analyticsUptime(self, info: Info, imei: str, hours: int = 24) -> UptimeAnalyticsType:
+        # Any window from 1 hour to 30 days
+        return uptime_type(await loaders_for(info).uptime.load((imei, window_hours(hours))))
 
-        movement_list = [
-            classify_movement(r.get("speed"))
-            for r in recs[:50]
-        ]
+    @strawberry.field
+    async def fleetUptime(self, info: Info, imeis: list[str], hours: int = 24) -> list[UptimeAnalyticsType]:
+        # Batched variant of analyticsUptime (any window up to 30 days)
+        if not imeis:
+            return []
+        hours = window_hours(hours)
+        rows = await loaders_for(info).uptime.load_many([(imei, hours) for imei in batch_imeis(imeis)])
+        return [uptime_type(r) for r in rows]
 
-        stats = []
-        for m in ["stationary", "crawling", "cruising", "highway", "overspeed"]:
-            stats.append(f"{m}:{movement_list.count(m)}")
+    @strawberry.field
+    async def dailyStats(self, imeis: list[str], days: int = 7) -> list[DailyStatsType]:
+        # Precomputed daily uptime / distance / alert counts (up to 90 days back)
+        rows = await daily_stats(get_db(), batch_imeis(imeis), max(1, min(days, 90)))
+        return [daily_stats_type(r) for r in rows]
 
-        thi, temp_status = compute_temperature_health(recs)
+    @strawberry.field
+    async def trips(
+        self,
+        imei: str,
+        from_: Annotated[datetime | None, strawberry.argument(name="from")] = None,
+        to: datetime | None = None,
+        kind: str | None = "trip",
+    ) -> list[TripType]:
+        # Segments overlapping [from, to), oldest first; defaults to the last 7 days.
+        # kind: "trip" (default), "stop", or null for both. Naive times are IST.
+        end = to_ist_naive(to or datetime.now(timezone.utc))
+        start = to_ist_naive(from_) if from_ else end - timedelta(days=7)
+        rows = await device_trips(get_db(), imei, start, end, kind)
+        return [trip_type(r) for r in rows]
 
-        return AnalyticsHealthType(
-            gpsScore=gps_score,
-            movement=movement_list,
-            movementStats=stats,
-            temperatureHealthIndex=thi,
-            temperatureStatus=temp_status,
-        )
+    @strawberry.field
+    async def track(
+        self,
+        imei: str,
+        from_: Annotated[datetime | None, strawberry.argument(name="from")] = None,
+        to: datetime | None = None,
+        tolerance: float | None = None,
+        zoom: int | None = None,
+    ) -> TrackType:
+        # Map replay: simplified track within `tolerance` metres, or one pixel at `zoom`.
+        # Defaults to the last 24 hours; at most 31 days. Naive times are IST.
+        end = to_ist_naive(to or datetime.now(timezone.utc))
+        start = to_ist_naive(from_) if from_ else end - timedelta(hours=24)
+        return TrackType(**await device_track(get_db(), imei, start, end, tolerance, zoom))
 
     @strawberry.field
-    async def analyticsUptime(self, imei: str) -> UptimeAnalyticsType:
-        db = get_db()
+    async def devicesNear(self, lat: float, lon: float, radiusKm: float, sinceMinutes: int = 10, limit: int = 500) -> list[NearbyDeviceType]:
+        # Devices with a fix within radiusKm (max 100) in the last sinceMinutes, nearest first
+        since = to_ist_naive(datetime.now(timezone.utc)) - timedelta(minutes=max(1, min(sinceMinutes, MAX_NEAR_MINUTES)))
+        rows = await devices_near(get_db(), lat, lon, radiusKm, since, max(1, min(limit, 1000)))
+        return [
+            NearbyDeviceType(
+                imei=r["imei"],
+                latitude=r.get("latitude"),
+                longitude=r.get("longitude"),
+                speed=r.get("speed"),
+                deviceTimestamp=iso_format(r.get("device_timestamp")),
+                distanceKm=round(r["distanceM"] / 1000, 3),
+            )
+            for r in rows
+        ]
 
-        now = datetime.now(timezone.utc).astimezone(IST)
-        cutoff = now - timedelta(hours=24)
+    @strawberry.field
+    async def packetsWithin(
+        self,
+        info: Info,
+        polygon: list[LatLngInput],
+        from_: Annotated[datetime | None, strawberry.argument(name="from")] = None,
+        to: datetime | None = None,
+        imei: str | None = None,
+        limit: int = 500,
+    ) -> list[AnalyticsDataType]:
+        # Packets whose fix lies inside the polygon, newest first; defaults to the last 24 hours
+        end = to_ist_naive(to or datetime.now(timezone.utc))
+        start = to_ist_naive(from_) if from_ else end - timedelta(hours=24)
+        query = within_query([(p.lat, p.lng) for p in polygon], start, end, imei)
+        return await find_projected(info, query, limit=max(1, min(limit, MAX_WITHIN_ROWS)))
 
-        recs = await db.find(AnalyticsData, {"imei": imei, "device_timestamp": {"$gte": cutoff}}, sort=AnalyticsData.device_timestamp.asc())
+    @strawberry.field
+    async def gridHeatmap(
+        self,
+        precision: int = 2,
+        from_: Annotated[datetime | None, strawberry.argument(name="from")] = None,
+        to: datetime | None = None,
+        south: float | None = None,
+        west: float | None = None,
+        north: float | None = None,
+        east: float | None = None,
+    ) -> list[HeatmapCellType]:
+        # Packets and mean/min Signal per grid cell (precision 1-3 = 0.1 / 0.01 / 0.001 degrees)
+        # over whole IST days, densest first; defaults to the last 7 days. Rolled up hourly.
+        end = to_ist_naive(to or datetime.now(timezone.utc))
+        start = to_ist_naive(from_) if from_ else end - timedelta(days=6)
+        bounds = (south, west, north, east)
+        if any(b is not None for b in bounds) and any(b is None for b in bounds):
+            raise ValueError("Give all of south, west, north, east or none")
+        bbox = bounds if south is not None else None
+        return [HeatmapCellType(**c) for c in await heatmap(get_db(), precision, start, end, bbox)]
 
-        # Sort newest → oldest by device_timestamp or raw timestamp
-        def extract_ts(obj):
-            raw = (
-                    getattr(obj, "device_timestamp", None)
-                    or getattr(obj, "deviceRawTimestamp", None)
-                    or getattr(obj, "timestamp", None)
-                    or None
-            )
+    @strawberry.field
+    async def geofenceDwell(
+        self,
+        imei: str,
+        from_: Annotated[datetime | None, strawberry.argument(name="from")] = None,
+        to: datetime | None = None,
+        geofenceId: str | None = None,
+    ) -> list[GeofenceDwellDayType]:
+        # Per geofence and IST day (up to 31 days): seconds inside and the dwell intervals.
+        # Defaults to the last 7 days.
+        end = to_ist_naive(to or datetime.now(timezone.utc))
+        start = to_ist_naive(from_) if from_ else end - timedelta(days=6)
+        rows = await dwell_report(get_db(), imei, start, end, geofenceId)
+        return [
+            GeofenceDwellDayType(**{**r, "intervals": [DwellIntervalType(**i) for i in r["intervals"]]})
+            for r in rows
+        ]
 
-            dt = parse_iso_to_ist(raw)
-
-            # fallback: ensure sort() never receives a string
-            return dt or datetime.min.replace(tzinfo=IST)
-
-        recs.sort(key=lambda r: extract_ts(r), reverse=True)
-
-        now = datetime.now(timezone.utc).astimezone(IST)
-        cutoff = now - timedelta(hours=24)
-
-        # -----------------------------
-        # Collect timestamps (last 24 hours)
-        # -----------------------------
-        packets = []
-        for r in recs:
-            raw = extract_ts(r)
-            dt = parse_iso_to_ist(raw)
-            if dt and dt >= cutoff:
-                packets.append(dt)
-
-        # Expected packets based on 150 sec interval
-        expected = int(86400 / 150)  # 576
-        received = len(packets)
-
-        # -----------------------------
-        # Largest gap & dropout count
-        # -----------------------------
-        if not packets:
-            return UptimeAnalyticsType(
-                score=0,
-                expectedPackets=expected,
-                receivedPackets=0,
-                largestGapSec=0,
-                dropouts=0
-            )
+    @strawberry.field
+    async def events(
+        self,
+        imei: str,
+        types: list[str] | None = None,
+        from_: Annotated[datetime | None, strawberry.argument(name="from")] = None,
+        to: datetime | None = None,
+        limit: int = 200,
+    ) -> list[DeviceEventType]:
+        # Episodes that started in [from, to) (up to 31 days), newest first; defaults to the
+        # last 7 days and every type. Naive times are IST.
+        end = to_ist_naive(to or datetime.now(timezone.utc))
+        start = to_ist_naive(from_) if from_ else end - timedelta(days=7)
+        return [device_event_type(r) for r in await device_events(get_db(), imei, types, start, end, limit)]
 
-        packets_sorted = sorted(packets)
-
-        largest_gap = 0
-        dropouts = 0
-
-        for i in range(1, len(packets_sorted)):
-            diff = (packets_sorted[i] - packets_sorted[i - 1]).total_seconds()
-
-            if diff > largest_gap:
-                largest_gap = diff
-
-            if diff > 600:  # >10 min
-                dropouts += 1
-
-        # -----------------------------
-        # Scoring System
-        # -----------------------------
-        consistencyScore = (received / expected) * 100 if expected else 0
-        consistencyScore = min(100, max(0, consistencyScore))
-
-        # Gap score
-        if largest_gap <= 180:
-            gapScore = 100
-        elif largest_gap <= 600:
-            gapScore = 80
-        elif largest_gap <= 1800:
-            gapScore = 50
-        elif largest_gap <= 3600:
-            gapScore = 20
-        else:
-            gapScore = 0
-
-        # Dropout score
-        dropoutScore = max(0, 100 - (dropouts * 15))
-
-        # Final weighted score
-        score = (
-                consistencyScore * 0.5 +
-                gapScore * 0.3 +
-                dropoutScore * 0.2
-        )
-        score = round(max(0, min(100, score)), 1)
-
-        return UptimeAnalyticsType(
-            score=score,
-            expectedPackets=expected,
-            receivedPackets=received,
-            largestGapSec=largest_gap,
-            dropouts=dropouts
-        )
+    @strawberry.field
+    async def eventCounts(
+        self,
+        imei: str | None = None,
+        types: list[str] | None = None,
+        from_: Annotated[datetime | None, strawberry.argument(name="from")] = None,
+        to: datetime | None = None,
+    ) -> list[EventCountType]:
+        # Episodes per type that started in [from, to); fleet-wide when imei is omitted.
+        end = to_ist_naive(to or datetime.now(timezone.utc))
+        start = to_ist_naive(from_) if from_ else end - timedelta(days=7)
+        return [EventCountType(**r) for r in await event_counts(get_db(), imei, types, start, end)]
 
+    @strawberry.field
+    async def scheduledJobs(self) -> list[JobStatusType]:
+        return [JobStatusType(**r) for r in await job_status(get_db())]
 
 schema = strawberry.Schema(query=Query)
\ No newline at end of file
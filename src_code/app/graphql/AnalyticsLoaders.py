@@ -0,0 +1,61 @@
+# app/graphql/AnalyticsLoaders.py
+from datetime import datetime, timedelta, timezone
+from strawberry.dataloader import DataLoader
+from app.services.UptimeService import fleet_uptime
+from app.services.LastKnownStateService import get_many
+from app.services.ResultCacheService import cached_many
+from app.services.RecentWindowService import windows, health_summary
+from app.services.AnalyticsBatchService import distance24_by_imei
+from app.utils.timestamps import IST
+
+
+class AnalyticsLoaders:
+    """
+    Per-request DataLoaders: every per-IMEI lookup made while resolving one GraphQL
+    request (batched fields, aliased single fields) is coalesced into one query per kind.
+    Health, distance and uptime results go through the Redis result cache first.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.latest = DataLoader(load_fn=self._load_latest)          # key: imei
+        self.health = DataLoader(load_fn=self._load_health)          # key: imei
+        self.distance24 = DataLoader(load_fn=self._load_distance24)  # key: imei
+        self.uptime = DataLoader(load_fn=self._load_uptime)          # key: (imei, hours)
+
+    async def _load_latest(self, keys):
+        # Last-known state store; misses are fetched in one aggregation and cached
+        states = await get_many(self.db, list(keys))
+        return [states[imei]["doc"] if imei in states else None for imei in keys]
+
+    async def _load_health(self, keys):
+        async def compute(imeis):
+            # Ring buffers kept by the change stream; unbuffered devices are primed in one aggregation
+            rows = await windows(self.db, imeis)
+            return {imei: health_summary(rows[imei]) for imei in imeis}
+
+        results = await cached_many("analyticsHealth", list(keys), (), compute)
+        return [results[imei] for imei in keys]
+
+    async def _load_distance24(self, keys):
+        async def compute(imeis):
+            cutoff = datetime.now(timezone.utc).astimezone(IST) - timedelta(hours=24)
+            buckets = await distance24_by_imei(self.db, imeis, cutoff)
+            return {imei: buckets.get(imei, []) for imei in imeis}
+
+        results = await cached_many("analyticsDistance24", list(keys), (), compute)
+        return [results[imei] for imei in keys]
+
+    async def _load_uptime(self, keys):
+        by_hours = {}
+        for imei, hours in keys:
+            by_hours.setdefault(hours, []).append(imei)
+
+        rows = {}
+        for hours, imeis in by_hours.items():
+            async def compute(missing, hours=hours):
+                return {row["imei"]: row for row in await fleet_uptime(self.db, missing, hours=hours)}
+
+            for imei, row in (await cached_many("analyticsUptime", list(dict.fromkeys(imeis)), (hours,), compute)).items():
+                rows[(imei, hours)] = row
+        return [rows[key] for key in keys]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+
+class CronHelper:
+    """
+    Five-field cron expression: minute hour day-of-month month day-of-week.
+
+    Each field takes `*`, numbers, ranges (`1-5`), lists (`0,30`) and steps (`*/15`, `8-18/2`).
+    Day-of-week is 0-6 with 0 = Sunday (7 is accepted as Sunday too). As in classic cron, when
+    both day fields are restricted a day matches if either does. Times are naive wall times in
+    whatever zone the caller uses (the scheduler uses IST, like device_timestamp).
+    """
+
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expr!r}")
+
+        self.expr = expr
+        fields = [self._parse(part, lo, hi) for part, (lo, hi) in zip(parts, self.BOUNDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse(part: str, lo: int, hi: int) -> set:
+        values = set()
+        for item in part.split(","):
+            rng, _, step = item.partition("/")
+            step = int(step) if step else 1
+            if rng == "*":
+                start, end = lo, hi
+            elif "-" in rng:
+                start, end = (int(x) for x in rng.split("-", 1))
+            else:
+                start = end = int(rng)
+            if not (lo <= start <= end <= hi) or step < 1:
+                raise ValueError(f"Invalid cron field {part!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        """First fire time strictly after `dt` (minute resolution)."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            if t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+                continue
+            return t
+        raise ValueError(f"Cron expression never fires: {self.expr!r}")
@@ -0,0 +1,106 @@
+import json
+import base64
+from bson import ObjectId
+from datetime import datetime
+from bson.errors import InvalidId
+
+
+class CursorHelper:
+    """
+    Opaque keyset (cursor) pagination over (<timestamp field>, _id).
+
+    The cursor encodes the sort key of the last row returned; the next page is
+    "everything strictly after it" in sort order, so page N costs the same as page 1
+    as long as an index on (<filters>, <timestamp field>, _id) exists.
+    """
+
+    @staticmethod
+    def encode(ts: datetime | None, oid: ObjectId) -> str:
+        payload = {"t": ts.isoformat() if ts else None, "id": str(oid)}
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str) -> tuple[datetime | None, ObjectId]:
+        """Raises ValueError on anything that is not a cursor we issued."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            ts = datetime.fromisoformat(payload["t"]) if payload.get("t") else None
+            return ts, ObjectId(payload["id"])
+        except (ValueError, KeyError, TypeError, InvalidId) as e:
+            raise ValueError("Invalid cursor") from e
+
+    @staticmethod
+    def after(field: str, cursor: str, descending: bool = True) -> dict:
+        """
+        Filter selecting rows after `cursor`. Written as one range on `field` plus a
+        residual tie-break on _id so the planner keeps a single index scan.
+        Null timestamps sort lowest (last when descending, first when ascending).
+        """
+        ts, oid = CursorHelper.decode(cursor)
+        op = "$lt" if descending else "$gt"
+
+        if ts is None:
+            if descending:
+                return {field: None, "_id": {op: oid}}
+            return {"$or": [{field: None, "_id": {op: oid}}, {field: {"$ne": None}}]}
+
+        # $not/$gt (rather than $lte) keeps null timestamps reachable at the tail
+        edge = {"$not": {"$gt": ts}} if descending else {"$gte": ts}
+        return {field: edge, "$or": [{field: {"$ne": ts}}, {"_id": {op: oid}}]}
+
+    @staticmethod
+    def page_query(query: dict, field: str, cursor: str | None = None, descending: bool = True) -> dict:
+        """`query` narrowed to the rows after `cursor` (unchanged without one)."""
+        if not cursor:
+            return query
+        after = CursorHelper.after(field, cursor, descending)
+        return {"$and": [query, after]} if query else after
+
+    @staticmethod
+    def page_sort(field: str, descending: bool = True) -> list:
+        direction = -1 if descending else 1
+        return [(field, direction), ("_id", direction)]
+
+    @staticmethod
+    async def page_documents(collection, query: dict, field: str, limit: int, cursor: str | None = None,
+                             descending: bool = True, projection: dict | None = None):
+        """
+        Same as page() over a raw Motor collection. The projection is widened with the
+        sort key and _id (needed for the next cursor); callers serialize only what they asked for.
+        """
+        query = CursorHelper.page_query(query, field, cursor, descending)
+
+        if projection is not None:
+            projection = {k: v for k, v in projection.items() if k != "_id"} or {field: 1}
+            projection[field] = 1
+
+        sort = CursorHelper.page_sort(field, descending)
+        docs = await collection.find(query, projection, sort=sort, limit=limit + 1).to_list(None)
+        has_more = len(docs) > limit
+        items = docs[:limit]
+
+        next_cursor = None
+        if has_more and items:
+            last = items[-1]
+            next_cursor = CursorHelper.encode(last.get(field), last["_id"])
+        return items, next_cursor, has_more
+
+    @staticmethod
+    async def page(db, model, query: dict, field: str, limit: int, cursor: str | None = None, descending: bool = True):
+        """Returns (items, next_cursor, has_more) for an ODMantic model."""
+        query = CursorHelper.page_query(query, field, cursor, descending)
+
+        ts_attr = getattr(model, field)
+        sort = (ts_attr.desc(), model.id.desc()) if descending else (ts_attr.asc(), model.id.asc())
+
+        recs = await db.find(model, query, sort=sort, limit=limit + 1)
+        has_more = len(recs) > limit
+        items = recs[:limit]
+
+        next_cursor = None
+        if has_more and items:
+            last = items[-1]
+            next_cursor = CursorHelper.encode(getattr(last, field), last.id)
+        return items, next_cursor, has_more
@@ -0,0 +1,32 @@
+from strawberry.types import Info
+from strawberry.types.nodes import SelectedField
+
+
+class GraphQLHelper:
+
+    @staticmethod
+    def _flatten(selections, out: list):
+        # Fragment spreads / inline fragments contribute their fields as if written inline
+        for sel in selections:
+            if isinstance(sel, SelectedField):
+                out.append(sel)
+            else:
+                GraphQLHelper._flatten(sel.selections, out)
+        return out
+
+    @staticmethod
+    def requested_fields(info: Info, *path: str) -> list[str]:
+        """
+        Field names selected under the resolved field, optionally below a nested `path`
+        (e.g. requested_fields(info, "items") for a page type). Aliases resolve to their
+        field name and __typename is dropped; order follows the query, without duplicates.
+        """
+        # info.selected_fields holds the resolved field itself; start from its children
+        fields = GraphQLHelper._flatten(
+            [child for f in info.selected_fields for child in f.selections], []
+        )
+        for name in path:
+            fields = GraphQLHelper._flatten(
+                [child for f in fields if f.name == name for child in f.selections], []
+            )
+        return list(dict.fromkeys(f.name for f in fields if not f.name.startswith("__")))
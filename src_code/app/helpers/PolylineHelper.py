@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class PolylineHelper:
+    """
+    Encoded polyline (the Google Maps algorithm format): each coordinate is scaled by
+    10^precision, delta-encoded against the previous point and written as 5-bit chunks in
+    printable ASCII. Map clients (Leaflet, Google Maps, Mapbox) decode it natively.
+    """
+
+    @staticmethod
+    def encode(lat, lon, precision: int = 5) -> str:
+        factor = 10 ** precision
+        points = np.column_stack((np.round(np.asarray(lat) * factor), np.round(np.asarray(lon) * factor))).astype(np.int64)
+        deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+
+        out = []
+        for value in deltas.tolist():
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        return "".join(out)
+
+    @staticmethod
+    def decode(encoded: str, precision: int = 5) -> list[tuple[float, float]]:
+        """Raises ValueError on a truncated or malformed string."""
+        values, value, shift = [], 0, 0
+        for ch in encoded:
+            chunk = ord(ch) - 63
+            if not 0 <= chunk < 64:
+                raise ValueError("Invalid polyline")
+            value |= (chunk & 0x1F) << shift
+            shift += 5
+            if chunk < 0x20:
+                values.append(~(value >> 1) if value & 1 else value >> 1)
+                value, shift = 0, 0
+        if shift or len(values) % 2:
+            raise ValueError("Invalid polyline")
+
+        factor = 10 ** precision
+        coords = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / factor
+        return [(float(a), float(b)) for a, b in coords]
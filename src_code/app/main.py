@@ -8,6 +8,7 @@ from app.net.client import HTTPClient
 from fastapi.security import HTTPBasic
 from app.config.config import settings
 from app.models import init_db, get_db
+from app.models.IndexRegistry import ensure_indexes
 from app.libraries.Logger import Logger
 from contextlib import asynccontextmanager
 from app.helpers.ErrorCodes import ErrorCodes
@@ -17,7 +18,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.helpers.ErrorMessages import ErrorMessages
 from app.controllers.APIResponse import APIResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from app.services.SosWatcherService import watch_sos_events
+from app.services.DistanceRollupService import apply_packet as apply_distance_packet
+from app.services.LastKnownStateService import apply_packet as apply_state_packet
+from app.services.RecentWindowService import apply_packet as apply_window_packet
+from app.services.ResultCacheService import apply_packet as invalidate_cached_results
+from app.services.TripService import apply_packet as apply_trip_packet
+from app.services.GeofenceService import apply_packet as apply_geofence_packet, run_geofence_reloader
+from app.services.GeoService import apply_packet as apply_location_packet
+from app.services.TelemetrySchemaService import apply_packet as apply_v2_packet
+from app.services.EventService import apply_packet as apply_event_packet
+from app.services.SosWatcherService import watch_sos_events, register_insert_handler, run_insert_dispatcher
+from app.services.JobSchedulerService import run_scheduler, register_job
+from app.services.JobRegistry import JOB_REGISTRY
 from fastapi.responses import JSONResponse, RedirectResponse
 from app.middleware.redis_rate_limiter import init_redis, redis_rate_limiter
 
@@ -28,13 +40,39 @@ ALLOWED_CSP_ORIGINS = " ".join(settings.FRONTEND_ORIGINS.split(","))
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    if settings.ENSURE_INDEXES_ON_STARTUP:
+        # Builds can take a while on large collections — don't hold up startup
+        asyncio.create_task(ensure_indexes(get_db()))
+    if settings.DISTANCE_ROLLUPS_ENABLED:
+        register_insert_handler(apply_distance_packet)
+    if settings.TRIPS_ENABLED:
+        register_insert_handler(apply_trip_packet)
+    if settings.TELEMETRY_V2_ENABLED:
+        register_insert_handler(apply_v2_packet)
+    elif settings.GEO_LOCATION_ENABLED:
+        register_insert_handler(apply_location_packet)
+    if settings.GEOFENCE_ENGINE_ENABLED:
+        register_insert_handler(apply_geofence_packet)
+        asyncio.create_task(run_geofence_reloader())
+    if settings.DEVICE_EVENTS_ENABLED:
+        register_insert_handler(apply_event_packet)
+    register_insert_handler(apply_state_packet)
+    register_insert_handler(apply_window_packet)
+    if settings.RESULT_CACHE_ENABLED:
+        register_insert_handler(invalidate_cached_results)
     try:
         await init_redis()
     except Exception as e:
         Logger.get_instance().log_warning({"message": f"Redis init failed: {e}"})
 
     # START SOS WATCHER HERE
+    asyncio.create_task(run_insert_dispatcher())
     asyncio.create_task(watch_sos_events())
+
+    for name, job in JOB_REGISTRY.items():
+        register_job(name, job)
+    if settings.SCHEDULER_ENABLED:
+        asyncio.create_task(run_scheduler())
     yield
     if getattr(app.state, "redis", None):
         await app.state.redis.close()
@@ -137,8 +175,6 @@ client = None
 async def startup_event():
     global client
     client = HTTPClient()
-    # start SOS watcher
-    asyncio.create_task(watch_sos_events())
 
 
 # Health & Utility Endpoints
@@ -1,6 +1,8 @@
 from odmantic import Model, Field
 from typing import Optional
 from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING, GEOSPHERE
+from app.config.config import settings
 
 
 class AnalyticsData(Model):
@@ -22,6 +24,18 @@ class AnalyticsData(Model):
     Battery: Optional[str] = None
     Signal: Optional[str] = None
 
+    # Schema v2: typed copies of the text fields above (see app/utils/telemetry.py)
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    battery_level: Optional[float] = None
+    signal_level: Optional[float] = None
+    temperature: Optional[float] = None      # degrees C, parsed from raw_temperature
+    schema_version: Optional[int] = None     # 2 = typed fields present; absent on v1 packets
+
+    # GeoJSON Point {"type": "Point", "coordinates": [lon, lat]} parsed from latitude/longitude
+    # (absent on packets without a usable fix); see GeoService
+    location: Optional[dict] = None
+
     # NEW CLEAN TIMESTAMPS
     device_raw_timestamp: Optional[str] = None   # exact from device
     device_timestamp: Optional[datetime] = None       # IST converted
@@ -46,3 +60,45 @@ class AnalyticsData(Model):
     model_config = {
         "collection": "analytics_data",
     }
+
+
+# Hot query shapes: per-device timelines, per-topic feeds, config/misc responses, by-type filter, global feed.
+# Trailing _id keeps keyset (cursor) pagination on a single index scan.
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("device_timestamp", DESCENDING), ("_id", DESCENDING)], background=True),
+    IndexModel([("topic", ASCENDING), ("device_timestamp", DESCENDING), ("_id", DESCENDING)], background=True),
+    IndexModel([("type", ASCENDING), ("topic", ASCENDING), ("device_timestamp", DESCENDING)], background=True),
+    IndexModel([("type", ASCENDING), ("device_timestamp", DESCENDING)], background=True),
+    IndexModel([("device_timestamp", DESCENDING), ("_id", DESCENDING)], background=True),
+    # Proximity / polygon queries bounded by time (2dsphere indexes skip packets without location).
+    # device_timestamp leads so a polygon match comes back newest first without an in-memory sort.
+    IndexModel([("device_timestamp", DESCENDING), ("location", GEOSPHERE)], background=True),
+]
+
+# Indexes replaced by the ones above, dropped by ensure_indexes once their replacement exists.
+# A location-led 2dsphere key cannot return packets in time order, and $geoNear refuses to
+# choose between two 2dsphere indexes on location.
+RETIRED_INDEXES = [
+    IndexModel([("location", GEOSPHERE), ("device_timestamp", DESCENDING)]),
+]
+
+# Time-series mode (metaField=imei, timeField=device_timestamp): buckets are already clustered
+# by imei and time, so only the secondary access paths are declared. There is no built-in _id
+# index; the one below serves the insert tail.
+TIMESERIES_OPTIONS = {"timeField": "device_timestamp", "metaField": "imei", "granularity": "seconds"}
+
+TIMESERIES_INDEXES = [
+    IndexModel([("imei", ASCENDING), ("device_timestamp", DESCENDING)], background=True),
+    IndexModel([("topic", ASCENDING), ("device_timestamp", DESCENDING)], background=True),
+    IndexModel([("type", ASCENDING), ("device_timestamp", DESCENDING)], background=True),
+    IndexModel([("location", GEOSPHERE)], background=True),
+    # insertion-order tail that replaces the change stream (SosWatcherService)
+    IndexModel([("_id", ASCENDING)], background=True),
+]
+
+
+def analytics_collection(engine):
+    """Motor collection holding telemetry — the time-series collection when that mode is on."""
+    if settings.ANALYTICS_TIMESERIES_ENABLED:
+        return engine.database[settings.ANALYTICS_TIMESERIES_COLLECTION]
+    return engine.get_collection(AnalyticsData)
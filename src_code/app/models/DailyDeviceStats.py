@@ -0,0 +1,38 @@
+# app/models/DailyDeviceStats.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+
+class DailyDeviceStats(Model):
+    # Materialized per device and IST day by the scheduled jobs in MaterializationService.
+    # Each job $sets only its own fields, so a day can be partially filled.
+    imei: str
+    day: datetime                             # IST midnight (naive, like device_timestamp)
+
+    # daily_uptime
+    uptime_score: Optional[float] = None
+    received_packets: Optional[int] = None
+    expected_packets: Optional[int] = None
+    largest_gap_sec: Optional[float] = None
+    dropouts: Optional[int] = None
+
+    # daily_distance
+    distance_km: Optional[float] = None
+
+    # daily_alerts: alert code -> packets carrying it
+    alert_counts: Optional[dict] = None
+    alert_total: Optional[int] = None
+
+    updated_at: Optional[datetime] = None
+
+    model_config = {
+        "collection": "analytics_daily",
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("day", DESCENDING)], unique=True, background=True),
+    IndexModel([("day", DESCENDING)], background=True),
+]
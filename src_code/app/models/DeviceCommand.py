@@ -3,6 +3,7 @@
 from odmantic import Model
 from datetime import datetime
 from typing import Dict, Any, Optional
+from pymongo import IndexModel, ASCENDING, DESCENDING
 
 class DeviceCommand(Model):
     imei: str
@@ -15,4 +16,9 @@ class DeviceCommand(Model):
 
     model_config = {
         "collection": "device_commands"
-    }
\ No newline at end of file
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], background=True),
+]
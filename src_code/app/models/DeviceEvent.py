@@ -0,0 +1,37 @@
+# app/models/DeviceEvent.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+
+class DeviceEvent(Model):
+    # One debounced episode extracted from a device's packets by EventService
+    imei: str
+    type: str                                 # OVERSPEED | HIGH_TEMPERATURE | LOW_BATTERY | SOS | SIGNAL_LOSS
+    start_ts: datetime                        # IST (naive), first packet of the episode
+    end_ts: Optional[datetime] = None         # first packet after it cleared; None while open
+    last_ts: datetime                         # last packet that met the condition
+    duration_sec: float = 0.0
+
+    peak: Optional[float] = None              # max speed / max temperature / min battery / min signal
+    threshold: Optional[float] = None         # limit in force when the episode started
+    packets: int = 0                          # packets that met the condition
+    latitude: Optional[float] = None          # fix at start_ts
+    longitude: Optional[float] = None
+
+    open: bool = False
+    updated_at: Optional[datetime] = None
+
+    model_config = {
+        "collection": "device_events",
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("start_ts", DESCENDING)], background=True),
+    # every replica extracts from the same stream; an episode is one document
+    IndexModel([("imei", ASCENDING), ("type", ASCENDING), ("start_ts", DESCENDING)], unique=True, background=True),
+    IndexModel([("type", ASCENDING), ("start_ts", DESCENDING)], background=True),
+    IndexModel([("imei", ASCENDING), ("open", ASCENDING)], background=True),
+]
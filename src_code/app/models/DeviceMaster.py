@@ -2,6 +2,7 @@
 from odmantic import Model
 from typing import Optional
 from datetime import datetime
+from pymongo import IndexModel, ASCENDING
 
 
 class DeviceMaster(Model):
@@ -16,3 +17,8 @@ class DeviceMaster(Model):
     model_config = {
         "collection": "devices_master"
     }
+
+
+INDEXES = [
+    IndexModel([("topic", ASCENDING)], background=True),
+]
@@ -0,0 +1,49 @@
+# app/models/DeviceTrip.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+
+class DeviceTrip(Model):
+    # One trip or stop of a device, cut from its GPS stream by TripService.
+    # Consecutive segments share their boundary fix: a trip ends where the next stop starts.
+    imei: str
+    kind: str                                 # "trip" | "stop"
+    start_ts: datetime                        # IST (naive, like device_timestamp)
+    end_ts: datetime
+
+    start_lat: float
+    start_lon: float
+    end_lat: float
+    end_lon: float
+
+    distance_km: float = 0.0                  # always 0 for stops
+    duration_sec: float = 0.0
+    max_speed: float = 0.0                    # km/h
+    avg_speed: float = 0.0                    # km/h over the whole segment
+    points: int = 0
+
+    # The device's latest segment is still growing; it alone carries the segmenter state
+    open: bool = False
+    state: Optional[dict] = None
+    # Set while TripService.rebuild_imei holds the open document (kind / start_ts are unset
+    # then); live packets only bump `skipped` and are picked up by the rebuild
+    rebuilding: Optional[datetime] = None
+    skipped: int = 0
+
+    updated_at: Optional[datetime] = None
+
+    model_config = {
+        "collection": "device_trips",
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("start_ts", ASCENDING)], background=True),
+    IndexModel([("imei", ASCENDING), ("open", ASCENDING), ("end_ts", DESCENDING)], background=True),
+    # every replica segments the same stream; a segment is one document ...
+    IndexModel([("imei", ASCENDING), ("kind", ASCENDING), ("start_ts", ASCENDING)], unique=True, background=True),
+    # ... and a device has at most one open segment
+    IndexModel([("imei", ASCENDING)], unique=True, partialFilterExpression={"open": True}, background=True),
+]
@@ -0,0 +1,27 @@
+# app/models/DistanceHourly.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING
+
+
+class DistanceHourly(Model):
+    imei: str
+    hour: datetime                       # IST hour start (naive, like device_timestamp)
+    km: float = 0.0
+
+    # Last fix credited to this hour — seeds the next segment
+    last_lat: Optional[float] = None
+    last_lon: Optional[float] = None
+    last_ts: Optional[datetime] = None
+
+    updated_at: Optional[datetime] = None
+
+    model_config = {
+        "collection": "distance_hourly",
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("hour", ASCENDING)], unique=True, background=True),
+]
@@ -0,0 +1,33 @@
+# app/models/GeoGridDaily.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING
+
+
+class GeoGridDaily(Model):
+    # Packets per grid cell and IST day, rolled up hourly by GridRollupService.
+    # Cell (cy, cx) spans [cy, cy + 1) x [cx, cx + 1) in units of 10^-precision degrees.
+    precision: int                            # 1 (~11 km), 2 (~1.1 km), 3 (~110 m)
+    day: datetime                             # IST midnight (naive, like device_timestamp)
+    cy: int                                   # floor(lat * 10^precision)
+    cx: int                                   # floor(lon * 10^precision)
+
+    packets: int = 0
+    signal_sum: float = 0.0
+    signal_n: int = 0                         # packets with a numeric Signal
+    signal_min: Optional[float] = None
+
+    hours: list[datetime] = []                # hours already added (makes re-runs no-ops)
+
+    model_config = {
+        "collection": "geo_grid_daily",
+    }
+
+
+INDEXES = [
+    IndexModel(
+        [("precision", ASCENDING), ("day", ASCENDING), ("cy", ASCENDING), ("cx", ASCENDING)],
+        unique=True, background=True,
+    ),
+]
@@ -3,6 +3,7 @@
 from odmantic import Model
 from datetime import datetime
 from typing import List, Dict
+from pymongo import IndexModel, ASCENDING
 
 class GeofenceData(Model):
     imei: str
@@ -14,3 +15,8 @@ class GeofenceData(Model):
     model_config = {
         "collection": "geofence_data"
     }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], background=True),
+]
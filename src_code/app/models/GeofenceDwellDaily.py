@@ -0,0 +1,30 @@
+# app/models/GeofenceDwellDaily.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING
+
+
+class GeofenceDwellDaily(Model):
+    # Time a device spent inside one geofence on one complete IST day (GeofenceReportService).
+    # Only valid for the polygon it was computed against (fence_key); a redefined fence is recomputed.
+    imei: str
+    geofence_id: str
+    geofence_number: str
+    fence_key: str                            # _id of the geofence_data document used
+    day: datetime                             # IST midnight (naive, like device_timestamp)
+
+    inside_sec: float = 0.0
+    intervals: list[dict] = []                # [{"start": datetime, "end": datetime}], IST
+
+    computed_at: Optional[datetime] = None
+
+    model_config = {
+        "collection": "geofence_dwell_daily",
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("geofence_id", ASCENDING), ("day", ASCENDING)], unique=True, background=True),
+    IndexModel([("imei", ASCENDING), ("day", ASCENDING)], background=True),
+]
@@ -0,0 +1,32 @@
+# app/models/GeofenceEvent.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+
+class GeofenceEvent(Model):
+    # Enter / exit transitions detected server-side by GeofenceService
+    imei: str
+    geofence_id: str
+    geofence_number: str
+    fence_key: str                            # _id of the geofence_data document evaluated
+    event: str                                # "ENTER" | "EXIT"
+    device_timestamp: datetime                # IST (naive), of the packet that crossed
+    latitude: float
+    longitude: float
+    created_at: Optional[datetime] = None
+
+    model_config = {
+        "collection": "geofence_events",
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING), ("device_timestamp", DESCENDING)], background=True),
+    # every replica evaluates the same stream; the first write of a transition wins
+    IndexModel(
+        [("fence_key", ASCENDING), ("device_timestamp", ASCENDING), ("event", ASCENDING)],
+        unique=True, background=True,
+    ),
+]
@@ -0,0 +1,134 @@
+# app/models/IndexRegistry.py
+from pymongo import IndexModel
+from pymongo.errors import PyMongoError
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.models.User import User, INDEXES as USER_INDEXES
+from app.models.GeofenceData import GeofenceData, INDEXES as GEOFENCE_INDEXES
+from app.models.DeviceMaster import DeviceMaster, INDEXES as DEVICE_MASTER_INDEXES
+from app.models.AnalyticsData import (
+    AnalyticsData,
+    INDEXES as ANALYTICS_DATA_INDEXES,
+    RETIRED_INDEXES as ANALYTICS_DATA_RETIRED_INDEXES,
+    TIMESERIES_INDEXES,
+    analytics_collection,
+)
+from app.models.DeviceCommand import DeviceCommand, INDEXES as DEVICE_COMMAND_INDEXES
+from app.models.DistanceHourly import DistanceHourly, INDEXES as DISTANCE_HOURLY_INDEXES
+from app.models.MigrationCheckpoint import MigrationCheckpoint, INDEXES as MIGRATION_CHECKPOINT_INDEXES
+from app.models.JobState import JobState, INDEXES as JOB_STATE_INDEXES
+from app.models.JobRun import JobRun, INDEXES as JOB_RUN_INDEXES
+from app.models.DailyDeviceStats import DailyDeviceStats, INDEXES as DAILY_DEVICE_STATS_INDEXES
+from app.models.DeviceTrip import DeviceTrip, INDEXES as DEVICE_TRIP_INDEXES
+from app.models.TripRebuild import TripRebuild, INDEXES as TRIP_REBUILD_INDEXES
+from app.models.GeofenceEvent import GeofenceEvent, INDEXES as GEOFENCE_EVENT_INDEXES
+from app.models.GeoGridDaily import GeoGridDaily, INDEXES as GEO_GRID_DAILY_INDEXES
+from app.models.GeofenceDwellDaily import GeofenceDwellDaily, INDEXES as GEOFENCE_DWELL_DAILY_INDEXES
+from app.models.DeviceEvent import DeviceEvent, INDEXES as DEVICE_EVENT_INDEXES
+
+# Every model module declares its own INDEXES next to the model; register it here.
+INDEX_REGISTRY = [
+    (AnalyticsData, ANALYTICS_DATA_INDEXES),
+    (DeviceCommand, DEVICE_COMMAND_INDEXES),
+    (GeofenceData, GEOFENCE_INDEXES),
+    (DeviceMaster, DEVICE_MASTER_INDEXES),
+    (User, USER_INDEXES),
+    (DistanceHourly, DISTANCE_HOURLY_INDEXES),
+    (MigrationCheckpoint, MIGRATION_CHECKPOINT_INDEXES),
+    (JobState, JOB_STATE_INDEXES),
+    (JobRun, JOB_RUN_INDEXES),
+    (DailyDeviceStats, DAILY_DEVICE_STATS_INDEXES),
+    (DeviceTrip, DEVICE_TRIP_INDEXES),
+    (TripRebuild, TRIP_REBUILD_INDEXES),
+    (GeofenceEvent, GEOFENCE_EVENT_INDEXES),
+    (GeoGridDaily, GEO_GRID_DAILY_INDEXES),
+    (GeofenceDwellDaily, GEOFENCE_DWELL_DAILY_INDEXES),
+    (DeviceEvent, DEVICE_EVENT_INDEXES),
+]
+
+# Indexes a model used to declare and that must not outlive their replacement
+RETIRED_INDEX_REGISTRY = {
+    AnalyticsData: ANALYTICS_DATA_RETIRED_INDEXES,
+}
+
+
+def _key_spec(key) -> tuple:
+    """Normalise an index key (SON / dict / list of pairs) so 1 and 1.0 compare equal."""
+    pairs = key.items() if hasattr(key, "items") else key
+    return tuple((field, int(d) if isinstance(d, (int, float)) else d) for field, d in pairs)
+
+
+def _declared_key(index: IndexModel) -> tuple:
+    return _key_spec(index.document["key"])
+
+
+def _target(engine, model, indexes):
+    # Telemetry may live in the time-series collection, which has its own index set
+    if model is AnalyticsData and settings.ANALYTICS_TIMESERIES_ENABLED:
+        return analytics_collection(engine), TIMESERIES_INDEXES, []
+    return engine.get_collection(model), indexes, RETIRED_INDEX_REGISTRY.get(model, [])
+
+
+async def ensure_indexes(engine, apply: bool = True, registry=None) -> dict:
+    """
+    Create every declared index that is missing (idempotent) and report drift.
+    With apply=False nothing is built — the report only lists what is missing.
+    Extra indexes found on a collection are only reported, never dropped, except the
+    model's RETIRED_INDEXES, which are dropped once every declared index exists.
+    """
+    logger = Logger.get_instance()
+    report = {}
+
+    for model, indexes in registry or INDEX_REGISTRY:
+        collection, indexes, retired = _target(engine, model, indexes)
+        try:
+            existing = await collection.index_information()
+        except PyMongoError as e:
+            logger.log_error({"message": f"Cannot read indexes of {collection.name}: {e}"})
+            continue
+
+        existing_keys = {_key_spec(info["key"]) for info in existing.values()}
+        declared_keys = {_declared_key(ix) for ix in indexes}
+
+        missing = [ix for ix in indexes if _declared_key(ix) not in existing_keys]
+        retired_keys = {_declared_key(ix) for ix in retired} - declared_keys
+        stale = [name for name, info in existing.items() if _key_spec(info["key"]) in retired_keys]
+        extra = [
+            name for name, info in existing.items()
+            if name != "_id_" and name not in stale and _key_spec(info["key"]) not in declared_keys
+        ]
+
+        created, failed, dropped = [], [], []
+        for ix in missing if apply else []:
+            try:
+                created += await collection.create_indexes([ix])
+            except PyMongoError as e:
+                failed.append({"index": ix.document["name"], "error": str(e)})
+
+        # only once the replacements are built, so the old access path is never missing
+        for name in stale if apply and not failed else []:
+            try:
+                await collection.drop_index(name)
+                dropped.append(name)
+            except PyMongoError as e:
+                failed.append({"index": name, "error": str(e)})
+
+        report[collection.name] = {
+            "missing": [ix.document["name"] for ix in missing],
+            "created": created,
+            "failed": failed,
+            "retired": stale,
+            "dropped": dropped,
+            "extra": extra,
+        }
+
+        if created:
+            logger.log_info({"message": f"Indexes created on {collection.name}", "indexes": created})
+        if dropped:
+            logger.log_info({"message": f"Retired indexes dropped on {collection.name}", "indexes": dropped})
+        if failed:
+            logger.log_error({"message": f"Index build failed on {collection.name}", "failed": failed})
+        if extra:
+            logger.log_warning({"message": f"Undeclared indexes on {collection.name}", "indexes": extra})
+
+    return report
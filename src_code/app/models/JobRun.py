@@ -0,0 +1,29 @@
+# app/models/JobRun.py
+from odmantic import Model
+from typing import Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+JOB_RUN_RETENTION_SEC = 30 * 86400
+
+
+class JobRun(Model):
+    # One document per job execution: the scheduler's run-time / throughput metrics
+    name: str
+    worker: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None
+    rows: int = 0
+    status: str = "running"                   # running | ok | failed | lease_lost
+    error: Optional[str] = None
+
+    model_config = {
+        "collection": "job_runs",
+    }
+
+
+INDEXES = [
+    IndexModel([("name", ASCENDING), ("started_at", DESCENDING)], background=True),
+    IndexModel([("started_at", ASCENDING)], expireAfterSeconds=JOB_RUN_RETENTION_SEC, background=True),
+]
@@ -0,0 +1,28 @@
+# app/models/JobState.py
+from odmantic import Model
+from typing import Optional, Any
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING
+
+
+class JobState(Model):
+    name: str                                 # one document per scheduled job
+    last_slot: Optional[datetime] = None      # newest cron fire time that has been handled (IST, naive)
+    checkpoint: Optional[Any] = None          # job-defined resume position
+    last_status: Optional[str] = None         # ok | failed | lease_lost
+    last_started_at: Optional[datetime] = None
+    last_finished_at: Optional[datetime] = None
+    last_duration_ms: Optional[int] = None
+    last_rows: Optional[int] = None
+    last_error: Optional[str] = None
+    runs: int = 0
+    failures: int = 0
+
+    model_config = {
+        "collection": "job_state",
+    }
+
+
+INDEXES = [
+    IndexModel([("name", ASCENDING)], unique=True, background=True),
+]
@@ -0,0 +1,23 @@
+# app/models/MigrationCheckpoint.py
+from odmantic import Model
+from typing import Optional, Any
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING
+
+
+class MigrationCheckpoint(Model):
+    name: str                            # one document per migration / long-running job
+    last_id: Optional[Any] = None        # resume position (source _id)
+    copied: int = 0
+    skipped: int = 0
+    done: bool = False
+    updated_at: Optional[datetime] = None
+
+    model_config = {
+        "collection": "migration_checkpoints",
+    }
+
+
+INDEXES = [
+    IndexModel([("name", ASCENDING)], unique=True, background=True),
+]
@@ -0,0 +1,21 @@
+# app/models/TripRebuild.py
+from odmantic import Model
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING
+
+
+class TripRebuild(Model):
+    # A device whose trips must be re-segmented because a late packet arrived (TripService)
+    imei: str
+    since: datetime                           # oldest late device_timestamp (IST, naive)
+    marked_at: datetime                       # last time a late packet was seen
+
+    model_config = {
+        "collection": "trip_rebuilds",
+    }
+
+
+INDEXES = [
+    IndexModel([("imei", ASCENDING)], unique=True, background=True),
+    IndexModel([("marked_at", ASCENDING)], background=True),
+]
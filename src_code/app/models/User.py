@@ -3,6 +3,7 @@ from typing import Optional
 from datetime import datetime
 from datetime import timedelta
 from odmantic import Model, Field
+from pymongo import IndexModel, ASCENDING
 from app.helpers.CommonHelper import CommonHelper
 
 
@@ -51,3 +52,11 @@ class User(Model):
     model_config = {
         "collection": "sq_users"  # MongoDB collection name
     }
+
+
+# Mirrors the unique=True fields above (ODMantic does not create them on its own)
+INDEXES = [
+    IndexModel([("EMAIL", ASCENDING)], unique=True, background=True),
+    IndexModel([("MOBILE", ASCENDING)], unique=True, background=True),
+    IndexModel([("UNIQUE_ID", ASCENDING)], unique=True, background=True),
+]
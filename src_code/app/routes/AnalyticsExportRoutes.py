@@ -0,0 +1,19 @@
+from datetime import datetime
+from fastapi import APIRouter, Query
+from app.controllers.AnalyticsExportController import AnalyticsExportController
+
+router = APIRouter()
+
+# 🔹 Stream telemetry as NDJSON / CSV; resume with the `cursor` of the last row received
+@router.get("/export")
+async def export_telemetry(
+    imei: str | None = Query(None),
+    topic: str | None = Query(None),
+    start: datetime | None = Query(None, description="Inclusive; naive values are IST"),
+    end: datetime | None = Query(None, description="Exclusive; naive values are IST"),
+    fields: str | None = Query(None, description="Comma-separated API keys (default: all)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    cursor: str | None = Query(None),
+    limit: int = Query(0, ge=0, description="0 = no limit"),
+):
+    return await AnalyticsExportController.export(imei, topic, start, end, fields, format, cursor, limit)
@@ -12,6 +12,16 @@ async def get_commands(
     return await CommandSentController.list_by_imei(imei, limit)
 
 
+# 🔹 Page through commands for an IMEI (keyset cursor)
+@router.get("/{imei}/page")
+async def get_commands_page(
+    imei: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None)
+):
+    return await CommandSentController.page_by_imei(imei, limit, cursor)
+
+
 # 🔹 Get latest command for an IMEI
 @router.get("/{imei}/latest")
 async def get_latest_command(imei: str):
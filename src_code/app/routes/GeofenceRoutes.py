@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from app.controllers.GeofenceController import GeofenceController
 
 router = APIRouter()
@@ -6,3 +6,8 @@ router = APIRouter()
 @router.get("/list/{imei}")
 async def get_geofence_by_imei(imei: str):
     return await GeofenceController.list_by_imei(imei)
+
+
+@router.get("/list/{imei}/page")
+async def get_geofence_page_by_imei(imei: str, limit: int = Query(100, ge=1, le=1000), cursor: str | None = Query(None)):
+    return await GeofenceController.page_by_imei(imei, limit, cursor)
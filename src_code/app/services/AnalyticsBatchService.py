@@ -0,0 +1,72 @@
+# app/services/AnalyticsBatchService.py
+import asyncio
+from datetime import datetime
+from collections import defaultdict
+from app.config.config import settings
+from app.models.AnalyticsData import analytics_collection
+from app.utils.timestamps import to_ist_naive
+from app.services.TrajectoryService import TRAJECTORY_PROJECTION, Trajectory, distance_buckets
+from app.services.DistanceRollupService import hourly_distance_from_rollups_many
+
+# Upper bound on IMEIs per batched call (keeps $in lists and concurrent reads bounded)
+MAX_BATCH_IMEIS = 1000
+# Concurrent per-IMEI reads in latest_by_imei / recent_by_imei (well under the driver's connection pool)
+RECENT_CONCURRENCY = 32
+
+
+async def _newest(db, imeis: list[str], n: int, projection: dict) -> dict:
+    """
+    Newest `n` packets per IMEI. One find(sort, limit) per IMEI on the (imei,
+    device_timestamp) index, run concurrently: each reads exactly n index entries and
+    n documents, whereas a grouped $first/$topN has to read every packet the devices
+    ever sent.
+    """
+    collection = analytics_collection(db)
+    gate = asyncio.Semaphore(RECENT_CONCURRENCY)
+
+    async def newest(imei):
+        async with gate:
+            cursor = collection.find({"imei": imei}, projection, sort=[("device_timestamp", -1)], limit=n)
+            return imei, await cursor.to_list(None)
+
+    rows = await asyncio.gather(*(newest(imei) for imei in dict.fromkeys(imeis)))
+    return {imei: docs for imei, docs in rows if docs}
+
+
+# -----------------------------
+# PER-IMEI READS, ONE BATCH
+# -----------------------------
+async def latest_by_imei(db, imeis: list[str], projection: dict) -> dict:
+    """Newest packet per IMEI."""
+    return {imei: docs[0] for imei, docs in (await _newest(db, imeis, 1, projection)).items()}
+
+
+async def recent_by_imei(db, imeis: list[str], n: int, projection: dict) -> dict:
+    """Last `n` packets per IMEI, newest first."""
+    return await _newest(db, imeis, n, projection)
+
+
+def distance24_query(imeis: list[str], cutoff: datetime) -> dict:
+    return {"imei": {"$in": imeis}, "device_timestamp": {"$gte": to_ist_naive(cutoff)}}
+
+
+async def distance24_by_imei(db, imeis: list[str], cutoff: datetime) -> dict:
+    """analyticsDistance24 payload per IMEI from one rollup read or one raw-packet scan."""
+    if settings.DISTANCE_ROLLUPS_ENABLED:
+        return await hourly_distance_from_rollups_many(db, imeis, cutoff)
+
+    cursor = analytics_collection(db).find(
+        distance24_query(imeis, cutoff),
+        {**TRAJECTORY_PROJECTION, "imei": 1},
+        # same order as the (imei 1, device_timestamp -1) index; reversed per device below
+        sort=[("imei", 1), ("device_timestamp", -1)],
+        batch_size=5000,
+    )
+    by_imei = defaultdict(list)
+    async for d in cursor:
+        by_imei[d["imei"]].append(d)
+
+    return {
+        imei: distance_buckets(Trajectory.from_documents(docs[::-1]), cutoff)
+        for imei, docs in by_imei.items()
+    }
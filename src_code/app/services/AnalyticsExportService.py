@@ -0,0 +1,103 @@
+# app/services/AnalyticsExportService.py
+import io
+import csv
+import json
+from datetime import datetime
+from app.models import get_db
+from app.helpers.CursorHelper import CursorHelper
+from app.models.AnalyticsData import analytics_collection
+from app.utils.timestamps import to_ist_naive
+from app.controllers.AnalyticsDataController import SERIALIZE_FIELDS, projection_for, compile_serializer
+
+"""
+Streaming telemetry export (NDJSON or CSV) in constant memory.
+
+Rows are read oldest-first over (device_timestamp, _id) from one Motor cursor and written
+out in chunks of CHUNK_ROWS; nothing is accumulated beyond a chunk. Every row carries a
+`cursor` column: passing the last one received back as `cursor` resumes the export right
+after that row, so a dropped connection costs at most one chunk.
+"""
+
+CHUNK_ROWS = 500            # rows per write to the socket
+CURSOR_BATCH = 2000         # documents per getMore
+CURSOR_KEY = "cursor"
+
+
+def export_fields(fields: str | None) -> list[str]:
+    """Comma-separated API keys -> known keys, in SERIALIZE_FIELDS order. Raises ValueError."""
+    if not fields:
+        return list(SERIALIZE_FIELDS)
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - SERIALIZE_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [f for f in SERIALIZE_FIELDS if f in wanted]
+
+
+def export_query(imei: str | None, topic: str | None, start: datetime | None, end: datetime | None) -> dict:
+    query = {}
+    if imei:
+        query["imei"] = imei
+    if topic:
+        query["topic"] = topic
+    if start or end:
+        # device_timestamp is stored as naive IST; aware bounds are converted, naive ones taken as IST
+        bounds = {}
+        if start:
+            bounds["$gte"] = to_ist_naive(start) if start.tzinfo else start
+        if end:
+            bounds["$lt"] = to_ist_naive(end) if end.tzinfo else end
+        query["device_timestamp"] = bounds
+    return query
+
+
+async def iter_documents(query: dict, fields: list[str], cursor: str | None = None, limit: int = 0):
+    """Oldest-first raw documents after `cursor` (validate it with CursorHelper.decode before streaming)."""
+    query = CursorHelper.page_query(query, "device_timestamp", cursor, descending=False)
+
+    projection = {k: v for k, v in projection_for(fields).items() if k != "_id"}
+    projection["device_timestamp"] = 1
+
+    docs = analytics_collection(get_db()).find(
+        query, projection, sort=CursorHelper.page_sort("device_timestamp", descending=False), limit=limit, batch_size=CURSOR_BATCH
+    )
+    try:
+        async for doc in docs:
+            yield doc
+    finally:
+        # client went away mid-stream: release the server-side cursor now
+        await docs.close()
+
+
+async def stream_ndjson(documents, fields: list[str]):
+    to_row = compile_serializer(tuple(fields))
+    dumps = json.JSONEncoder(default=str, separators=(",", ":")).encode
+    chunk = []
+    async for doc in documents:
+        row = to_row(doc)
+        row[CURSOR_KEY] = CursorHelper.encode(doc.get("device_timestamp"), doc["_id"])
+        chunk.append(dumps(row))
+        if len(chunk) >= CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+async def stream_csv(documents, fields: list[str]):
+    to_row = compile_serializer(tuple(fields))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([*fields, CURSOR_KEY])
+
+    rows = 0
+    async for doc in documents:
+        row = to_row(doc)
+        writer.writerow([*(row[f] for f in fields), CursorHelper.encode(doc.get("device_timestamp"), doc["_id"])])
+        rows += 1
+        if rows % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
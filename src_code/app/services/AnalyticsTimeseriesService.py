@@ -0,0 +1,137 @@
+# app/services/AnalyticsTimeseriesService.py
+import asyncio
+from bson import ObjectId
+from datetime import datetime, timedelta
+from app.models import get_db
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.models.MigrationCheckpoint import MigrationCheckpoint
+from app.utils.telemetry import v2_fields
+from app.models.AnalyticsData import AnalyticsData, TIMESERIES_OPTIONS, TIMESERIES_INDEXES
+
+"""
+Online copy of analytics_data into a native time-series collection
+(metaField=imei, timeField=device_timestamp).
+
+The copy walks the source by _id in batches and stores its position in
+migration_checkpoints, so it can be stopped and resumed at any time while ingest keeps
+writing to the source. On resume, an overlap behind the checkpoint is re-read and only
+packets missing from the target are inserted: this covers a crash between an insert and
+its checkpoint and ObjectIds minted slightly out of order by concurrent writers. With
+--follow the same overlap is re-checked behind the newest copied _id every time the copy
+catches up, so packets whose ObjectId sorts behind the moving position are still copied.
+Packets without a datetime device_timestamp cannot be stored in a time-series
+collection and are counted as skipped.
+
+Cut-over: run with --follow until caught up, point ingest at the new collection, set
+ANALYTICS_TIMESERIES_ENABLED=true, restart; a last run without --follow picks up stragglers.
+"""
+
+CHECKPOINT = "analytics_timeseries"
+
+
+async def ensure_timeseries_collection(db):
+    database = db.database
+    name = settings.ANALYTICS_TIMESERIES_COLLECTION
+    if not await database.list_collection_names(filter={"name": name}):
+        await database.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+        Logger.get_instance().log_info({"message": f"Created time-series collection {name}"})
+
+    target = database[name]
+    await target.create_indexes(TIMESERIES_INDEXES)
+    return target
+
+
+async def _already_copied(target, docs) -> set:
+    ids = [d["_id"] for d in docs]
+    times = [d["device_timestamp"] for d in docs]
+    # no _id index on time-series collections: bound the lookup by time so only a few buckets are read
+    cursor = target.find(
+        {"_id": {"$in": ids}, "device_timestamp": {"$gte": min(times), "$lte": max(times)}},
+        {"_id": 1},
+    )
+    return {d["_id"] async for d in cursor}
+
+
+async def migrate(batch_size: int = 5000, overlap_sec: int = 300, follow: bool = False, poll_sec: float = 5.0):
+    db = get_db()
+    logger = Logger.get_instance()
+    source = db.get_collection(AnalyticsData)
+    target = await ensure_timeseries_collection(db)
+    checkpoints = db.get_collection(MigrationCheckpoint)
+
+    cp = await checkpoints.find_one({"name": CHECKPOINT}) or {}
+    last_id = cp.get("last_id")
+    copied, skipped = cp.get("copied", 0), cp.get("skipped", 0)
+
+    def rewind(newest):
+        return ObjectId.from_datetime(newest.generation_time - timedelta(seconds=overlap_sec)) if newest else None
+
+    # newest _id copied so far; everything at or below it is checked against the target
+    verify_until = last_id
+    position = rewind(last_id)
+
+    while True:
+        batch = await source.find(
+            {"_id": {"$gt": position}} if position else {}, sort=[("_id", 1)], limit=batch_size
+        ).to_list(None)
+
+        if not batch:
+            if not follow:
+                break
+            await asyncio.sleep(poll_sec)
+            # caught up: re-check the trailing overlap for late-minted ObjectIds
+            verify_until = last_id
+            position = rewind(last_id)
+            continue
+
+        docs = [d for d in batch if isinstance(d.get("device_timestamp"), datetime)]
+        # packets in a re-read overlap were already counted
+        skipped += sum(
+            1 for d in batch
+            if not isinstance(d.get("device_timestamp"), datetime) and (verify_until is None or d["_id"] > verify_until)
+        )
+
+        overlap = [d for d in docs if verify_until is not None and d["_id"] <= verify_until]
+        if overlap:
+            existing = await _already_copied(target, overlap)
+            docs = [d for d in docs if d["_id"] not in existing]
+
+        if docs:
+            # updates of measurement fields are restricted on time-series collections: copy as v2
+            await target.insert_many([{**d, **v2_fields(d)} for d in docs], ordered=False)
+        copied += len(docs)
+        position = batch[-1]["_id"]
+        if docs or last_id is None or position > last_id:
+            last_id = position if last_id is None else max(last_id, position)
+            await checkpoints.update_one(
+                {"name": CHECKPOINT},
+                {"$set": {"last_id": last_id, "copied": copied, "skipped": skipped, "done": False, "updated_at": datetime.now()}},
+                upsert=True,
+            )
+            logger.log_info({"message": f"analytics time-series copy: copied={copied} skipped={skipped} last_id={last_id}"})
+
+    await checkpoints.update_one(
+        {"name": CHECKPOINT}, {"$set": {"done": True, "updated_at": datetime.now()}}, upsert=True
+    )
+    return copied, skipped
+
+
+async def storage_report(db) -> dict:
+    """Data / storage / index bytes of the plain and the time-series collection."""
+    database = db.database
+    report = {}
+    for name in (AnalyticsData.__collection__, settings.ANALYTICS_TIMESERIES_COLLECTION):
+        try:
+            stats = await database[name].aggregate([{"$collStats": {"storageStats": {}}}]).to_list(1)
+        except Exception as e:
+            report[name] = {"error": str(e)}
+            continue
+        s = stats[0]["storageStats"] if stats else {}
+        report[name] = {
+            "count": s.get("count"),
+            "size": s.get("size"),
+            "storageSize": s.get("storageSize"),
+            "totalIndexSize": s.get("totalIndexSize"),
+        }
+    return report
@@ -0,0 +1,228 @@
+# app/services/DistanceRollupService.py
+import numpy as np
+from pymongo import UpdateOne
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from app.models import get_db
+from app.libraries.Logger import Logger
+from app.models.AnalyticsData import analytics_collection
+from app.models.DistanceHourly import DistanceHourly
+from app.utils.timestamps import from_epoch_ms, to_epoch_ms, to_ist_naive
+from app.utils.telemetry import numeric
+from app.services.TrajectoryService import (
+    HOUR_MS,
+    TRAJECTORY_PROJECTION,
+    Trajectory,
+    hour_floor_ms,
+    load_trajectory,
+    segment_distances_km,
+    build_bucket_payload,
+)
+
+"""
+Hourly distance rollups per IMEI (collection `distance_hourly`).
+
+Each document holds the km whose segment END falls in that IST hour, plus the last fix
+of the hour so the next packet can be chained without touching raw telemetry.
+
+- In-order packets (ts >= device's latest rollup fix) are applied with a single $inc upsert.
+- Late / out-of-order packets trigger a recompute of the two hours they can affect:
+  their own hour and the hour of the packet that now follows them.
+"""
+
+
+def _fix(doc):
+    lat, lon = numeric(doc, "latitude"), numeric(doc, "longitude")
+    if lat is None or lon is None:
+        return None, None
+    return lat, lon
+
+
+def _hour_of(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_hours(traj: Trajectory):
+    """
+    Per-hour rollup rows for an ascending trajectory. The first fix only seeds the chain;
+    rows are produced for every hour that holds at least one later (deduped) fix.
+    """
+    traj = traj.dedupe()
+    if len(traj) < 2:
+        return []
+
+    dist = segment_distances_km(traj.lat, traj.lon)
+    hours = hour_floor_ms(traj.ts[1:])
+    keys, inverse = np.unique(hours, return_inverse=True)
+    km = np.bincount(inverse, weights=dist, minlength=len(keys))
+
+    # index (into traj) of the last fix of each hour
+    last_idx = np.flatnonzero(np.r_[hours[1:] != hours[:-1], True]) + 1
+
+    rows = []
+    for key, total, li in zip(keys, km, last_idx):
+        lat, lon = traj.lat[li], traj.lon[li]
+        rows.append({
+            "hour": from_epoch_ms(key),
+            "km": float(total),
+            "last_lat": None if np.isnan(lat) else float(lat),
+            "last_lon": None if np.isnan(lon) else float(lon),
+            "last_ts": from_epoch_ms(traj.ts[li]),
+        })
+    return rows
+
+
+async def _recompute_hour(db, imei, hour: datetime):
+    raw = analytics_collection(db)
+    rollups = db.get_collection(DistanceHourly)
+    end = hour + timedelta(hours=1)
+
+    seed = await raw.find_one(
+        {"imei": imei, "device_timestamp": {"$lt": hour}},
+        TRAJECTORY_PROJECTION,
+        sort=[("device_timestamp", -1)],
+    )
+    traj = await load_trajectory(raw, {"imei": imei, "device_timestamp": {"$gte": hour, "$lt": end}})
+    if seed:
+        head = Trajectory.from_documents([seed])
+        traj = Trajectory(
+            np.concatenate([head.lat, traj.lat]),
+            np.concatenate([head.lon, traj.lon]),
+            np.concatenate([head.ts, traj.ts]),
+        )
+
+    rows = [r for r in rollup_hours(traj) if r["hour"] == hour]
+    if not rows:
+        await rollups.delete_one({"imei": imei, "hour": hour})
+        return
+
+    await rollups.update_one(
+        {"imei": imei, "hour": hour},
+        {"$set": {**rows[0], "updated_at": datetime.now()}},
+        upsert=True,
+    )
+
+
+async def apply_packet(doc: dict):
+    """Change-stream handler: fold one inserted analytics_data packet into the rollups."""
+    imei = doc.get("imei")
+    ts = doc.get("device_timestamp")
+    if not imei or not isinstance(ts, datetime):
+        return
+
+    ts = to_ist_naive(ts)
+    db = get_db()
+    rollups = db.get_collection(DistanceHourly)
+    hour = _hour_of(ts)
+
+    latest = await rollups.find_one({"imei": imei}, sort=[("hour", -1)])
+
+    if latest is None or latest.get("last_ts") is None or ts >= latest["last_ts"]:
+        lat, lon = _fix(doc)
+        km = 0.0
+        if latest and lat is not None and latest.get("last_lat") is not None and latest.get("last_lon") is not None:
+            km = float(segment_distances_km(
+                np.array([latest["last_lat"], lat]), np.array([latest["last_lon"], lon])
+            )[0])
+
+        # every replica handles the same insert: only the first to advance last_ts adds the km
+        try:
+            await rollups.update_one(
+                {"imei": imei, "hour": hour, "last_ts": {"$not": {"$gte": ts}}},
+                {
+                    "$inc": {"km": km},
+                    "$set": {"last_lat": lat, "last_lon": lon, "last_ts": ts, "updated_at": datetime.now()},
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # the hour exists and already holds this packet (or a newer one)
+            pass
+        return
+
+    # Late packet: its own hour, and the hour of the next packet (whose first segment changed)
+    following = await analytics_collection(db).find_one(
+        {"imei": imei, "device_timestamp": {"$gt": ts}},
+        {"_id": 0, "device_timestamp": 1},
+        sort=[("device_timestamp", 1)],
+    )
+    affected = {hour}
+    if following and isinstance(following.get("device_timestamp"), datetime):
+        affected.add(_hour_of(to_ist_naive(following["device_timestamp"])))
+
+    for h in sorted(affected):
+        await _recompute_hour(db, imei, h)
+
+
+async def hourly_distance_from_rollups(db, imei, cutoff: datetime, hours: int = 24):
+    """analyticsDistance24 payload served from `distance_hourly`."""
+    return (await hourly_distance_from_rollups_many(db, [imei], cutoff, hours)).get(imei, [])
+
+
+async def hourly_distance_from_rollups_many(db, imeis: list[str], cutoff: datetime, hours: int = 24) -> dict:
+    """Same payload for several IMEIs from a single `distance_hourly` read; IMEIs without rollups are absent."""
+    first_slot_ms = int(hour_floor_ms(to_epoch_ms(cutoff))) + HOUR_MS
+    first_slot = from_epoch_ms(first_slot_ms)
+
+    docs = await db.get_collection(DistanceHourly).find(
+        {"imei": {"$in": imeis}, "hour": {"$gte": first_slot, "$lt": first_slot + timedelta(hours=hours)}},
+        {"_id": 0, "imei": 1, "hour": 1, "km": 1},
+    ).to_list(length=None)
+
+    slots = {}
+    for d in docs:
+        per_imei = slots.setdefault(d["imei"], np.zeros(hours, dtype=np.float64))
+        per_imei[int((d["hour"] - first_slot) / timedelta(hours=1))] = d.get("km") or 0.0
+
+    return {imei: build_bucket_payload(first_slot_ms, km, cutoff.tzinfo) for imei, km in slots.items()}
+
+
+async def backfill_imei(db, imei, since: datetime):
+    """Rebuild rollups for one IMEI from raw telemetry since `since` (idempotent)."""
+    raw = analytics_collection(db)
+    since = _hour_of(to_ist_naive(since))
+
+    seed = await raw.find_one(
+        {"imei": imei, "device_timestamp": {"$lt": since}},
+        TRAJECTORY_PROJECTION,
+        sort=[("device_timestamp", -1)],
+    )
+    traj = await load_trajectory(raw, {"imei": imei, "device_timestamp": {"$gte": since}})
+    if seed:
+        head = Trajectory.from_documents([seed])
+        traj = Trajectory(
+            np.concatenate([head.lat, traj.lat]),
+            np.concatenate([head.lon, traj.lon]),
+            np.concatenate([head.ts, traj.ts]),
+        )
+
+    rows = rollup_hours(traj)
+    if not rows:
+        return 0
+
+    now = datetime.now()
+    await db.get_collection(DistanceHourly).bulk_write(
+        [
+            UpdateOne({"imei": imei, "hour": r["hour"]}, {"$set": {**r, "updated_at": now}}, upsert=True)
+            for r in rows
+        ],
+        ordered=False,
+    )
+    return len(rows)
+
+
+async def backfill(imeis=None, days: int = 2):
+    db = get_db()
+    since = to_ist_naive(datetime.now(timezone.utc)) - timedelta(days=days)
+
+    if not imeis:
+        imeis = await analytics_collection(db).distinct("imei", {"device_timestamp": {"$gte": since}})
+
+    total = 0
+    for imei in imeis:
+        if not imei:
+            continue
+        written = await backfill_imei(db, imei, since)
+        total += written
+        Logger.get_instance().log_info({"message": f"distance_hourly backfill imei={imei} hours={written}"})
+    return total
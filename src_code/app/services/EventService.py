@@ -0,0 +1,353 @@
+# app/services/EventService.py
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta, timezone
+from app.models import get_db
+from app.libraries.Logger import Logger
+from app.models.DeviceEvent import DeviceEvent
+from app.models.AnalyticsData import analytics_collection
+from app.utils.telemetry import numeric, numeric_projection, temperature_of, to_number
+from app.utils.timestamps import from_epoch_ms, to_epoch_ms, to_ist_naive
+
+"""
+Event extraction on ingest (collection `device_events`).
+
+Each inserted packet is checked against a few rules. A rule that holds is an episode
+(one document), not one row per packet:
+
+- OVERSPEED         speed above the device's SpeedLimit (OVERSPEED_KMH until one is seen)
+- HIGH_TEMPERATURE  temperature above HIGH_TEMPERATURE_C
+- LOW_BATTERY       Battery below the device's LowbatLimit (LOW_BATTERY_PCT until one is seen)
+- SOS               Alert A1002 (not sos_disabled)
+- SIGNAL_LOSS       Signal at or below LOW_SIGNAL
+
+Debouncing: an episode opens once `confirm` consecutive packets meet the rule, and closes
+once the value has been back past the clear level (hysteresis) for `quiet` seconds. A
+device silent for more than EVENT_MAX_GAP_SEC ends its episodes at their last packet.
+Packets older than the newest one seen for the device are ignored (rebuild_imei replays).
+
+The extractor state is kept in memory per device. An episode is written when it opens and
+closes, and at most every EVENT_FLUSH_SEC of device time in between; after a restart the
+open episodes are resumed from their documents. Every replica extracts from the same
+stream, and (imei, type, start_ts) is unique, so they write the same documents.
+"""
+
+SOS_ALERT = "A1002"
+OVERSPEED_KMH = 70          # RecentWindowService classes > 70 km/h as overspeed
+HIGH_TEMPERATURE_C = 50     # temperature_health starts penalising hard above 50 C
+LOW_BATTERY_PCT = 20
+LOW_SIGNAL = 10
+
+# type -> (direction, clear offset, confirm packets, quiet sec)
+# direction 1: the rule holds above the enter level; -1: below it. Clear level = enter -/+ offset.
+RULES = {
+    "OVERSPEED": (1, 5, 2, 60),
+    "HIGH_TEMPERATURE": (1, 3, 2, 300),
+    "LOW_BATTERY": (-1, 5, 2, 600),
+    "SOS": (1, 0, 1, 300),
+    "SIGNAL_LOSS": (-1, 10, 3, 120),
+}
+TYPES = tuple(RULES)
+
+EVENT_MAX_GAP_SEC = 1800
+EVENT_FLUSH_SEC = 60
+MAX_EVENTS = 1000
+MAX_EVENT_DAYS = 31
+
+EVENT_PROJECTION = {
+    "_id": 0, "imei": 1, "device_timestamp": 1, "speed": 1, "temperature": 1, "raw_temperature": 1,
+    "Alert": 1, "sos_disabled": 1, "raw_SpeedLimit": 1, "raw_LowbatLimit": 1,
+    **numeric_projection("latitude", "longitude", "Battery", "Signal"),
+}
+REBUILD_BATCH = 5000
+WRITE_CHUNK = 500
+
+# imei -> EventExtractor
+EXTRACTORS = {}
+
+
+def _limit(value):
+    value = to_number(value)
+    return value if value is not None and value > 0 else None
+
+
+def readings(doc: dict, limits: dict) -> dict:
+    """type -> (value, enter level) for the rules this packet carries a value for."""
+    out = {}
+    speed = to_number(doc.get("speed"))
+    if speed is not None:
+        out["OVERSPEED"] = (speed, limits.get("speed") or OVERSPEED_KMH)
+    temperature = temperature_of(doc)
+    if temperature is not None:
+        out["HIGH_TEMPERATURE"] = (temperature, HIGH_TEMPERATURE_C)
+    battery = numeric(doc, "Battery")
+    if battery is not None:
+        out["LOW_BATTERY"] = (battery, limits.get("battery") or LOW_BATTERY_PCT)
+    signal = numeric(doc, "Signal")
+    if signal is not None:
+        out["SIGNAL_LOSS"] = (signal, LOW_SIGNAL + 1)
+    sos = doc.get("Alert") == SOS_ALERT and not doc.get("sos_disabled", False)
+    out["SOS"] = (1.0 if sos else 0.0, 0)
+    return out
+
+
+class EventExtractor:
+    """
+    Rule state for one device. feed() packets in time order; it returns the episodes that
+    opened or closed. `state` holds only plain values (epoch ms, floats).
+    """
+
+    def __init__(self, state: dict | None = None):
+        self.state = state if state is not None else {"last": None, "limits": {}, "pending": {}, "active": {}}
+
+    def feed(self, ts: int, doc: dict) -> list[dict]:
+        s = self.state
+        if s["last"] is not None and ts <= s["last"]:
+            return []
+
+        changed = []
+        if s["last"] is not None and ts - s["last"] > EVENT_MAX_GAP_SEC * 1000:
+            # silent device: episodes end at their last packet, unconfirmed ones are dropped
+            for ev in s["active"].values():
+                ev["end"] = ev["last"]
+                changed.append(ev)
+            s["active"], s["pending"] = {}, {}
+        s["last"] = ts
+
+        for key, field in (("speed", "raw_SpeedLimit"), ("battery", "raw_LowbatLimit")):
+            limit = _limit(doc.get(field))
+            if limit is not None:
+                s["limits"][key] = limit
+
+        lat, lon = numeric(doc, "latitude"), numeric(doc, "longitude")
+        if lat is None or lon is None or (lat == 0 and lon == 0):
+            lat = lon = None
+
+        for kind, (value, enter) in readings(doc, s["limits"]).items():
+            direction, offset, confirm, quiet = RULES[kind]
+            hit = value * direction > enter * direction
+            cleared = value * direction <= (enter - offset * direction) * direction
+
+            ev = s["active"].get(kind)
+            if ev is not None:
+                if hit:
+                    ev["last"] = ts
+                    ev["packets"] += 1
+                    ev["peak"] = max(ev["peak"], value) if direction > 0 else min(ev["peak"], value)
+                    ev["clear"] = None
+                elif cleared:
+                    ev["clear"] = ev["clear"] or ts
+                    if ts - ev["clear"] >= quiet * 1000:
+                        ev["end"] = ev["clear"]
+                        del s["active"][kind]
+                        changed.append(ev)
+                else:
+                    ev["clear"] = None
+                continue
+
+            if not hit:
+                s["pending"].pop(kind, None)
+                continue
+            ev = s["pending"].get(kind)
+            if ev is None:
+                ev = s["pending"][kind] = {
+                    "type": kind, "start": ts, "last": ts, "end": None, "clear": None,
+                    "peak": value, "threshold": enter, "packets": 0, "lat": lat, "lon": lon,
+                }
+            ev["last"] = ts
+            ev["packets"] += 1
+            ev["peak"] = max(ev["peak"], value) if direction > 0 else min(ev["peak"], value)
+            if ev["packets"] >= confirm:
+                s["active"][kind] = s["pending"].pop(kind)
+                changed.append(ev)
+        return changed
+
+
+# -----------------------------
+# STORAGE
+# -----------------------------
+def _document(imei: str, ev: dict, now: datetime) -> dict:
+    end = ev["end"]
+    return {
+        "imei": imei,
+        "type": ev["type"],
+        "start_ts": from_epoch_ms(ev["start"]),
+        "end_ts": from_epoch_ms(end) if end is not None else None,
+        "last_ts": from_epoch_ms(ev["last"]),
+        "duration_sec": ((end if end is not None else ev["last"]) - ev["start"]) / 1000,
+        "peak": ev["peak"],
+        "threshold": ev["threshold"],
+        "packets": ev["packets"],
+        "latitude": ev["lat"],
+        "longitude": ev["lon"],
+        "open": end is None,
+        "updated_at": now,
+    }
+
+
+def _resumed(doc: dict) -> dict:
+    return {
+        "type": doc["type"],
+        "start": to_epoch_ms(doc["start_ts"]),
+        "last": to_epoch_ms(doc["last_ts"]),
+        "end": None,
+        "clear": None,
+        "peak": doc.get("peak"),
+        "threshold": doc.get("threshold"),
+        "packets": doc.get("packets", 0),
+        "lat": doc.get("latitude"),
+        "lon": doc.get("longitude"),
+    }
+
+
+async def _write(db, imei: str, events: list[dict]):
+    now = datetime.now()
+    ops = []
+    for ev in events:
+        doc = _document(imei, ev, now)
+        ops.append(UpdateOne({"imei": imei, "type": doc["type"], "start_ts": doc["start_ts"]}, {"$set": doc}, upsert=True))
+    try:
+        await db.get_collection(DeviceEvent).bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # duplicate key = another replica upserted the same episode first
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def _resume(db, imei: str) -> EventExtractor:
+    """Extractor continuing the device's open episodes (after a restart or a rebuild)."""
+    extractor = EventExtractor()
+    async for doc in db.get_collection(DeviceEvent).find({"imei": imei, "open": True}):
+        ev = _resumed(doc)
+        ev["flushed"] = ev["last"]
+        extractor.state["active"][ev["type"]] = ev
+        extractor.state["last"] = max(extractor.state["last"] or ev["last"], ev["last"])
+    return extractor
+
+
+async def apply_packet(doc: dict):
+    """Insert handler (see SosWatcherService.register_insert_handler)."""
+    imei = doc.get("imei")
+    ts = to_epoch_ms(doc.get("device_timestamp"))
+    if not imei or ts is None:
+        return
+
+    db = get_db()
+    extractor = EXTRACTORS.get(imei)
+    if extractor is None:
+        extractor = EXTRACTORS[imei] = await _resume(db, imei)
+
+    changed = extractor.feed(ts, doc)
+    seen = {id(ev) for ev in changed}
+    for ev in extractor.state["active"].values():
+        if id(ev) not in seen and ts - ev.get("flushed", ev["start"]) >= EVENT_FLUSH_SEC * 1000:
+            changed.append(ev)
+    for ev in changed:
+        ev["flushed"] = ts
+    if changed:
+        await _write(db, imei, changed)
+
+
+async def rebuild_imei(db, imei: str, since: datetime) -> int:
+    """
+    Re-extract one device's episodes from raw telemetry, starting with the first episode
+    still running at `since` (idempotent). Returns the number of episodes written.
+    """
+    events = db.get_collection(DeviceEvent)
+    since = to_ist_naive(since)
+
+    running = await events.find_one(
+        {"imei": imei, "start_ts": {"$lt": since}, "$or": [{"open": True}, {"end_ts": {"$gte": since}}]},
+        {"start_ts": 1},
+        sort=[("start_ts", 1)],
+    )
+    restart = running["start_ts"] if running else since
+    await events.delete_many({"imei": imei, "start_ts": {"$gte": restart}})
+
+    extractor = EventExtractor()
+    pending, written = [], 0
+    cursor = analytics_collection(db).find(
+        {"imei": imei, "device_timestamp": {"$gte": restart}},
+        EVENT_PROJECTION,
+        sort=[("device_timestamp", 1)],
+        batch_size=REBUILD_BATCH,
+    )
+    async for doc in cursor:
+        ts = to_epoch_ms(doc.get("device_timestamp"))
+        if ts is None:
+            continue
+        pending += [ev for ev in extractor.feed(ts, doc) if ev["end"] is not None]
+        if len(pending) >= WRITE_CHUNK:
+            await _write(db, imei, pending)
+            written += len(pending)
+            pending = []
+
+    pending += list(extractor.state["active"].values())
+    if pending:
+        await _write(db, imei, pending)
+        written += len(pending)
+    # the live extractor resumes from the rebuilt open episodes
+    EXTRACTORS.pop(imei, None)
+    return written
+
+
+async def backfill(imeis=None, days: int = 7):
+    db = get_db()
+    since = to_ist_naive(datetime.now(timezone.utc)) - timedelta(days=days)
+
+    if not imeis:
+        imeis = await analytics_collection(db).distinct("imei", {"device_timestamp": {"$gte": since}})
+
+    total = 0
+    for imei in imeis:
+        if not imei:
+            continue
+        written = await rebuild_imei(db, imei, since)
+        total += written
+        Logger.get_instance().log_info({"message": f"device_events backfill imei={imei} events={written}"})
+    return total
+
+
+# -----------------------------
+# READS
+# -----------------------------
+def _match(imei: str | None, types, start: datetime, end: datetime) -> dict:
+    types = list(types) if types else list(TYPES)
+    unknown = [t for t in types if t not in RULES]
+    if unknown:
+        raise ValueError(f"Unknown event type {unknown[0]}; expected one of {', '.join(TYPES)}")
+    start, end = to_ist_naive(start), to_ist_naive(end)
+    if end <= start:
+        raise ValueError("'to' must be after 'from'")
+    if end - start > timedelta(days=MAX_EVENT_DAYS):
+        raise ValueError(f"Range is limited to {MAX_EVENT_DAYS} days")
+    match = {"type": {"$in": types}, "start_ts": {"$gte": start, "$lt": end}}
+    if imei:
+        match["imei"] = imei
+    return match
+
+
+async def device_events(db, imei: str, types, start: datetime, end: datetime, limit: int = MAX_EVENTS) -> list[dict]:
+    """Episodes of `imei` that started in [start, end), newest first."""
+    limit = max(1, min(limit, MAX_EVENTS))
+    cursor = db.get_collection(DeviceEvent).find(
+        _match(imei, types, start, end), {"_id": 0, "updated_at": 0}, sort=[("start_ts", -1)], limit=limit
+    )
+    return [doc async for doc in cursor]
+
+
+def counts_pipeline(match: dict):
+    return [
+        {"$match": match},
+        {"$group": {"_id": "$type", "count": {"$sum": 1}, "duration_sec": {"$sum": "$duration_sec"}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+async def event_counts(db, imei: str | None, types, start: datetime, end: datetime) -> list[dict]:
+    """Episodes per type that started in [start, end), for one device or the whole fleet."""
+    cursor = db.get_collection(DeviceEvent).aggregate(counts_pipeline(_match(imei, types, start, end)))
+    return [
+        {"type": row["_id"], "count": row["count"], "durationSec": round(row["duration_sec"], 1)}
+        async for row in cursor
+    ]
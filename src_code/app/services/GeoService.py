@@ -0,0 +1,149 @@
+# app/services/GeoService.py
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+from app.models import get_db
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.models.MigrationCheckpoint import MigrationCheckpoint
+from app.models.AnalyticsData import AnalyticsData, analytics_collection
+from app.utils.telemetry import location_of
+
+"""
+GeoJSON `location` on telemetry and the geo queries it enables.
+
+Mongo cannot index separate latitude/longitude fields spatially (and they are device text;
+v2 only adds typed copies). Every packet with a usable fix gets location = {"type": "Point",
+"coordinates": [lon, lat]}, backed by a (device_timestamp, location 2dsphere) index:
+
+- new packets: the insert handler sets it by _id (GEO_LOCATION_ENABLED); the v2 upgrade
+  (TelemetrySchemaService) writes it too; in time-series mode ingest must write it, and
+  the time-series copy writes v2 documents
+- old packets: backfill() walks analytics_data by _id in batches, checkpointed in
+  migration_checkpoints, so it can be stopped and resumed
+
+(0, 0) and out-of-range fixes are what devices send without GPS lock and get no location.
+"""
+
+CHECKPOINT = "analytics_location"
+MAX_NEAR_KM = 100.0
+MAX_NEAR_MINUTES = 24 * 60
+MAX_WITHIN_ROWS = 1000
+MAX_WITHIN_DAYS = 31
+
+
+def polygon_geometry(points: list[tuple[float, float]]) -> dict:
+    """GeoJSON Polygon from (lat, lon) vertices; the ring is closed if needed. Raises ValueError."""
+    ring = []
+    for lat, lon in points:
+        lat, lon = float(lat), float(lon)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("Polygon vertex out of range")
+        ring.append([lon, lat])
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    if len(ring) < 4:
+        raise ValueError("Polygon needs at least 3 distinct vertices")
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+# -----------------------------
+# WRITES
+# -----------------------------
+async def apply_packet(doc: dict):
+    """Insert handler (see SosWatcherService.register_insert_handler)."""
+    if settings.ANALYTICS_TIMESERIES_ENABLED or "location" in doc or "_id" not in doc:
+        return
+    location = location_of(doc)
+    if location:
+        await analytics_collection(get_db()).update_one({"_id": doc["_id"]}, {"$set": {"location": location}})
+
+
+async def backfill(batch_size: int = 5000) -> tuple[int, int]:
+    """Set location on every packet lacking it. Returns (updated, without fix)."""
+    db = get_db()
+    logger = Logger.get_instance()
+    source = db.get_collection(AnalyticsData)
+    checkpoints = db.get_collection(MigrationCheckpoint)
+
+    cp = await checkpoints.find_one({"name": CHECKPOINT}) or {}
+    position = cp.get("last_id")
+    updated, skipped = cp.get("copied", 0), cp.get("skipped", 0)
+
+    while True:
+        query = {"location": {"$exists": False}}
+        if position:
+            query["_id"] = {"$gt": position}
+        batch = await source.find(
+            query, {"_id": 1, "latitude": 1, "longitude": 1}, sort=[("_id", 1)], limit=batch_size
+        ).to_list(None)
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            location = location_of(doc)
+            if location:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"location": location}}))
+        if ops:
+            await source.bulk_write(ops, ordered=False)
+        updated += len(ops)
+        skipped += len(batch) - len(ops)
+        position = batch[-1]["_id"]
+
+        await checkpoints.update_one(
+            {"name": CHECKPOINT},
+            {"$set": {"last_id": position, "copied": updated, "skipped": skipped, "done": False, "updated_at": datetime.now()}},
+            upsert=True,
+        )
+        logger.log_info({"message": f"location backfill: updated={updated} no_fix={skipped} last_id={position}"})
+
+    await checkpoints.update_one(
+        {"name": CHECKPOINT}, {"$set": {"done": True, "updated_at": datetime.now()}}, upsert=True
+    )
+    return updated, skipped
+
+
+# -----------------------------
+# READS
+# -----------------------------
+def near_pipeline(lat: float, lon: float, radius_km: float, since: datetime, limit: int):
+    """Latest fix per device inside the circle since `since`, nearest first."""
+    return [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lon, lat]},
+            "key": "location",
+            "maxDistance": radius_km * 1000,
+            "spherical": True,
+            "query": {"device_timestamp": {"$gte": since}},
+            "distanceField": "distanceM",
+        }},
+        {"$project": {"_id": 0, "imei": 1, "latitude": 1, "longitude": 1, "speed": 1, "device_timestamp": 1, "distanceM": 1}},
+        {"$sort": {"device_timestamp": -1}},
+        {"$group": {"_id": "$imei", "fix": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$fix"}},
+        {"$sort": {"distanceM": 1}},
+        {"$limit": limit},
+    ]
+
+
+async def devices_near(db, lat: float, lon: float, radius_km: float, since: datetime, limit: int = 500) -> list[dict]:
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon out of range")
+    if not 0 < radius_km <= MAX_NEAR_KM:
+        raise ValueError(f"radiusKm must be between 0 and {MAX_NEAR_KM:g}")
+    cursor = analytics_collection(db).aggregate(near_pipeline(lat, lon, radius_km, since, limit), allowDiskUse=True)
+    return [row async for row in cursor if row.get("imei")]
+
+
+def within_query(points: list[tuple[float, float]], start: datetime, end: datetime, imei: str | None = None) -> dict:
+    if end <= start:
+        raise ValueError("'to' must be after 'from'")
+    if end - start > timedelta(days=MAX_WITHIN_DAYS):
+        raise ValueError(f"Range is limited to {MAX_WITHIN_DAYS} days")
+    query = {
+        "location": {"$geoWithin": {"$geometry": polygon_geometry(points)}},
+        "device_timestamp": {"$gte": start, "$lt": end},
+    }
+    if imei:
+        query["imei"] = imei
+    return query
@@ -0,0 +1,169 @@
+# app/services/GeofenceReportService.py
+import asyncio
+import numpy as np
+from pymongo import UpdateOne
+from datetime import datetime, timedelta, timezone
+from app.models.AnalyticsData import analytics_collection
+from app.models.GeofenceDwellDaily import GeofenceDwellDaily
+from app.utils.timestamps import from_epoch_ms, to_epoch_ms, to_ist, to_ist_naive
+from app.services.GeofenceService import FenceSet, load_fences
+from app.services.TrajectoryService import stream_trajectory
+
+"""
+Time-inside-geofence reports over history (cache: geofence_dwell_daily).
+
+The device's history is streamed as lat/lon/ts columns and tested against all of its
+active fences at once (GeofenceService.FenceSet, in chunks of CONTAINS_ROWS points). The
+gap between two consecutive fixes counts as inside when the first fix is inside and the
+gap is at most DWELL_MAX_GAP_SEC; runs of such gaps are the dwell intervals. Intervals are
+clipped to IST days for the per-day totals. The fixes on either side of the range are read
+as well, so a device that was already inside at midnight gets credit from 00:00. Only the
+days missing from the cache are streamed, one span per run of consecutive missing days.
+
+Complete days are stored per (imei, geofence_id, day) together with the geofence_data
+document they were computed against, so they are computed once. Only the current day, and
+days of a fence that has since been redefined, are computed again.
+"""
+
+DWELL_MAX_GAP_SEC = 1800
+DWELL_SETTLE_SEC = 600          # a day is cached once it ended this long ago (late packets)
+MAX_REPORT_DAYS = 31
+CONTAINS_ROWS = 20_000
+DAY_MS = 24 * 3600 * 1000
+
+
+def _day_floor(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def dwell_intervals(ts, inside, max_gap_ms: int = DWELL_MAX_GAP_SEC * 1000):
+    """(starts, ends) epoch-ms arrays of the runs during which one fence held the device."""
+    if len(ts) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    credited = inside[:-1] & (np.diff(ts) <= max_gap_ms)
+    edges = np.diff(np.r_[0, credited.astype(np.int8), 0])
+    # run of gaps a..b-1 spans ts[a] -> ts[b]
+    return ts[np.flatnonzero(edges == 1)], ts[np.flatnonzero(edges == -1)]
+
+
+def clip_to_day(starts, ends, day_ms: int):
+    s = np.maximum(starts, day_ms)
+    e = np.minimum(ends, day_ms + DAY_MS)
+    keep = e > s
+    return s[keep], e[keep]
+
+
+def _contains(fences: FenceSet, lat, lon) -> np.ndarray:
+    out = np.zeros((len(lat), len(fences)), dtype=bool)
+    for i in range(0, len(lat), CONTAINS_ROWS):
+        out[i:i + CONTAINS_ROWS] = fences.contains(lat[i:i + CONTAINS_ROWS], lon[i:i + CONTAINS_ROWS])
+    return out
+
+
+def day_runs(days: list[datetime]) -> list[list[datetime]]:
+    """Sorted days split into runs of consecutive days."""
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+async def _compute_run(db, imei: str, fences: FenceSet, days: list[datetime]) -> dict:
+    gap = timedelta(seconds=DWELL_MAX_GAP_SEC)
+    traj = (await stream_trajectory(analytics_collection(db), {
+        "imei": imei,
+        "device_timestamp": {"$gte": days[0] - gap, "$lt": days[-1] + timedelta(days=1) + gap},
+    })).with_fix()
+    inside = _contains(fences, traj.lat, traj.lon)
+
+    out = {}
+    for j in range(len(fences)):
+        starts, ends = dwell_intervals(traj.ts, inside[:, j])
+        for day in days:
+            s, e = clip_to_day(starts, ends, to_epoch_ms(day))
+            out[(j, day)] = (float((e - s).sum()) / 1000, list(zip(s.tolist(), e.tolist())))
+    return out
+
+
+async def _compute(db, imei: str, fences: FenceSet, days: list[datetime]) -> dict:
+    """
+    (fence index, day) -> (inside_sec, [(start_ms, end_ms)]) for every fence and the given
+    sorted days. Each run of consecutive days streams only its own span of history.
+    """
+    out = {}
+    for part in await asyncio.gather(*(_compute_run(db, imei, fences, run) for run in day_runs(days))):
+        out.update(part)
+    return out
+
+
+async def dwell_report(db, imei: str, start: datetime, end: datetime, geofence_id: str | None = None) -> list[dict]:
+    """Per fence and IST day touching [start, end]: seconds inside and the dwell intervals."""
+    first, last = _day_floor(to_ist_naive(start)), _day_floor(to_ist_naive(end))
+    if last < first:
+        raise ValueError("'to' must not be before 'from'")
+    if last - first >= timedelta(days=MAX_REPORT_DAYS):
+        raise ValueError(f"Report range is limited to {MAX_REPORT_DAYS} days")
+
+    fences = await load_fences(db, imei)
+    if fences is None:
+        return []
+    selected = [j for j, gid in enumerate(fences.ids) if geofence_id is None or gid == geofence_id]
+    if not selected:
+        return []
+
+    days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    settled = to_ist_naive(datetime.now(timezone.utc)) - timedelta(seconds=DWELL_SETTLE_SEC)
+    cache = db.get_collection(GeofenceDwellDaily)
+
+    cached = {}
+    async for doc in cache.find({"imei": imei, "geofence_id": {"$in": [fences.ids[j] for j in selected]}, "day": {"$in": days}}):
+        cached[(doc["geofence_id"], doc["day"])] = doc
+
+    def hit(j, day):
+        doc = cached.get((fences.ids[j], day))
+        return doc if doc and doc.get("fence_key") == fences.keys[j] else None
+
+    missing = sorted({day for day in days for j in selected if hit(j, day) is None})
+    computed = await _compute(db, imei, fences, missing) if missing else {}
+
+    now = datetime.now()
+    writes = []
+    for (j, day), (inside_sec, intervals) in computed.items():
+        if j not in selected or day + timedelta(days=1) > settled:
+            continue
+        writes.append(UpdateOne(
+            {"imei": imei, "geofence_id": fences.ids[j], "day": day},
+            {"$set": {
+                "geofence_number": fences.numbers[j],
+                "fence_key": fences.keys[j],
+                "inside_sec": inside_sec,
+                "intervals": [{"start": from_epoch_ms(s), "end": from_epoch_ms(e)} for s, e in intervals],
+                "computed_at": now,
+            }},
+            upsert=True,
+        ))
+    if writes:
+        await cache.bulk_write(writes, ordered=False)
+
+    rows = []
+    for j in selected:
+        for day in days:
+            doc = hit(j, day)
+            if doc:
+                inside_sec = doc["inside_sec"]
+                intervals = [(i["start"], i["end"]) for i in doc.get("intervals", [])]
+            else:
+                inside_sec, ms = computed[(j, day)]
+                intervals = [(from_epoch_ms(s), from_epoch_ms(e)) for s, e in ms]
+            rows.append({
+                "geofenceId": fences.ids[j],
+                "geofenceNumber": fences.numbers[j],
+                "day": day.date().isoformat(),
+                "insideSec": round(inside_sec, 1),
+                "intervals": [{"start": to_ist(s).isoformat(), "end": to_ist(e).isoformat()} for s, e in intervals],
+                "cached": doc is not None,
+            })
+    return rows
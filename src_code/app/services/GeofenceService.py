@@ -0,0 +1,244 @@
+# app/services/GeofenceService.py
+import math
+import asyncio
+import numpy as np
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+from app.models import get_db
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.models.GeofenceData import GeofenceData
+from app.models.GeofenceEvent import GeofenceEvent
+from app.websocket.ConnectionManager import manager
+from app.utils.timestamps import from_epoch_ms, to_epoch_ms
+from app.utils.telemetry import numeric
+
+"""
+Server-side geofence breach detection on ingest.
+
+Active fences are the newest geofence_data document per (imei, geofence_number), compiled
+per IMEI into flat edge arrays plus one bounding box per fence. Every inserted packet is
+tested with a bounding-box prefilter and a vectorized ray cast over all edges of the
+device's fences; a device without fences costs one dict lookup.
+
+Inside/outside is tracked per fence in memory. A change is an ENTER / EXIT event, written
+to geofence_events and broadcast on the websocket. The first packet seen for a fence (after
+a restart or a new SET_GEOFENCE) only sets the state. Packets older than the newest one
+evaluated for the device are ignored.
+
+CommandController.send refreshes the device's fences right after saving a SET_GEOFENCE;
+fences saved through other workers arrive with the full reload every GEOFENCE_RELOAD_SEC.
+"""
+
+# imei -> FenceSet
+FENCES = {}
+# imei -> {fence key: inside}
+INSIDE = {}
+# imei -> newest device_timestamp (epoch ms) evaluated
+LAST_TS = {}
+
+
+def _ring(coordinates) -> list[tuple[float, float]]:
+    """(lat, lon) vertices of a stored polygon, without a closing duplicate."""
+    ring = []
+    for point in coordinates or []:
+        try:
+            lat, lon = float(point["lat"]), float(point["lng"])
+        except (KeyError, TypeError, ValueError):
+            return []
+        if math.isfinite(lat) and math.isfinite(lon):
+            ring.append((lat, lon))
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    return ring if len(ring) >= 3 else []
+
+
+class FenceSet:
+    """The active polygons of one device as flat arrays (x = lon, y = lat)."""
+
+    __slots__ = ("keys", "ids", "numbers", "bbox", "x1", "y1", "x2", "y2", "owner")
+
+    def __init__(self, fences: list[dict]):
+        self.keys, self.ids, self.numbers = [], [], []
+        bbox, x1, y1, x2, y2, owner = [], [], [], [], [], []
+        for fence in fences:
+            ring = _ring(fence.get("coordinates"))
+            if not ring:
+                continue
+            idx = len(self.keys)
+            self.keys.append(str(fence["_id"]))
+            self.ids.append(str(fence.get("geofence_id")))
+            self.numbers.append(str(fence.get("geofence_number")))
+
+            lats = [p[0] for p in ring]
+            lons = [p[1] for p in ring]
+            bbox.append((min(lons), min(lats), max(lons), max(lats)))
+            for i in range(len(ring)):
+                j = (i + 1) % len(ring)
+                x1.append(lons[i]); y1.append(lats[i])
+                x2.append(lons[j]); y2.append(lats[j])
+                owner.append(idx)
+
+        self.bbox = np.array(bbox, dtype=np.float64).reshape(-1, 4)
+        self.x1, self.y1 = np.array(x1, dtype=np.float64), np.array(y1, dtype=np.float64)
+        self.x2, self.y2 = np.array(x2, dtype=np.float64), np.array(y2, dtype=np.float64)
+        self.owner = np.array(owner, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def contains(self, lat, lon) -> np.ndarray:
+        """(points, fences) bool matrix: is each point inside each fence (even-odd rule)."""
+        py = np.atleast_1d(np.asarray(lat, dtype=np.float64))[:, None]
+        px = np.atleast_1d(np.asarray(lon, dtype=np.float64))[:, None]
+        out = np.zeros((py.shape[0], len(self.keys)), dtype=bool)
+
+        b = self.bbox
+        near = (px >= b[:, 0]) & (py >= b[:, 1]) & (px <= b[:, 2]) & (py <= b[:, 3])
+        rows = np.flatnonzero(near.any(axis=1))
+        if rows.size == 0:
+            return out
+
+        py, px = py[rows], px[rows]
+        straddles = (self.y1 > py) != (self.y2 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cross_x = self.x1 + (py - self.y1) * (self.x2 - self.x1) / (self.y2 - self.y1)
+        crossings = (straddles & (px < cross_x)).astype(np.int32)
+        # odd number of crossings per fence = inside
+        counts = np.add.reduceat(crossings, np.r_[0, np.flatnonzero(np.diff(self.owner)) + 1], axis=1)
+        out[rows] = (counts % 2 == 1) & near[rows]
+        return out
+
+
+def _compile(docs: list[dict]) -> dict:
+    """imei -> FenceSet from geofence_data documents, the newest per geofence_number winning."""
+    latest = {}
+    for doc in sorted(docs, key=lambda d: d.get("created_at") or datetime.min):
+        latest[(doc.get("imei"), doc.get("geofence_number"))] = doc
+    by_imei = {}
+    for (imei, _), doc in latest.items():
+        if imei:
+            by_imei.setdefault(imei, []).append(doc)
+    compiled = {imei: FenceSet(fences) for imei, fences in by_imei.items()}
+    return {imei: fences for imei, fences in compiled.items() if len(fences)}
+
+
+def _install(compiled: dict, imeis=None):
+    """Swap in new fence sets, dropping the state of fences that are no longer active."""
+    for imei in (imeis if imeis is not None else set(FENCES) | set(compiled)):
+        fences = compiled.get(imei)
+        if fences is None:
+            FENCES.pop(imei, None)
+            INSIDE.pop(imei, None)
+            continue
+        FENCES[imei] = fences
+        state = INSIDE.get(imei)
+        if state:
+            INSIDE[imei] = {k: v for k, v in state.items() if k in fences.keys}
+
+
+async def reload_all(db=None) -> int:
+    """Recompile every device's fences. Returns the number of devices with fences."""
+    db = db or get_db()
+    cursor = db.get_collection(GeofenceData).aggregate([
+        {"$sort": {"imei": 1, "created_at": -1}},
+        {"$group": {"_id": {"imei": "$imei", "number": "$geofence_number"}, "doc": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$doc"}},
+    ], allowDiskUse=True)
+    _install(_compile([doc async for doc in cursor]))
+    return len(FENCES)
+
+
+async def load_fences(db, imei: str) -> FenceSet | None:
+    """The device's active fences, compiled (None when it has none)."""
+    docs = await db.get_collection(GeofenceData).find({"imei": imei}, sort=[("created_at", 1)]).to_list(None)
+    return _compile(docs).get(imei)
+
+
+async def refresh_imei(db, imei: str):
+    """Recompile one device's fences (after a SET_GEOFENCE was saved)."""
+    fences = await load_fences(db, imei)
+    _install({imei: fences} if fences else {}, [imei])
+
+
+async def run_geofence_reloader():
+    """Background loop started from lifespan."""
+    logger = Logger.get_instance()
+    while True:
+        try:
+            devices = await reload_all()
+            logger.log_info({"message": f"Geofences reloaded: {devices} devices"})
+        except Exception as e:
+            logger.log_error({"message": f"Geofence reload failed: {e}"})
+        await asyncio.sleep(settings.GEOFENCE_RELOAD_SEC)
+
+
+# -----------------------------
+# EVALUATION
+# -----------------------------
+def evaluate(imei: str, ts_ms: int, lat: float, lon: float) -> list[dict]:
+    """Transitions caused by one fix of `imei` (state is updated in place)."""
+    fences = FENCES.get(imei)
+    if fences is None:
+        return []
+    last = LAST_TS.get(imei)
+    if last is not None and ts_ms < last:
+        return []
+    LAST_TS[imei] = ts_ms
+
+    inside = fences.contains(lat, lon)[0]
+    state = INSIDE.setdefault(imei, {})
+    events = []
+    for i, key in enumerate(fences.keys):
+        now_in = bool(inside[i])
+        before = state.get(key)
+        state[key] = now_in
+        if before is None or before == now_in:
+            continue
+        events.append({
+            "imei": imei,
+            "geofence_id": fences.ids[i],
+            "geofence_number": fences.numbers[i],
+            "fence_key": key,
+            "event": "ENTER" if now_in else "EXIT",
+            "device_timestamp": from_epoch_ms(ts_ms),
+            "latitude": lat,
+            "longitude": lon,
+        })
+    return events
+
+
+async def _record(events: list[dict]):
+    now = datetime.now()
+    try:
+        await get_db().get_collection(GeofenceEvent).insert_many([{**e, "created_at": now} for e in events], ordered=False)
+    except BulkWriteError as e:
+        # duplicates are transitions another worker already recorded
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+    for e in events:
+        await manager.broadcast({
+            "event": f"GEOFENCE_{e['event']}",
+            "imei": e["imei"],
+            "geofence_id": e["geofence_id"],
+            "geofence_number": e["geofence_number"],
+            "latitude": e["latitude"],
+            "longitude": e["longitude"],
+            "timestamp": str(e["device_timestamp"]),
+        })
+
+
+async def apply_packet(doc: dict):
+    """Insert handler (see SosWatcherService.register_insert_handler)."""
+    imei = doc.get("imei")
+    if imei not in FENCES:
+        return
+    ts = to_epoch_ms(doc.get("device_timestamp"))
+    lat, lon = numeric(doc, "latitude"), numeric(doc, "longitude")
+    if ts is None or lat is None or lon is None or (lat == 0 and lon == 0):
+        return
+
+    events = evaluate(imei, ts, lat, lon)
+    if events:
+        await _record(events)
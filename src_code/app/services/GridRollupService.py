@@ -0,0 +1,178 @@
+# app/services/GridRollupService.py
+import math
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta, timezone
+from app.config.config import settings
+from app.models.GeoGridDaily import GeoGridDaily
+from app.models.AnalyticsData import analytics_collection
+from app.utils.timestamps import to_ist_naive
+from app.utils.telemetry import numeric_expr
+
+"""
+Grid rollups for density and signal-coverage heatmaps (collection geo_grid_daily).
+
+Cells are squares of 10^-precision degrees (precision 1-3, about 11 km / 1.1 km / 110 m).
+Unlike geohashes they can be computed inside the aggregation, so Mongo reads the
+typed lat/lon/signal_level (parsing the strings of packets not upgraded to v2) and groups one hour of packets at the finest precision;
+only cell totals come back. Coarser precisions are summed from those rows, and everything
+is added into one document per (precision, IST day, cell).
+
+The geo_grid job adds each complete hour once GRID_SETTLE_SEC has passed, checkpointing the
+last hour added (packets arriving later than that are not counted). Each update is guarded
+by the hour, so a re-run hour is a no-op. A heatmap is then one indexed read over a few
+days of cell documents.
+"""
+
+PRECISIONS = (1, 2, 3)
+FINEST = max(PRECISIONS)
+GRID_SETTLE_SEC = 600
+MAX_HEATMAP_DAYS = 31
+MAX_CELLS = 20000
+
+
+def grid_pipeline(hour: datetime):
+    """Finest-precision cell totals for one hour of packets with a usable fix."""
+    scale = 10 ** FINEST
+    return [
+        {"$match": {"device_timestamp": {"$gte": hour, "$lt": hour + timedelta(hours=1)}}},
+        {"$project": {"_id": 0, "lat": numeric_expr("latitude"), "lon": numeric_expr("longitude"), "signal": numeric_expr("Signal")}},
+        {"$match": {
+            "lat": {"$gte": -90, "$lte": 90},
+            "lon": {"$gte": -180, "$lte": 180},
+            "$nor": [{"lat": 0, "lon": 0}],
+        }},
+        {"$group": {
+            "_id": {"cy": {"$floor": {"$multiply": ["$lat", scale]}}, "cx": {"$floor": {"$multiply": ["$lon", scale]}}},
+            "packets": {"$sum": 1},
+            "signal_sum": {"$sum": "$signal"},
+            "signal_n": {"$sum": {"$cond": [{"$eq": [{"$type": "$signal"}, "double"]}, 1, 0]}},
+            "signal_min": {"$min": "$signal"},
+        }},
+    ]
+
+
+def rollup_cells(rows: list[dict]) -> dict:
+    """(precision, cy, cx) -> totals for every precision, from finest-precision rows."""
+    cells = {}
+    for row in rows:
+        cy, cx = int(row["_id"]["cy"]), int(row["_id"]["cx"])
+        for p in PRECISIONS:
+            f = 10 ** (FINEST - p)
+            key = (p, cy // f, cx // f)
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = {
+                    "packets": row["packets"],
+                    "signal_sum": row["signal_sum"] or 0.0,
+                    "signal_n": row["signal_n"],
+                    "signal_min": row["signal_min"],
+                }
+                continue
+            cell["packets"] += row["packets"]
+            cell["signal_sum"] += row["signal_sum"] or 0.0
+            cell["signal_n"] += row["signal_n"]
+            if row["signal_min"] is not None and (cell["signal_min"] is None or row["signal_min"] < cell["signal_min"]):
+                cell["signal_min"] = row["signal_min"]
+    return cells
+
+
+async def add_hour(db, hour: datetime) -> int:
+    """Add one hour of packets into the daily cells. Returns the number of cell updates."""
+    rows = await analytics_collection(db).aggregate(grid_pipeline(hour), allowDiskUse=True).to_list(None)
+    cells = rollup_cells(rows)
+    if not cells:
+        return 0
+
+    day = hour.replace(hour=0)
+    ops = []
+    for (p, cy, cx), c in cells.items():
+        update = {
+            "$inc": {"packets": c["packets"], "signal_sum": c["signal_sum"], "signal_n": c["signal_n"]},
+            "$push": {"hours": hour},
+        }
+        if c["signal_min"] is not None:
+            update["$min"] = {"signal_min": c["signal_min"]}
+        ops.append(UpdateOne({"precision": p, "day": day, "cy": cy, "cx": cx, "hours": {"$ne": hour}}, update, upsert=True))
+
+    try:
+        await db.get_collection(GeoGridDaily).bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # duplicate key = the cell already holds this hour (the $ne guard turned the update into an insert)
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    return len(ops)
+
+
+async def materialize_geo_grid(db, checkpoint):
+    """Scheduled job: every complete, settled hour after the checkpoint (the last hour added)."""
+    now = to_ist_naive(datetime.now(timezone.utc)) - timedelta(seconds=GRID_SETTLE_SEC)
+    last_complete = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    if checkpoint:
+        hour = checkpoint + timedelta(hours=1)
+    else:
+        hour = last_complete.replace(hour=0) - timedelta(days=settings.MATERIALIZE_BACKFILL_DAYS)
+    while hour <= last_complete:
+        yield await add_hour(db, hour), hour
+        hour += timedelta(hours=1)
+
+
+GRID_JOBS = {
+    "geo_grid": materialize_geo_grid,
+}
+
+
+# -----------------------------
+# READS
+# -----------------------------
+def heatmap_pipeline(precision: int, start_day: datetime, end_day: datetime, bbox=None, limit: int = MAX_CELLS):
+    """Cells of one precision summed over [start_day, end_day], densest first. bbox = (south, west, north, east)."""
+    match = {"precision": precision, "day": {"$gte": start_day, "$lte": end_day}}
+    if bbox:
+        scale = 10 ** precision
+        south, west, north, east = bbox
+        match["cy"] = {"$gte": math.floor(south * scale), "$lte": math.floor(north * scale)}
+        match["cx"] = {"$gte": math.floor(west * scale), "$lte": math.floor(east * scale)}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"cy": "$cy", "cx": "$cx"},
+            "packets": {"$sum": "$packets"},
+            "signal_sum": {"$sum": "$signal_sum"},
+            "signal_n": {"$sum": "$signal_n"},
+            "signal_min": {"$min": "$signal_min"},
+        }},
+        {"$sort": {"packets": -1}},
+        {"$limit": limit},
+    ]
+
+
+async def heatmap(db, precision: int, start: datetime, end: datetime, bbox=None) -> list[dict]:
+    """Per-cell packet counts and mean/min Signal over the IST days touching [start, end]."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {', '.join(map(str, PRECISIONS))}")
+    start_day = to_ist_naive(start).replace(hour=0, minute=0, second=0, microsecond=0)
+    end_day = to_ist_naive(end).replace(hour=0, minute=0, second=0, microsecond=0)
+    if end_day < start_day:
+        raise ValueError("'to' must not be before 'from'")
+    if end_day - start_day >= timedelta(days=MAX_HEATMAP_DAYS):
+        raise ValueError(f"Heatmap range is limited to {MAX_HEATMAP_DAYS} days")
+    if bbox is not None:
+        south, west, north, east = bbox
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise ValueError("bbox must be south <= north and west <= east, in range")
+
+    size = 10 ** -precision
+    cursor = db.get_collection(GeoGridDaily).aggregate(heatmap_pipeline(precision, start_day, end_day, bbox), allowDiskUse=True)
+    cells = []
+    async for row in cursor:
+        cy, cx = row["_id"]["cy"], row["_id"]["cx"]
+        cells.append({
+            "lat": round((cy + 0.5) * size, precision + 1),
+            "lon": round((cx + 0.5) * size, precision + 1),
+            "sizeDeg": size,
+            "packets": row["packets"],
+            "meanSignal": round(row["signal_sum"] / row["signal_n"], 2) if row["signal_n"] else None,
+            "minSignal": row["signal_min"],
+        })
+    return cells
@@ -0,0 +1,12 @@
+# app/services/JobRegistry.py
+from app.services.MaterializationService import MATERIALIZATION_JOBS
+from app.services.GridRollupService import GRID_JOBS
+from app.services.TripService import TRIP_JOBS
+
+# Every job module declares its own name -> job dict; register it here. The scheduler
+# (main.py lifespan) and app.commands.run_job both load this one dict.
+JOB_REGISTRY = {
+    **MATERIALIZATION_JOBS,
+    **GRID_JOBS,
+    **TRIP_JOBS,
+}
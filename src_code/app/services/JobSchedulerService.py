@@ -0,0 +1,245 @@
+# app/services/JobSchedulerService.py
+import time
+import uuid
+import asyncio
+from datetime import datetime, timezone
+from pymongo.errors import DuplicateKeyError
+from redis.exceptions import RedisError
+from app.models import get_db
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.models.JobRun import JobRun
+from app.models.JobState import JobState
+from app.helpers.CronHelper import CronHelper
+from app.middleware import redis_rate_limiter
+from app.config.JobSchedule import JOB_SCHEDULE
+from app.utils.timestamps import to_ist_naive
+
+"""
+Scheduled jobs with distributed leases.
+
+Every replica with SCHEDULER_ENABLED runs the same loop. A job is due when its cron schedule
+(config/JobSchedule.py, IST) has fired since job_state.last_slot. The replica that wins the
+job's Redis lease (SET NX PX, renewed while the job runs) re-checks job_state and runs it;
+the others skip. Only the newest missed fire time runs, so a scheduler that was down for a
+while catches up once — incremental jobs fill in the rest from their own checkpoint.
+
+A job is an async generator `fn(db, checkpoint)` yielding `(rows, checkpoint)` after each
+unit of work. The checkpoint is saved in job_state after every yield and passed back on the
+next run; the run stops at the next yield if the lease was lost. Every run is recorded in
+job_runs (duration, rows, status) and summarised in job_state.
+"""
+
+LEASE_KEY = "lease:job:{name}"
+WORKER_ID = uuid.uuid4().hex
+
+# Only the holder may extend or drop a lease
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) end
+return 0
+"""
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+# name -> async generator function(db, checkpoint)
+JOBS = {}
+# jobs currently running in this process
+_RUNNING = set()
+
+
+def register_job(name: str, fn):
+    JOBS[name] = fn
+
+
+def _now_ist():
+    return to_ist_naive(datetime.now(timezone.utc))
+
+
+class Lease:
+    """Redis lease on one job, held by this worker until released or not renewed in time."""
+
+    def __init__(self, client, name: str, ttl_ms: int):
+        self.client = client
+        self.key = LEASE_KEY.format(name=name)
+        self.ttl_ms = ttl_ms
+        self.token = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+        self.lost = False
+
+    async def acquire(self) -> bool:
+        return bool(await self.client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    async def keep_alive(self):
+        while not self.lost:
+            await asyncio.sleep(self.ttl_ms / 3000)
+            try:
+                self.lost = not await self.client.eval(_RENEW, 1, self.key, self.token, self.ttl_ms)
+            except RedisError:
+                # cannot prove we still hold it: behave as if we do not
+                self.lost = True
+
+    async def release(self):
+        try:
+            await self.client.eval(_RELEASE, 1, self.key, self.token)
+        except RedisError as e:
+            Logger.get_instance().log_warning({"message": f"Lease release failed ({self.key}): {e}"})
+
+
+async def _execute(db, name: str, lease: Lease, slot: datetime | None) -> dict:
+    states = db.get_collection(JobState)
+    runs = db.get_collection(JobRun)
+    logger = Logger.get_instance()
+
+    state = await states.find_one({"name": name}) or {}
+    checkpoint = state.get("checkpoint")
+    started_at = datetime.now()
+    run_id = (await runs.insert_one({"name": name, "worker": WORKER_ID, "started_at": started_at, "rows": 0, "status": "running"})).inserted_id
+
+    rows, status, error = 0, "ok", None
+    started = time.perf_counter()
+    steps = JOBS[name](db, checkpoint)
+    try:
+        async for n, checkpoint in steps:
+            rows += n
+            await states.update_one({"name": name}, {"$set": {"checkpoint": checkpoint}}, upsert=True)
+            if lease.lost:
+                status = "lease_lost"
+                break
+    except Exception as e:
+        status, error = "failed", str(e)
+        logger.log_error({"message": f"Job {name} failed: {e}"})
+    finally:
+        await steps.aclose()
+
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    finished_at = datetime.now()
+    await runs.update_one(
+        {"_id": run_id},
+        {"$set": {"finished_at": finished_at, "duration_ms": duration_ms, "rows": rows, "status": status, "error": error}},
+    )
+
+    summary = {
+        "last_status": status,
+        "last_started_at": started_at,
+        "last_finished_at": finished_at,
+        "last_duration_ms": duration_ms,
+        "last_rows": rows,
+        "last_error": error,
+    }
+    if slot is not None:
+        summary["last_slot"] = slot
+    await states.update_one(
+        {"name": name},
+        {"$set": summary, "$inc": {"runs": 1, "failures": int(status == "failed")}},
+        upsert=True,
+    )
+    logger.log_info({"message": f"Job {name}: {status} in {duration_ms} ms, {rows} rows"})
+    return {"name": name, "status": status, "rows": rows, "durationMs": duration_ms, "error": error}
+
+
+async def run_job(name: str, db=None, slot: datetime | None = None) -> dict | None:
+    """
+    Run one registered job under its lease. Returns the run summary, or None when the lease
+    is held elsewhere, Redis is unavailable, or (with `slot`) that fire time was already handled.
+    """
+    db = db or get_db()
+    logger = Logger.get_instance()
+    client = redis_rate_limiter.redis_client
+    if client is None:
+        logger.log_warning({"message": f"Job {name} skipped: Redis not initialized (no lease)"})
+        return None
+
+    lease = Lease(client, name, settings.JOB_LEASE_TTL_SEC * 1000)
+    try:
+        if not await lease.acquire():
+            return None
+    except RedisError as e:
+        logger.log_warning({"message": f"Job {name} skipped: lease unavailable ({e})"})
+        return None
+
+    keeper = asyncio.create_task(lease.keep_alive())
+    try:
+        if slot is not None:
+            # another replica may have finished this slot between our due check and the lease
+            state = await db.get_collection(JobState).find_one({"name": name}, {"last_slot": 1})
+            if state and state.get("last_slot") and state["last_slot"] >= slot:
+                return None
+        return await _execute(db, name, lease, slot)
+    finally:
+        keeper.cancel()
+        await lease.release()
+
+
+async def _due_slot(db, name: str, cron: CronHelper, now: datetime) -> datetime | None:
+    """Newest fire time after job_state.last_slot that is not in the future (None if not due)."""
+    states = db.get_collection(JobState)
+    state = await states.find_one({"name": name}, {"last_slot": 1})
+    last = state.get("last_slot") if state else None
+    if last is None:
+        # first sight of the job: schedule from now on (run it by hand to fill the past)
+        try:
+            await states.update_one({"name": name}, {"$setOnInsert": {"last_slot": now, "runs": 0, "failures": 0}}, upsert=True)
+        except DuplicateKeyError:
+            pass
+        return None
+
+    slot = None
+    fire = cron.next_after(last)
+    while fire <= now:
+        slot = fire
+        fire = cron.next_after(fire)
+    return slot
+
+
+async def _run_in_background(db, name: str, slot: datetime):
+    try:
+        await run_job(name, db, slot)
+    except Exception as e:
+        Logger.get_instance().log_error({"message": f"Job {name} crashed: {e}"})
+    finally:
+        _RUNNING.discard(name)
+
+
+async def run_scheduler():
+    """Scheduler loop started from lifespan; checks every SCHEDULER_TICK_SEC."""
+    db = get_db()
+    logger = Logger.get_instance()
+    schedules = {name: CronHelper(expr) for name, expr in JOB_SCHEDULE.items() if name in JOBS}
+    logger.log_info({"message": f"Job scheduler started: {', '.join(schedules) or 'no jobs'}"})
+
+    while True:
+        now = _now_ist()
+        for name, cron in schedules.items():
+            if name in _RUNNING:
+                continue
+            try:
+                slot = await _due_slot(db, name, cron, now)
+            except Exception as e:
+                logger.log_error({"message": f"Scheduler could not check {name}: {e}"})
+                continue
+            if slot is not None:
+                _RUNNING.add(name)
+                asyncio.create_task(_run_in_background(db, name, slot))
+        await asyncio.sleep(settings.SCHEDULER_TICK_SEC)
+
+
+async def job_status(db) -> list[dict]:
+    """job_state of every registered job, for the ops query."""
+    docs = await db.get_collection(JobState).find({"name": {"$in": list(JOBS)}}).to_list(None)
+    by_name = {d["name"]: d for d in docs}
+    out = []
+    for name in sorted(JOBS):
+        d = by_name.get(name, {})
+        out.append({
+            "name": name,
+            "schedule": JOB_SCHEDULE.get(name),
+            "lastSlot": d["last_slot"].isoformat() if d.get("last_slot") else None,
+            "lastStatus": d.get("last_status"),
+            "lastDurationMs": d.get("last_duration_ms"),
+            "lastRows": d.get("last_rows"),
+            "lastError": d.get("last_error"),
+            "runs": d.get("runs", 0),
+            "failures": d.get("failures", 0),
+        })
+    return out
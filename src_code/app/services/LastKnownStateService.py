@@ -0,0 +1,169 @@
+# app/services/LastKnownStateService.py
+import time
+from bson import json_util
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.middleware import redis_rate_limiter
+from app.models.DeviceMaster import DeviceMaster
+from app.services.SosWatcherService import stream_active
+from app.utils.timestamps import to_epoch_ms
+from app.services.AnalyticsBatchService import latest_by_imei
+from app.controllers.AnalyticsDataController import projection_for, SERIALIZE_FIELDS
+
+"""
+Last-known state per IMEI: the newest analytics_data document of every device.
+
+Tiers, in read order:
+  1. in-process dict, fed by the analytics_data insert change stream (SosWatcherService)
+  2. optional Redis hashes (LAST_STATE_REDIS_ENABLED), shared by all workers
+  3. Mongo (one newest-first find per IMEI on the imei/device_timestamp index), which refills 1 and 2
+
+Tiers 1 and 2 are only trusted while this process's change stream is open; without it
+every read goes to Mongo so a dead stream can never serve frozen positions.
+"""
+
+# Document keys kept per device (everything the API can serialize)
+STATE_PROJECTION = projection_for(SERIALIZE_FIELDS)
+STATE_KEYS = [k for k, v in STATE_PROJECTION.items() if v]
+
+REDIS_DOC_KEY = "lks:doc"      # imei -> extended JSON document
+REDIS_TS_KEY = "lks:ts"        # imei -> device_timestamp epoch ms (ordering guard)
+
+# Compare-and-set: only write when the packet is not older than what is stored
+_REDIS_CAS = """
+local cur = redis.call('HGET', KEYS[1], ARGV[1])
+if cur and tonumber(cur) > tonumber(ARGV[2]) then return 0 end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+return 1
+"""
+
+# imei -> {"doc": dict, "ts": epoch ms | None, "updated_at": epoch sec}
+STATE = {}
+
+
+def _redis():
+    return redis_rate_limiter.redis_client if settings.LAST_STATE_REDIS_ENABLED else None
+
+
+def _newer(ts, current) -> bool:
+    return current is None or ts is None or (current["ts"] or 0) <= ts
+
+
+def remember(doc: dict):
+    """Store `doc` in process unless a newer packet for the device is already held."""
+    imei = doc.get("imei")
+    if not imei:
+        return False
+    ts = to_epoch_ms(doc.get("device_timestamp"))
+    if not _newer(ts, STATE.get(imei)):
+        return False
+    STATE[imei] = {"doc": {k: doc.get(k) for k in STATE_KEYS if k in doc}, "ts": ts, "updated_at": time.time()}
+    return True
+
+
+async def _publish(doc: dict):
+    client = _redis()
+    if client is None:
+        return
+    ts = to_epoch_ms(doc.get("device_timestamp")) or 0
+    payload = json_util.dumps({k: doc.get(k) for k in STATE_KEYS if k in doc})
+    try:
+        await client.eval(_REDIS_CAS, 2, REDIS_TS_KEY, REDIS_DOC_KEY, doc["imei"], ts, payload)
+    except Exception as e:
+        Logger.get_instance().log_warning({"message": f"Last-state Redis write failed: {e}"})
+
+
+async def _from_redis(imeis: list[str]) -> dict:
+    client = _redis()
+    if client is None or not imeis:
+        return {}
+    try:
+        raw = await client.hmget(REDIS_DOC_KEY, imeis)
+    except Exception as e:
+        Logger.get_instance().log_warning({"message": f"Last-state Redis read failed: {e}"})
+        return {}
+    return {imei: json_util.loads(v) for imei, v in zip(imeis, raw) if v}
+
+
+# -----------------------------
+# CHANGE STREAM HANDLER
+# -----------------------------
+async def apply_packet(doc: dict):
+    """Insert handler (see SosWatcherService.register_insert_handler)."""
+    if remember(doc):
+        await _publish(doc)
+
+
+# -----------------------------
+# READS
+# -----------------------------
+async def get_many(db, imeis: list[str]) -> dict:
+    """
+    imei -> {"doc", "source", "updated_at"} for every IMEI with at least one packet.
+    source is "memory", "redis" or "mongo".
+    """
+    out = {}
+    missing = list(imeis)
+
+    if stream_active():
+        missing = []
+        for imei in imeis:
+            hit = STATE.get(imei)
+            if hit:
+                out[imei] = {"doc": hit["doc"], "source": "memory", "updated_at": hit["updated_at"]}
+            else:
+                missing.append(imei)
+
+        for imei, doc in (await _from_redis(missing)).items():
+            remember(doc)
+            out[imei] = {"doc": doc, "source": "redis", "updated_at": time.time()}
+        missing = [imei for imei in missing if imei not in out]
+
+    if missing:
+        for imei, doc in (await latest_by_imei(db, missing, STATE_PROJECTION)).items():
+            if remember(doc):
+                await _publish(doc)
+            out[imei] = {"doc": doc, "source": "mongo", "updated_at": time.time()}
+    return out
+
+
+async def get_latest(db, imei: str):
+    """Newest document for one IMEI (or None)."""
+    hit = (await get_many(db, [imei])).get(imei)
+    return hit["doc"] if hit else None
+
+
+async def fleet_imeis(db) -> list[str]:
+    """Every registered device (devices_master), falling back to whatever is cached."""
+    imeis = await db.get_collection(DeviceMaster).distinct("imei")
+    return sorted({i for i in imeis if i} | set(STATE))
+
+
+async def last_positions(db, imeis: list[str] | None = None, stale_after_sec: int | None = None) -> list[dict]:
+    """Last fix of each device with freshness metadata, for map views."""
+    imeis = imeis if imeis is not None else await fleet_imeis(db)
+    stale_after = stale_after_sec if stale_after_sec is not None else settings.LAST_STATE_STALE_SEC
+    states = await get_many(db, imeis)
+    now_ms = int(time.time() * 1000)
+
+    out = []
+    for imei in imeis:
+        hit = states.get(imei)
+        if not hit:
+            continue
+        doc = hit["doc"]
+        ts = to_epoch_ms(doc.get("device_timestamp"))
+        age = round((now_ms - ts) / 1000, 1) if ts is not None else None
+        out.append({
+            "imei": imei,
+            "latitude": doc.get("latitude"),
+            "longitude": doc.get("longitude"),
+            "speed": doc.get("speed"),
+            "deviceTimestamp": doc["device_timestamp"].isoformat() if doc.get("device_timestamp") else None,
+            "ageSec": age,
+            "stale": age is None or age > stale_after,
+            "source": hit["source"],
+            "cachedAt": hit["updated_at"],
+        })
+    return out
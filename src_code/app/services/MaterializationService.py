@@ -0,0 +1,146 @@
+# app/services/MaterializationService.py
+from pymongo import UpdateOne
+from datetime import datetime, timedelta, timezone
+from app.config.config import settings
+from app.models.DistanceHourly import DistanceHourly
+from app.models.DailyDeviceStats import DailyDeviceStats
+from app.models.AnalyticsData import analytics_collection
+from app.utils.timestamps import to_ist_naive
+from app.services.UptimeService import fleet_uptime
+from app.services.LastKnownStateService import fleet_imeis
+from app.services.TrajectoryService import load_trajectory, segment_distances_km
+
+"""
+Daily per-device materializations (collection analytics_daily), run by JobSchedulerService.
+
+Each job walks the complete IST days after its checkpoint (the last day it wrote) up to
+yesterday and yields after every day, so progress survives restarts and lost leases. On
+its first run a job fills in MATERIALIZE_BACKFILL_DAYS days. Jobs $set only their own
+fields, so re-running a day overwrites it and the jobs never clobber each other.
+"""
+
+IMEI_BATCH = 200
+
+
+def _days_after(checkpoint: datetime | None):
+    today = to_ist_naive(datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0)
+    day = checkpoint + timedelta(days=1) if checkpoint else today - timedelta(days=settings.MATERIALIZE_BACKFILL_DAYS)
+    while day < today:
+        yield day
+        day += timedelta(days=1)
+
+
+def _batches(items: list, size: int = IMEI_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def _write(db, day: datetime, fields_by_imei: dict) -> int:
+    if not fields_by_imei:
+        return 0
+    now = datetime.now()
+    await db.get_collection(DailyDeviceStats).bulk_write(
+        [
+            UpdateOne({"imei": imei, "day": day}, {"$set": {**fields, "updated_at": now}}, upsert=True)
+            for imei, fields in fields_by_imei.items()
+        ],
+        ordered=False,
+    )
+    return len(fields_by_imei)
+
+
+# -----------------------------
+# JOBS
+# -----------------------------
+async def materialize_daily_uptime(db, checkpoint):
+    imeis = await fleet_imeis(db)
+    for day in _days_after(checkpoint):
+        rows = 0
+        for batch in _batches(imeis):
+            reports = await fleet_uptime(db, batch, hours=24, end=day + timedelta(days=1))
+            rows += await _write(db, day, {
+                r["imei"]: {
+                    "uptime_score": r["score"],
+                    "received_packets": r["receivedPackets"],
+                    "expected_packets": r["expectedPackets"],
+                    "largest_gap_sec": r["largestGapSec"],
+                    "dropouts": r["dropouts"],
+                }
+                for r in reports
+            })
+        yield rows, day
+
+
+async def _distance_from_rollups(db, imeis: list[str], day: datetime) -> dict:
+    cursor = db.get_collection(DistanceHourly).aggregate([
+        {"$match": {"imei": {"$in": imeis}, "hour": {"$gte": day, "$lt": day + timedelta(days=1)}}},
+        {"$group": {"_id": "$imei", "km": {"$sum": "$km"}}},
+    ])
+    return {row["_id"]: row["km"] async for row in cursor}
+
+
+async def _distance_from_raw(db, imeis: list[str], day: datetime) -> dict:
+    raw = analytics_collection(db)
+    out = {}
+    for imei in imeis:
+        traj = (await load_trajectory(raw, {"imei": imei, "device_timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}})).dedupe()
+        out[imei] = float(segment_distances_km(traj.lat, traj.lon).sum())
+    return out
+
+
+async def materialize_daily_distance(db, checkpoint):
+    imeis = await fleet_imeis(db)
+    for day in _days_after(checkpoint):
+        rows = 0
+        for batch in _batches(imeis):
+            if settings.DISTANCE_ROLLUPS_ENABLED:
+                km = await _distance_from_rollups(db, batch, day)
+            else:
+                km = await _distance_from_raw(db, batch, day)
+            rows += await _write(db, day, {imei: {"distance_km": round(km.get(imei, 0.0), 3)} for imei in batch})
+        yield rows, day
+
+
+def alert_pipeline(day: datetime):
+    """Packets carrying an Alert per (imei, alert) for one IST day, over the device_timestamp index."""
+    return [
+        {"$match": {"device_timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}, "Alert": {"$nin": [None, ""]}}},
+        {"$group": {"_id": {"imei": "$imei", "alert": "$Alert"}, "n": {"$sum": 1}}},
+    ]
+
+
+async def materialize_daily_alerts(db, checkpoint):
+    imeis = await fleet_imeis(db)
+    for day in _days_after(checkpoint):
+        counts = {imei: {} for imei in imeis}
+        async for row in analytics_collection(db).aggregate(alert_pipeline(day), allowDiskUse=True):
+            imei = row["_id"].get("imei")
+            if imei:
+                counts.setdefault(imei, {})[str(row["_id"]["alert"])] = row["n"]
+
+        fields = {imei: {"alert_counts": c, "alert_total": sum(c.values())} for imei, c in counts.items()}
+        rows = 0
+        for batch in _batches(list(fields)):
+            rows += await _write(db, day, {imei: fields[imei] for imei in batch})
+        yield rows, day
+
+
+MATERIALIZATION_JOBS = {
+    "daily_uptime": materialize_daily_uptime,
+    "daily_distance": materialize_daily_distance,
+    "daily_alerts": materialize_daily_alerts,
+}
+
+
+# -----------------------------
+# READS
+# -----------------------------
+async def daily_stats(db, imeis: list[str], days: int = 7) -> list[dict]:
+    """Materialized rows for `imeis` over the last `days` complete days, newest day first per device."""
+    today = to_ist_naive(datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0)
+    cursor = db.get_collection(DailyDeviceStats).find(
+        {"imei": {"$in": imeis}, "day": {"$gte": today - timedelta(days=days)}},
+        {"_id": 0, "updated_at": 0},
+        sort=[("imei", 1), ("day", -1)],
+    )
+    return [doc async for doc in cursor]
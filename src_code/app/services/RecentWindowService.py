@@ -0,0 +1,259 @@
+# app/services/RecentWindowService.py
+import time
+import numpy as np
+from statistics import stdev, mean
+from collections import OrderedDict
+from app.config.config import settings
+from app.utils.timestamps import to_epoch_ms
+from app.utils.telemetry import numeric, numeric_projection, temperature_of, to_number
+from app.services.AnalyticsBatchService import recent_by_imei
+from app.services.SosWatcherService import stream_active, stream_generation
+
+"""
+Per-device ring buffers of the last WINDOW_SIZE packets, as one NumPy structured array
+per device, feeding analyticsHealth without a database round trip.
+
+- Buffers are created on first read (primed from Mongo with one indexed find per device,
+  run concurrently) and kept current by the analytics_data insert change stream.
+- Only devices somebody reads are buffered; the least recently read are evicted past
+  RECENT_WINDOW_MAX_DEVICES, and any buffer unread for RECENT_WINDOW_IDLE_SEC is dropped.
+- Buffers are only trusted while the change stream is open and was not reopened since
+  they were primed (it may have missed inserts); otherwise they are reloaded.
+
+Memory: one row is 45 bytes (ts i8, lat/lon/temp/signal f8, speed f4, normal bool), so
+200 rows = 9.0 KB per device plus ~0.3 KB of array/object overhead:
+≈ 93 MB for 10,000 buffered devices (the default cap).
+"""
+
+WINDOW_SIZE = 200       # packets per device scored by analyticsHealth
+
+ROW_DTYPE = np.dtype([
+    ("ts", "i8"),           # device_timestamp, epoch ms (-1 when missing)
+    ("lat", "f8"),
+    ("lon", "f8"),
+    ("temp", "f8"),         # temperature (v2) or raw_temperature without the trailing "c"
+    ("signal", "f8"),
+    ("speed", "f4"),
+    ("normal", "?"),        # packet == "N"
+])
+
+# Source keys a row is built from
+WINDOW_PROJECTION = {
+    "_id": 0, "packet": 1, "speed": 1, "temperature": 1, "raw_temperature": 1, "device_timestamp": 1,
+    **numeric_projection("latitude", "longitude", "Signal"),
+}
+
+
+def _num(x):
+    value = to_number(x)
+    return np.nan if value is None else value
+
+
+def _row(doc: dict):
+    ts = to_epoch_ms(doc.get("device_timestamp"))
+    return (
+        ts if ts is not None else -1,
+        _num(numeric(doc, "latitude")),
+        _num(numeric(doc, "longitude")),
+        _num(temperature_of(doc)),
+        _num(numeric(doc, "Signal")),
+        _num(doc.get("speed")),
+        doc.get("packet") == "N",
+    )
+
+
+class DeviceWindow:
+    __slots__ = ("rows", "size", "generation", "last_read")
+
+    def __init__(self, generation: int):
+        self.rows = np.zeros(WINDOW_SIZE, dtype=ROW_DTYPE)
+        self.size = 0
+        self.generation = generation
+        self.last_read = time.monotonic()
+
+    @classmethod
+    def from_documents(cls, docs, generation: int):
+        window = cls(generation)
+        for doc in docs[:WINDOW_SIZE]:
+            window.push(doc)
+        return window
+
+    def push(self, doc: dict):
+        row = _row(doc)
+        if self.size < WINDOW_SIZE:
+            idx = self.size
+            self.size += 1
+        else:
+            # replace the oldest packet; a late packet older than the whole window is dropped
+            idx = int(np.argmin(self.rows["ts"]))
+            if row[0] < self.rows["ts"][idx]:
+                return
+        self.rows[idx] = row
+
+    def newest_first(self) -> np.ndarray:
+        rows = self.rows[:self.size]
+        return rows[np.argsort(-rows["ts"], kind="stable")]
+
+
+# imei -> DeviceWindow, least recently read first
+WINDOWS = OrderedDict()
+# imei -> packets seen by the stream while the device's buffer was being primed
+_PRIMING = {}
+
+
+def _evict():
+    idle_before = time.monotonic() - settings.RECENT_WINDOW_IDLE_SEC
+    while WINDOWS:
+        imei, window = next(iter(WINDOWS.items()))
+        if len(WINDOWS) <= settings.RECENT_WINDOW_MAX_DEVICES and window.last_read >= idle_before:
+            break
+        WINDOWS.popitem(last=False)
+
+
+# -----------------------------
+# CHANGE STREAM HANDLER
+# -----------------------------
+async def apply_packet(doc: dict):
+    """Insert handler (see SosWatcherService.register_insert_handler)."""
+    imei = doc.get("imei")
+    if imei in _PRIMING:
+        _PRIMING[imei].append(doc)
+    window = WINDOWS.get(imei)
+    if window is not None and window.generation == stream_generation():
+        window.push(doc)
+
+
+# -----------------------------
+# READS
+# -----------------------------
+async def windows(db, imeis: list[str]) -> dict:
+    """imei -> rows of its last WINDOW_SIZE packets, newest first (possibly empty)."""
+    active, generation, now = stream_active(), stream_generation(), time.monotonic()
+    out, missing = {}, []
+
+    for imei in imeis:
+        window = WINDOWS.get(imei)
+        if active and window is not None and window.generation == generation:
+            window.last_read = now
+            WINDOWS.move_to_end(imei)
+            out[imei] = window.newest_first()
+        else:
+            missing.append(imei)
+
+    if missing:
+        if active:
+            for imei in missing:
+                _PRIMING[imei] = []
+        try:
+            docs = await recent_by_imei(db, missing, WINDOW_SIZE, WINDOW_PROJECTION)
+        finally:
+            pending = {imei: _PRIMING.pop(imei, []) for imei in missing}
+
+        for imei in missing:
+            window = DeviceWindow.from_documents(docs.get(imei, []), generation)
+            if active:
+                # packets inserted while the read ran may or may not be in its result
+                seen = set(window.rows["ts"][:window.size].tolist())
+                for doc in pending[imei]:
+                    if _row(doc)[0] not in seen:
+                        window.push(doc)
+                WINDOWS[imei] = window
+                WINDOWS.move_to_end(imei)
+            out[imei] = window.newest_first()
+        _evict()
+    return out
+
+
+# -----------------------------
+# HEALTH SCORING (on newest-first rows)
+# -----------------------------
+def _present(values: np.ndarray) -> list:
+    # same filter as the dict-based scorers: parseable and non-zero
+    return values[np.isfinite(values) & (values != 0)].tolist()
+
+
+def gps_score(rows: np.ndarray) -> float:
+    # use ONLY last 10 Normal packets
+    normals = rows[rows["normal"]][:10]
+    if len(normals) < 3:
+        return 0.0  # not enough data
+
+    lats = _present(normals["lat"])
+    lons = _present(normals["lon"])
+    signals = _present(normals["signal"])
+    if len(lats) < 3 or len(lons) < 3:
+        return 0.0
+
+    avg_signal = mean(signals) if signals else 0
+
+    # Scoring rule
+    score = 100
+    score -= stdev(lats) * 5
+    score -= stdev(lons) * 5
+    score -= max(0, 100 - avg_signal)
+    return max(0, min(100, round(score, 2)))
+
+
+MOVEMENT_CLASSES = ["stationary", "crawling", "cruising", "highway", "overspeed"]
+
+
+def movement(rows: np.ndarray, n: int = 50) -> list[str]:
+    speed = rows["speed"][:n].astype(np.float64)
+    labels = np.select(
+        [np.isnan(speed), speed <= 1, speed <= 5, speed <= 45, speed <= 70],
+        ["unknown", "stationary", "crawling", "cruising", "highway"],
+        default="overspeed",
+    )
+    return labels.tolist()
+
+
+def temperature_health(rows: np.ndarray):
+    temps = _present(rows["temp"])
+    if not temps:
+        return (100, "normal")
+
+    latest = temps[0]
+    thi = 100
+
+    # High temperature penalty
+    if latest > 60:
+        thi -= 50
+    elif latest > 50:
+        thi -= 30
+    elif latest > 45:
+        thi -= 15
+
+    # Temperature rising quickly?
+    if len(temps) >= 3 and (temps[0] - temps[2] > 5):
+        thi -= 20
+
+    thi = max(0, min(100, thi))
+    status = (
+        "critical" if thi < 40 else
+        "warning" if thi < 60 else
+        "warm" if thi < 80 else
+        "normal"
+    )
+    return (thi, status)
+
+
+def health_summary(rows: np.ndarray) -> dict:
+    """analyticsHealth payload for one device's newest-first rows."""
+    if not len(rows):
+        return {
+            "gpsScore": 0,
+            "movement": [],
+            "movementStats": [],
+            "temperatureHealthIndex": 100,
+            "temperatureStatus": "normal",
+        }
+
+    movement_list = movement(rows)
+    thi, temp_status = temperature_health(rows)
+    return {
+        "gpsScore": gps_score(rows),
+        "movement": movement_list,
+        "movementStats": [f"{m}:{movement_list.count(m)}" for m in MOVEMENT_CLASSES],
+        "temperatureHealthIndex": thi,
+        "temperatureStatus": temp_status,
+    }
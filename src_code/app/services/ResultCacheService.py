@@ -0,0 +1,125 @@
+# app/services/ResultCacheService.py
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+from redis.exceptions import RedisError
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.middleware import redis_rate_limiter
+from app.config.ResultCacheTTL import RESULT_CACHE_TTL
+
+"""
+Redis result cache for per-IMEI analytics resolvers, on the rate limiter's Redis.
+
+Key: rc:<resolver>:<imei>:<generation>:<args hash>:<time bucket>
+- generation is a per-IMEI counter bumped by the analytics_data insert change stream,
+  so a new packet makes every cached result of that device unreachable at once.
+- the time bucket is the resolver TTL (config/ResultCacheTTL.py); entries also expire by TTL.
+
+Stampede protection: on a miss, one worker wins a SET NX lock per key and computes; the
+others wait up to LOCK_WAIT_SEC for its result and only then compute themselves.
+Redis errors never fail a request — the result is just computed.
+"""
+
+GEN_KEY = "rc:gen:{imei}"
+LOCK_TTL_MS = 10_000        # a crashed worker's lock frees itself after this
+LOCK_WAIT_SEC = 3.0
+LOCK_POLL_SEC = 0.05
+
+WORKER_ID = uuid.uuid4().hex
+
+
+def _client():
+    return redis_rate_limiter.redis_client if settings.RESULT_CACHE_ENABLED else None
+
+
+def _key(resolver: str, imei: str, generation, args: tuple, ttl: int) -> str:
+    digest = hashlib.sha1(json.dumps(args, default=str).encode()).hexdigest()[:12]
+    return f"rc:{resolver}:{imei}:{generation or 0}:{digest}:{int(time.time() // ttl)}"
+
+
+async def _store(client, keys: dict, values: dict, ttl: int):
+    pipe = client.pipeline(transaction=False)
+    for imei, value in values.items():
+        pipe.set(keys[imei], json.dumps(value), ex=ttl)
+        pipe.delete(f"lock:{keys[imei]}")
+    await pipe.execute()
+
+
+async def cached_many(resolver: str, imeis: list[str], args: tuple, compute) -> dict:
+    """
+    imei -> result for every IMEI. `compute(imeis)` is awaited only for the IMEIs that are
+    neither cached nor being computed by another worker, and must return JSON-safe values.
+    """
+    client = _client()
+    ttl = RESULT_CACHE_TTL.get(resolver)
+    if client is None or not ttl or not imeis:
+        return await compute(imeis)
+
+    logger = Logger.get_instance()
+    try:
+        generations = await client.mget([GEN_KEY.format(imei=imei) for imei in imeis])
+        keys = {imei: _key(resolver, imei, gen, args, ttl) for imei, gen in zip(imeis, generations)}
+        cached = await client.mget(list(keys.values()))
+    except RedisError as e:
+        logger.log_warning({"message": f"Result cache read failed ({resolver}): {e}"})
+        return await compute(imeis)
+
+    out = {imei: json.loads(v) for imei, v in zip(imeis, cached) if v is not None}
+    missing = [imei for imei in imeis if imei not in out]
+    if not missing:
+        return out
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        for imei in missing:
+            pipe.set(f"lock:{keys[imei]}", WORKER_ID, nx=True, px=LOCK_TTL_MS)
+        won = await pipe.execute()
+    except RedisError as e:
+        logger.log_warning({"message": f"Result cache lock failed ({resolver}): {e}"})
+        won = [True] * len(missing)
+
+    mine = [imei for imei, ok in zip(missing, won) if ok]
+    theirs = [imei for imei, ok in zip(missing, won) if not ok]
+
+    if mine:
+        computed = await compute(mine)
+        out.update(computed)
+        try:
+            await _store(client, keys, {imei: computed[imei] for imei in mine if imei in computed}, ttl)
+        except RedisError as e:
+            logger.log_warning({"message": f"Result cache write failed ({resolver}): {e}"})
+
+    # Another worker is computing these: wait for its result, then give up and compute
+    deadline = time.monotonic() + LOCK_WAIT_SEC
+    while theirs and time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_SEC)
+        try:
+            values = await client.mget([keys[imei] for imei in theirs])
+        except RedisError:
+            break
+        for imei, v in zip(theirs, values):
+            if v is not None:
+                out[imei] = json.loads(v)
+        theirs = [imei for imei in theirs if imei not in out]
+
+    if theirs:
+        out.update(await compute(theirs))
+    return out
+
+
+# -----------------------------
+# CHANGE STREAM HANDLER
+# -----------------------------
+async def apply_packet(doc: dict):
+    """Insert handler: invalidate every cached result of the packet's IMEI."""
+    client = _client()
+    imei = doc.get("imei")
+    if client is None or not imei:
+        return
+    try:
+        await client.incr(GEN_KEY.format(imei=imei))
+    except RedisError as e:
+        Logger.get_instance().log_warning({"message": f"Result cache invalidation failed: {e}"})
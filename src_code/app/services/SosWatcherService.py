@@ -1,6 +1,89 @@
+import asyncio
+from bson import ObjectId
 from app.models import get_db
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from datetime import datetime, timedelta, timezone
 from app.websocket.ConnectionManager import manager
-from app.models.AnalyticsData import AnalyticsData
+from app.models.AnalyticsData import AnalyticsData, analytics_collection
+
+# Extra consumers of inserted analytics_data documents (rollups, caches, ...).
+# They share this single change stream (or, in time-series mode, the polling tail)
+# instead of each opening their own.
+INSERT_HANDLERS = []
+
+# Inserts waiting for INSERT_HANDLERS. The watcher only enqueues them, so an SOS broadcast
+# never waits behind the handlers' Mongo round-trips for earlier packets. One consumer
+# (run_insert_dispatcher) keeps them in stream order; a full queue pushes back on the watcher.
+_QUEUE = {"queue": None}
+
+# True while the change stream (or tail) is open; consumers that cache inserts only trust
+# their state while it is (otherwise they must read through to Mongo).
+# generation changes every time the stream (re)opens: state built under an older
+# generation may have missed inserts and must be reloaded.
+STREAM_STATE = {"active": False, "generation": 0}
+
+
+def stream_active() -> bool:
+    return STREAM_STATE["active"]
+
+
+def stream_generation() -> int:
+    return STREAM_STATE["generation"]
+
+
+def register_insert_handler(handler):
+    if handler not in INSERT_HANDLERS:
+        INSERT_HANDLERS.append(handler)
+
+
+async def dispatch_insert(data: dict):
+    for handler in INSERT_HANDLERS:
+        try:
+            await handler(data)
+        except Exception as e:
+            Logger.get_instance().log_error({"message": f"Insert handler {handler.__name__} failed: {e}"})
+
+
+def insert_queue() -> asyncio.Queue:
+    if _QUEUE["queue"] is None:
+        _QUEUE["queue"] = asyncio.Queue(maxsize=settings.INSERT_QUEUE_SIZE)
+    return _QUEUE["queue"]
+
+
+async def run_insert_dispatcher():
+    """Background loop started from lifespan: runs INSERT_HANDLERS for every queued insert."""
+    queue = insert_queue()
+    while True:
+        data = await queue.get()
+        try:
+            await dispatch_insert(data)
+        finally:
+            queue.task_done()
+
+
+async def handle_insert(data: dict):
+
+    alert = data.get("Alert")
+    sos_disabled = bool(data.get("sos_disabled", False))
+
+    print("Alert value:", alert)
+
+    if alert == "A1002" and not sos_disabled:
+
+        payload = {
+            "event": "SOS_ALERT",
+            "imei": data.get("imei"),
+            "alert": alert,
+            "timestamp": str(data.get("device_timestamp"))
+        }
+
+        print("Sending SOS event:", payload)
+
+        await manager.broadcast(payload)
+
+    if INSERT_HANDLERS:
+        await insert_queue().put(data)
 
 
 async def watch_sos_events():
@@ -10,6 +93,11 @@ async def watch_sos_events():
     # GET ENGINE AFTER DB INIT
     engine = get_db()
 
+    if settings.ANALYTICS_TIMESERIES_ENABLED:
+        # Time-series collections do not support change streams
+        await tail_timeseries_inserts(analytics_collection(engine))
+        return
+
     collection = engine.get_collection(AnalyticsData)
 
     pipeline = [
@@ -20,31 +108,63 @@ async def watch_sos_events():
         }
     ]
 
-    async with collection.watch(pipeline) as stream:
-
-        async for change in stream:
-
-            print("Mongo change detected:", change)
-
-            data = change.get("fullDocument")
-
-            if not data:
-                continue
-
-            alert = data.get("Alert")
-            sos_disabled = bool(data.get("sos_disabled", False))
-
-            print("Alert value:", alert)
-
-            if alert == "A1002" and not sos_disabled:
-
-                payload = {
-                    "event": "SOS_ALERT",
-                    "imei": data.get("imei"),
-                    "alert": alert,
-                    "timestamp": str(data.get("device_timestamp"))
-                }
-
-                print("Sending SOS event:", payload)
-
-                await manager.broadcast(payload)
\ No newline at end of file
+    try:
+        async with collection.watch(pipeline) as stream:
+            STREAM_STATE["generation"] += 1
+            STREAM_STATE["active"] = True
+
+            async for change in stream:
+
+                print("Mongo change detected:", change)
+
+                data = change.get("fullDocument")
+
+                if not data:
+                    continue
+
+                await handle_insert(data)
+    finally:
+        STREAM_STATE["active"] = False
+
+
+async def tail_timeseries_inserts(collection):
+    """
+    Polling replacement for the change stream in time-series mode. Inserts are followed in
+    insertion order through their ObjectId _id (generated by the writer at insert time,
+    indexed, see TIMESERIES_INDEXES), not device_timestamp, so late and buffered packets are
+    dispatched like any other. Every ANALYTICS_TAIL_POLL_SEC the ids from the newest one
+    seen minus ANALYTICS_TAIL_OVERLAP_SEC are read (ObjectId time has 1 s resolution and
+    writers' clocks differ slightly) and the unseen ones dispatched in _id order.
+    Packets already stored when the tail starts are not replayed. While
+    migrate_analytics_timeseries --follow copies packets (keeping their _id), the overlap must cover
+    its copy lag.
+    """
+    overlap = timedelta(seconds=settings.ANALYTICS_TAIL_OVERLAP_SEC)
+    newest = datetime.now(timezone.utc)
+    seen = set()        # ids at or after the current floor
+
+    try:
+        STREAM_STATE["generation"] += 1
+        STREAM_STATE["active"] = True
+
+        while True:
+            floor = ObjectId.from_datetime(newest - overlap)
+            window = {"_id": {"$gte": floor}}
+
+            fresh = []
+            async for row in collection.find(window, {"_id": 1}, sort=[("_id", 1)]):
+                if row["_id"] not in seen:
+                    seen.add(row["_id"])
+                    fresh.append(row["_id"])
+
+            if fresh:
+                newest = max(newest, fresh[-1].generation_time)
+                cursor = collection.find({"_id": {"$in": fresh}}, sort=[("_id", 1)])
+                async for data in cursor:
+                    await handle_insert(data)
+
+            floor = ObjectId.from_datetime(newest - overlap)
+            seen = {oid for oid in seen if oid >= floor}
+            await asyncio.sleep(settings.ANALYTICS_TAIL_POLL_SEC)
+    finally:
+        STREAM_STATE["active"] = False
@@ -0,0 +1,71 @@
+# app/services/TelemetrySchemaService.py
+from pymongo import UpdateOne
+from datetime import datetime
+from app.models import get_db
+from app.config.config import settings
+from app.libraries.Logger import Logger
+from app.models.MigrationCheckpoint import MigrationCheckpoint
+from app.models.AnalyticsData import AnalyticsData, analytics_collection
+from app.utils.telemetry import SCHEMA_VERSION, is_v2, v2_fields
+
+"""
+Upgrade of analytics_data packets to the v2 shape (typed copies of the numeric fields, see
+app/utils/telemetry.py). The device's text fields are only read, never written, so an
+upgrade (or a re-run of one) cannot lose data.
+
+- new packets: ingest lives outside this service, so the insert handler upgrades each
+  inserted v1 packet with one $set by _id (TELEMETRY_V2_ENABLED). It also writes location,
+  so it replaces the GEO_LOCATION_ENABLED handler. In time-series mode ingest must write
+  v2 itself; the time-series copy already does.
+- old packets: migrate() walks analytics_data by _id in batches, checkpointed in
+  migration_checkpoints, so it can be stopped and resumed at any time.
+
+Readers use the typed fields of v2 packets and parse the text only of packets not upgraded
+yet (numeric / temperature_of), so the upgrade can run while the API serves traffic.
+"""
+
+CHECKPOINT = "analytics_schema_v2"
+SOURCE_FIELDS = {"_id": 1, "latitude": 1, "longitude": 1, "Battery": 1, "Signal": 1, "raw_temperature": 1, "location": 1}
+
+
+async def apply_packet(doc: dict):
+    """Insert handler (see SosWatcherService.register_insert_handler)."""
+    if settings.ANALYTICS_TIMESERIES_ENABLED or is_v2(doc) or "_id" not in doc:
+        return
+    await analytics_collection(get_db()).update_one({"_id": doc["_id"]}, {"$set": v2_fields(doc)})
+
+
+async def migrate(batch_size: int = 5000) -> int:
+    """Upgrade every v1 packet. Returns the number of packets upgraded (over all runs)."""
+    db = get_db()
+    logger = Logger.get_instance()
+    source = db.get_collection(AnalyticsData)
+    checkpoints = db.get_collection(MigrationCheckpoint)
+
+    cp = await checkpoints.find_one({"name": CHECKPOINT}) or {}
+    position = cp.get("last_id")
+    upgraded = cp.get("copied", 0)
+
+    while True:
+        query = {"schema_version": {"$ne": SCHEMA_VERSION}}
+        if position:
+            query["_id"] = {"$gt": position}
+        batch = await source.find(query, SOURCE_FIELDS, sort=[("_id", 1)], limit=batch_size).to_list(None)
+        if not batch:
+            break
+
+        await source.bulk_write([UpdateOne({"_id": d["_id"]}, {"$set": v2_fields(d)}) for d in batch], ordered=False)
+        upgraded += len(batch)
+        position = batch[-1]["_id"]
+
+        await checkpoints.update_one(
+            {"name": CHECKPOINT},
+            {"$set": {"last_id": position, "copied": upgraded, "done": False, "updated_at": datetime.now()}},
+            upsert=True,
+        )
+        logger.log_info({"message": f"telemetry v2 migration: upgraded={upgraded} last_id={position}"})
+
+    await checkpoints.update_one(
+        {"name": CHECKPOINT}, {"$set": {"done": True, "updated_at": datetime.now()}}, upsert=True
+    )
+    return upgraded
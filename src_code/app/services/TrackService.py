@@ -0,0 +1,70 @@
+# app/services/TrackService.py
+import math
+import asyncio
+import numpy as np
+from datetime import datetime, timedelta
+from app.helpers.PolylineHelper import PolylineHelper
+from app.models.AnalyticsData import analytics_collection
+from app.utils.timestamps import from_epoch_ms, to_ist, to_ist_naive
+from app.services.TrajectoryService import simplify_mask, stream_trajectory
+
+"""
+Simplified tracks for map replay.
+
+The range is streamed off the (imei, device_timestamp) index as lat/lon/ts columns, fixes
+without a usable position and consecutive duplicates are dropped, and Douglas-Peucker
+keeps only the fixes needed to stay within the tolerance of the full track. The result is
+an encoded polyline plus per-point time offsets, so a day of 10 s packets is a few
+kilobytes instead of thousands of JSON rows.
+
+The tolerance is given in metres, or derived from a web-map zoom level as the ground size
+of one screen pixel at the track's latitude (nothing the map could draw is lost).
+"""
+
+DEFAULT_TOLERANCE_M = 5.0
+MAX_TOLERANCE_M = 5000.0
+MAX_TRACK_DAYS = 31
+MAX_ZOOM = 22
+METERS_PER_PIXEL_Z0 = 156543.03392      # web mercator, 256 px tiles, at the equator
+
+
+def zoom_tolerance_m(zoom: int, lat: float) -> float:
+    zoom = max(0, min(int(zoom), MAX_ZOOM))
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+async def device_track(db, imei: str, start: datetime, end: datetime, tolerance_m: float | None = None, zoom: int | None = None) -> dict:
+    """
+    Simplified track of `imei` over [start, end). `tolerance_m` wins over `zoom`; with
+    neither, DEFAULT_TOLERANCE_M. Raises ValueError on an empty or over-long range.
+    """
+    start, end = to_ist_naive(start), to_ist_naive(end)
+    if end <= start:
+        raise ValueError("'to' must be after 'from'")
+    if end - start > timedelta(days=MAX_TRACK_DAYS):
+        raise ValueError(f"Track range is limited to {MAX_TRACK_DAYS} days")
+
+    traj = (await stream_trajectory(
+        analytics_collection(db), {"imei": imei, "device_timestamp": {"$gte": start, "$lt": end}}
+    )).with_fix().dedupe()
+
+    if tolerance_m is not None:
+        tolerance = max(0.0, min(float(tolerance_m), MAX_TOLERANCE_M))
+    elif zoom is not None:
+        tolerance = zoom_tolerance_m(zoom, float(np.mean(traj.lat)) if len(traj) else 0.0)
+    else:
+        tolerance = DEFAULT_TOLERANCE_M
+
+    # CPU-bound on long ranges: keep the event loop (and the SOS watcher) responsive
+    keep = await asyncio.to_thread(simplify_mask, traj.lat, traj.lon, tolerance)
+    lat, lon, ts = traj.lat[keep], traj.lon[keep], traj.ts[keep]
+    return {
+        "imei": imei,
+        "startTs": to_ist(from_epoch_ms(ts[0])).isoformat() if len(ts) else None,
+        "endTs": to_ist(from_epoch_ms(ts[-1])).isoformat() if len(ts) else None,
+        "polyline": PolylineHelper.encode(lat, lon),
+        "offsetsSec": ((ts - ts[0]) // 1000).tolist() if len(ts) else [],
+        "points": int(len(ts)),
+        "sourcePoints": int(len(traj)),
+        "toleranceM": round(tolerance, 2),
+    }
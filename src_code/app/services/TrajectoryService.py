@@ -0,0 +1,244 @@
+# app/services/TrajectoryService.py
+import math
+import numpy as np
+from datetime import datetime
+from app.utils.timestamps import IST, IST_OFFSET_MS, epoch_ms_column, to_epoch_ms
+from app.utils.telemetry import numeric, numeric_projection
+
+EARTH_RADIUS_KM = 6371.0
+
+HOUR_MS = 3600 * 1000
+
+# Source keys a trajectory is built from (typed v2 lat/lon, or the text of older packets)
+TRAJECTORY_PROJECTION = {"_id": 0, "device_timestamp": 1, **numeric_projection("latitude", "longitude")}
+
+
+# -----------------------------
+# COLUMN LOADING
+# -----------------------------
+def _to_float(value):
+    return np.nan if value is None else value
+
+
+class Trajectory:
+    """Column-oriented track of one device: lat/lon in degrees, ts in epoch ms, ascending."""
+
+    __slots__ = ("lat", "lon", "ts")
+
+    def __init__(self, lat, lon, ts):
+        self.lat = lat
+        self.lon = lon
+        self.ts = ts
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def from_documents(cls, docs, ts_key="device_timestamp"):
+        """Build from raw Mongo documents (see TRAJECTORY_PROJECTION); rows without a usable timestamp are dropped."""
+        ts, valid = epoch_ms_column(d.get(ts_key) for d in docs)
+        lat = np.fromiter((_to_float(numeric(d, "latitude")) for d in docs), dtype=np.float64, count=len(docs))
+        lon = np.fromiter((_to_float(numeric(d, "longitude")) for d in docs), dtype=np.float64, count=len(docs))
+        return cls(lat[valid], lon[valid], ts[valid]).sorted()
+
+    def sorted(self):
+        if len(self.ts) > 1 and np.any(self.ts[1:] < self.ts[:-1]):
+            order = np.argsort(self.ts, kind="stable")
+            return Trajectory(self.lat[order], self.lon[order], self.ts[order])
+        return self
+
+    def since(self, cutoff_ms):
+        mask = self.ts >= cutoff_ms
+        return Trajectory(self.lat[mask], self.lon[mask], self.ts[mask])
+
+    def with_fix(self):
+        """Only fixes with a usable position: finite, in range and not the (0, 0) no-lock fix."""
+        ok = np.isfinite(self.lat) & np.isfinite(self.lon) & ~((self.lat == 0) & (self.lon == 0))
+        ok &= (np.abs(self.lat) <= 90) & (np.abs(self.lon) <= 180)
+        return Trajectory(self.lat[ok], self.lon[ok], self.ts[ok])
+
+    def dedupe(self):
+        """Drop consecutive identical fixes. Unparseable fixes (NaN) are always kept."""
+        if len(self.ts) < 2:
+            return self
+        keep = np.ones(len(self.ts), dtype=bool)
+        keep[1:] = ~((self.lat[1:] == self.lat[:-1]) & (self.lon[1:] == self.lon[:-1]))
+        return Trajectory(self.lat[keep], self.lon[keep], self.ts[keep])
+
+
+async def load_trajectory(collection, query):
+    """Stream only lat/lon/timestamp columns for `query`, oldest first."""
+    cursor = collection.find(
+        query,
+        TRAJECTORY_PROJECTION,
+        sort=[("device_timestamp", 1)],
+        batch_size=5000,
+    )
+    return Trajectory.from_documents(await cursor.to_list(length=None))
+
+
+async def stream_trajectory(collection, query, chunk_rows: int = 10_000):
+    """
+    load_trajectory for long ranges: converts the cursor to columns every `chunk_rows`
+    documents, so only one chunk of raw documents is held at a time.
+    """
+    cursor = collection.find(
+        query,
+        TRAJECTORY_PROJECTION,
+        sort=[("device_timestamp", 1)],
+        batch_size=5000,
+    )
+    parts, chunk = [], []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_rows:
+            parts.append(Trajectory.from_documents(chunk))
+            chunk = []
+    if chunk or not parts:
+        parts.append(Trajectory.from_documents(chunk))
+    if len(parts) == 1:
+        return parts[0]
+    return Trajectory(
+        np.concatenate([p.lat for p in parts]),
+        np.concatenate([p.lon for p in parts]),
+        np.concatenate([p.ts for p in parts]),
+    ).sorted()
+
+
+# -----------------------------
+# VECTORIZED MATH
+# -----------------------------
+def segment_distances_km(lat, lon):
+    """Haversine length of each consecutive segment; segments touching an invalid fix count 0."""
+    if len(lat) < 2:
+        return np.zeros(0, dtype=np.float64)
+
+    lat_r = np.radians(lat)
+    lon_r = np.radians(lon)
+    dlat = lat_r[1:] - lat_r[:-1]
+    dlon = lon_r[1:] - lon_r[:-1]
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_r[:-1]) * np.cos(lat_r[1:]) * np.sin(dlon / 2) ** 2
+    a = np.clip(a, 0.0, 1.0)
+    dist = 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return np.nan_to_num(dist, nan=0.0)
+
+
+def point_distance_km(lat1, lon1, lat2, lon2):
+    """Scalar haversine, for code that walks a track one fix at a time."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def simplify_mask(lat, lon, tolerance_m: float):
+    """
+    Douglas-Peucker over a local equirectangular projection (metres, exact enough at track
+    scale): True for the fixes to keep so that no dropped fix lies further than tolerance_m
+    from the simplified line. Endpoints are always kept. Splits are processed a level at a
+    time: every open span is measured in one vectorized pass, so the Python loop runs once
+    per level of the split tree rather than once per kept fix. CPU-bound on long tracks; call
+    it off the event loop.
+    """
+    n = len(lat)
+    if n < 3 or tolerance_m <= 0:
+        return np.ones(n, dtype=bool)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    scale = EARTH_RADIUS_KM * 1000 * np.pi / 180
+    y = np.asarray(lat, dtype=np.float64) * scale
+    x = np.asarray(lon, dtype=np.float64) * scale * np.cos(np.radians(np.mean(lat)))
+    tolerance2 = tolerance_m * tolerance_m
+
+    a, b = np.array([0]), np.array([n - 1])
+    while a.size:
+        inner = b - a - 1
+        open_ = inner > 0
+        a, b, inner = a[open_], b[open_], inner[open_]
+        if not a.size:
+            break
+
+        # interior fixes of every span, flattened; span[k] = which span fix k belongs to
+        first = np.cumsum(inner) - inner
+        span = np.repeat(np.arange(a.size), inner)
+        idx = a[span] + 1 + np.arange(inner.sum()) - first[span]
+
+        ax, ay = x[a][span], y[a][span]
+        dx, dy = (x[b] - x[a])[span], (y[b] - y[a])[span]
+        px, py = x[idx] - ax, y[idx] - ay
+        length2 = dx * dx + dy * dy
+        # distance to the segment (not the infinite line), so out-and-back legs survive
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(length2 > 0, np.clip((px * dx + py * dy) / length2, 0.0, 1.0), 0.0)
+        dist2 = (px - t * dx) ** 2 + (py - t * dy) ** 2
+
+        # farthest fix per span (the first one on ties, like np.argmax)
+        farthest = np.maximum.reduceat(dist2, first)
+        hits = np.flatnonzero(dist2 == farthest[span])
+        _, at = np.unique(span[hits], return_index=True)
+        mid = idx[hits[at]]
+
+        split = farthest > tolerance2
+        mid = mid[split]
+        keep[mid] = True
+        a, b = np.concatenate([a[split], mid]), np.concatenate([mid, b[split]])
+    return keep
+
+
+def hour_floor_ms(ts_ms):
+    """Start of the IST hour containing each epoch-ms timestamp."""
+    return ((ts_ms + IST_OFFSET_MS) // HOUR_MS) * HOUR_MS - IST_OFFSET_MS
+
+
+def hourly_distance_km(traj: Trajectory):
+    """
+    Distance travelled per IST hour. Each segment is credited to the hour of its end point.
+    Returns (hour_start_ms, km) arrays for hours that contain at least one segment end.
+    """
+    if len(traj) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    dist = segment_distances_km(traj.lat, traj.lon)
+    hours = hour_floor_ms(traj.ts[1:])
+    keys, inverse = np.unique(hours, return_inverse=True)
+    km = np.bincount(inverse, weights=dist, minlength=len(keys))
+    return keys, km
+
+
+def distance_buckets(traj: Trajectory, cutoff: datetime, hours: int = 24):
+    """
+    Build the analyticsDistance24 payload: `hours` hourly slots after the hour containing `cutoff`,
+    each with rounded distance and running total.
+    """
+    cutoff_ms = to_epoch_ms(cutoff)
+    traj = traj.since(cutoff_ms).dedupe()
+    if len(traj) < 2:
+        return []
+
+    keys, km = hourly_distance_km(traj)
+    first_slot = int(hour_floor_ms(np.int64(cutoff_ms))) + HOUR_MS
+
+    slots = np.zeros(hours, dtype=np.float64)
+    idx = (keys - first_slot) // HOUR_MS
+    valid = (idx >= 0) & (idx < hours)
+    slots[idx[valid]] = km[valid]
+
+    return build_bucket_payload(first_slot, slots, cutoff.tzinfo)
+
+
+def build_bucket_payload(first_slot_ms, km_per_slot, tz):
+    tz = tz or IST
+    out = []
+    running = 0.0
+    for i, km in enumerate(km_per_slot):
+        slot = datetime.fromtimestamp((first_slot_ms + i * HOUR_MS) / 1000, tz)
+        dist = round(float(km), 3)
+        running += dist
+        out.append({
+            "hour": slot.strftime("%H:00"),
+            "dateHour": slot.isoformat(),
+            "distance": dist,
+            "cumulative": round(running, 3)
+        })
+    return out
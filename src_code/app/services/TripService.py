@@ -0,0 +1,437 @@
+# app/services/TripService.py
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.models import get_db
+from app.libraries.Logger import Logger
+from app.models.DeviceTrip import DeviceTrip
+from app.models.TripRebuild import TripRebuild
+from app.models.AnalyticsData import analytics_collection
+from app.utils.timestamps import from_epoch_ms, to_epoch_ms, to_ist_naive
+from app.utils.telemetry import numeric, numeric_projection, to_number
+from app.services.TrajectoryService import point_distance_km
+
+"""
+Trip / stop segmentation of each device's GPS stream (collection `device_trips`).
+
+A device is always in one segment. A stop ends when a fix is both moving (reported speed,
+or the implied speed when the packet has none) and outside STOP_RADIUS_M of the stop
+position; the trip starts at the last fix of the stop. A trip ends when the device stays
+within STOP_RADIUS_M of its first slow fix for STOP_DWELL_SEC, so traffic lights and short
+queues do not split a trip. Silence longer than MAX_GAP_SEC closes the segment: if the
+device reappears where it went quiet it was parked, otherwise the gap belongs to no segment.
+
+Segments are built incrementally from the insert stream. The device's latest segment is
+stored open with the segmenter state, so each in-order packet costs one read and one write;
+closed segments are written once. Every replica runs the same handler: writes of the open
+document are conditional on the state.last it was read with, so the first replica to apply
+a packet wins and the others' writes match nothing. Unique (imei, kind, start_ts) and
+one-open-per-device indexes catch the rest.
+
+A late packet only marks the device in trip_rebuilds (the oldest late timestamp wins). The
+trip_rebuild job re-segments each marked device once, from the last segment that closed
+before that timestamp, after TRIP_REBUILD_SETTLE_SEC without further late packets: a device
+uploading its buffer after a reconnect costs one rebuild, and the stream never waits on one.
+While a rebuild runs it holds the device's open document (`rebuilding`); live packets
+only count themselves there, and the rebuild reads every packet inserted meanwhile before
+it hands the open segment back.
+"""
+
+MOVING_SPEED_KMH = 5        # RecentWindowService counts <= 5 km/h as crawling
+STOP_RADIUS_M = 150
+STOP_DWELL_SEC = 180
+MAX_GAP_SEC = 1800
+MAX_TRIPS = 1000
+KINDS = ("trip", "stop")
+
+TRIP_PROJECTION = {"_id": 1, "speed": 1, "device_timestamp": 1, **numeric_projection("latitude", "longitude")}
+REBUILD_BATCH = 5000
+INSERT_CHUNK = 500
+TRIP_REBUILD_SETTLE_SEC = 120
+TRIP_REBUILD_BATCH = 100
+TRIP_REBUILD_LOCK_SEC = 600     # a rebuild that held the open segment longer has died
+
+
+def _point(doc: dict):
+    """(ts_ms, lat, lon, speed) of a packet with a usable fix, else None. speed may be None."""
+    ts = to_epoch_ms(doc.get("device_timestamp"))
+    lat, lon = numeric(doc, "latitude"), numeric(doc, "longitude")
+    if ts is None or lat is None or lon is None or (lat == 0 and lon == 0):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return ts, lat, lon, to_number(doc.get("speed"))
+
+
+def _meters(lat1, lon1, lat2, lon2):
+    return point_distance_km(lat1, lon1, lat2, lon2) * 1000
+
+
+def _new_segment(kind: str, ts: int, lat: float, lon: float) -> dict:
+    return {
+        "kind": kind, "start_ts": ts, "end_ts": ts,
+        "start_lat": lat, "start_lon": lon, "end_lat": lat, "end_lon": lon,
+        "distance_km": 0.0, "max_speed": 0.0, "points": 1,
+    }
+
+
+def _extend(seg: dict, ts: int, lat: float, lon: float, km: float, speed: float):
+    seg["end_ts"], seg["end_lat"], seg["end_lon"] = ts, lat, lon
+    seg["distance_km"] += km
+    seg["max_speed"] = max(seg["max_speed"], speed)
+    seg["points"] += 1
+
+
+class TripSegmenter:
+    """
+    Trip/stop state machine for one device. feed() fixes in time order; it returns the
+    segments they closed. `state` holds only plain values (epoch ms, floats) so it can be
+    stored on the open segment and resumed by the next packet.
+    """
+
+    def __init__(self, state: dict | None = None):
+        self.state = state if state is not None else {}
+
+    @property
+    def segment(self) -> dict | None:
+        return self.state.get("segment")
+
+    @property
+    def last_ts(self) -> int | None:
+        last = self.state.get("last")
+        return last[0] if last else None
+
+    def _start(self, kind, ts, lat, lon):
+        self.state["segment"] = _new_segment(kind, ts, lat, lon)
+        self.state["anchor"] = [lat, lon]
+        self.state["candidate"] = None
+
+    def feed(self, ts: int, lat: float, lon: float, speed: float | None = None) -> list[dict]:
+        s = self.state
+        seg = s.get("segment")
+        if seg is None:
+            self._start("stop", ts, lat, lon)
+            s["last"] = [ts, lat, lon]
+            return []
+
+        last_ts, last_lat, last_lon = s["last"]
+        if ts <= last_ts:
+            return []
+
+        km = point_distance_km(last_lat, last_lon, lat, lon)
+        if speed is None:
+            speed = km * 3_600_000 / (ts - last_ts)
+
+        if ts - last_ts > MAX_GAP_SEC * 1000:
+            closed = self._after_gap(ts, lat, lon)
+        elif seg["kind"] == "stop":
+            closed = []
+            if speed >= MOVING_SPEED_KMH and _meters(*s["anchor"], lat, lon) > STOP_RADIUS_M:
+                closed.append(seg)
+                self._start("trip", last_ts, last_lat, last_lon)
+                _extend(self.segment, ts, lat, lon, km, speed)
+            else:
+                _extend(seg, ts, lat, lon, 0.0, 0.0)
+        else:
+            _extend(seg, ts, lat, lon, km, speed)
+            closed = self._watch_for_stop(ts, lat, lon, speed)
+
+        s["last"] = [ts, lat, lon]
+        return closed
+
+    def _watch_for_stop(self, ts, lat, lon, speed) -> list[dict]:
+        s = self.state
+        cand = s.get("candidate")
+        if cand is not None and _meters(cand["lat"], cand["lon"], lat, lon) > STOP_RADIUS_M:
+            cand = s["candidate"] = None
+        if cand is None:
+            if speed < MOVING_SPEED_KMH:
+                # the trip as it would end here, should the device stay put
+                s["candidate"] = {"ts": ts, "lat": lat, "lon": lon, "trip": dict(self.segment)}
+            return []
+        if ts - cand["ts"] < STOP_DWELL_SEC * 1000:
+            return []
+        return [self._confirm_stop()]
+
+    def _confirm_stop(self) -> dict:
+        """Cut the open trip at the candidate fix; everything after it becomes the stop."""
+        s = self.state
+        cand, seg = s["candidate"], s["segment"]
+        trip = cand["trip"]
+        stop = _new_segment("stop", cand["ts"], cand["lat"], cand["lon"])
+        stop.update(end_ts=seg["end_ts"], end_lat=seg["end_lat"], end_lon=seg["end_lon"], points=seg["points"] - trip["points"] + 1)
+        s["segment"] = stop
+        s["anchor"] = [cand["lat"], cand["lon"]]
+        s["candidate"] = None
+        return trip
+
+    def _after_gap(self, ts, lat, lon) -> list[dict]:
+        s = self.state
+        seg = s["segment"]
+        last_ts, last_lat, last_lon = s["last"]
+        if _meters(last_lat, last_lon, lat, lon) > STOP_RADIUS_M:
+            # moved while silent: the gap belongs to no segment
+            self._start("stop", ts, lat, lon)
+            return [seg]
+
+        if seg["kind"] == "stop":
+            _extend(seg, ts, lat, lon, 0.0, 0.0)
+            return []
+
+        # parked while silent
+        if s.get("candidate") is None:
+            s["candidate"] = {"ts": last_ts, "lat": last_lat, "lon": last_lon, "trip": dict(seg)}
+        _extend(seg, ts, lat, lon, 0.0, 0.0)
+        return [self._confirm_stop()]
+
+
+# -----------------------------
+# STORAGE
+# -----------------------------
+def _document(imei: str, seg: dict, now: datetime, state: dict | None = None) -> dict:
+    duration = (seg["end_ts"] - seg["start_ts"]) / 1000
+    return {
+        "imei": imei,
+        "kind": seg["kind"],
+        "start_ts": from_epoch_ms(seg["start_ts"]),
+        "end_ts": from_epoch_ms(seg["end_ts"]),
+        "start_lat": seg["start_lat"],
+        "start_lon": seg["start_lon"],
+        "end_lat": seg["end_lat"],
+        "end_lon": seg["end_lon"],
+        "distance_km": round(seg["distance_km"], 3),
+        "duration_sec": duration,
+        "max_speed": round(seg["max_speed"], 1),
+        "avg_speed": round(seg["distance_km"] * 3600 / duration, 1) if duration > 0 else 0.0,
+        "points": seg["points"],
+        "open": state is not None,
+        "state": state,
+        "updated_at": now,
+    }
+
+
+def _key(doc: dict) -> dict:
+    return {"imei": doc["imei"], "kind": doc["kind"], "start_ts": doc["start_ts"]}
+
+
+def _rebuilding(doc: dict, now: datetime) -> bool:
+    started = doc.get("rebuilding")
+    return started is not None and now - started < timedelta(seconds=TRIP_REBUILD_LOCK_SEC)
+
+
+def _not_rebuilding(now: datetime) -> dict:
+    return {"$or": [{"rebuilding": None}, {"rebuilding": {"$lt": now - timedelta(seconds=TRIP_REBUILD_LOCK_SEC)}}]}
+
+
+async def _write_closed(trips, imei: str, segments: list[dict], now: datetime):
+    ops = []
+    for seg in segments:
+        doc = _document(imei, seg, now)
+        ops.append(UpdateOne(_key(doc), {"$set": doc}, upsert=True))
+    try:
+        await trips.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # duplicate key = another writer upserted the same segment first
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def apply_packet(doc: dict):
+    """Change-stream handler: advance the device's open segment by one inserted packet."""
+    imei = doc.get("imei")
+    point = _point(doc)
+    if not imei or point is None:
+        return
+
+    db = get_db()
+    trips = db.get_collection(DeviceTrip)
+    for _ in range(2):
+        current = await trips.find_one({"imei": imei, "open": True}, {"state": 1, "rebuilding": 1})
+        if current is None or not _rebuilding(current, datetime.now()):
+            return await _advance(db, trips, imei, point, current)
+        # rebuild_imei reads this packet from raw telemetry before it releases the device
+        counted = await trips.update_one(
+            {"_id": current["_id"], "rebuilding": current["rebuilding"]}, {"$inc": {"skipped": 1}}
+        )
+        if counted.matched_count:
+            return
+        # the rebuild finished in between: apply the packet to the segment it left open
+
+
+async def _advance(db, trips, imei: str, point: tuple, current: dict | None):
+    segmenter = TripSegmenter(current.get("state") if current else None)
+
+    last_ts = segmenter.last_ts
+    if last_ts is not None and point[0] <= last_ts:
+        if point[0] < last_ts:
+            await mark_rebuild(db, imei, from_epoch_ms(point[0]))
+        return
+
+    closed = segmenter.feed(*point)
+    now = datetime.now()
+    open_doc = _document(imei, segmenter.segment, now, state=segmenter.state)
+    if current is None:
+        try:
+            await trips.insert_one(open_doc)
+        except DuplicateKeyError:
+            pass  # another replica opened the device's first segment
+        return
+
+    # only the replica that read the stored state applies the packet; the open document
+    # moves on to the next segment in the same write, so there is never a moment without one
+    guard = {"_id": current["_id"], "state.last.0": last_ts, **_not_rebuilding(now)}
+    done = await trips.replace_one(guard, open_doc)
+    if closed and done.matched_count:
+        await _write_closed(trips, imei, closed, now)
+
+
+async def mark_rebuild(db, imei: str, since: datetime):
+    """Queue one device for the trip_rebuild job."""
+    marks = db.get_collection(TripRebuild)
+    update = {"$min": {"since": since}, "$set": {"marked_at": datetime.now()}}
+    try:
+        await marks.update_one({"imei": imei}, update, upsert=True)
+    except DuplicateKeyError:
+        # another replica inserted the mark first
+        await marks.update_one({"imei": imei}, update)
+
+
+async def rebuild_marked(db, checkpoint):
+    """Scheduled job: rebuild every device marked at least TRIP_REBUILD_SETTLE_SEC ago."""
+    marks = db.get_collection(TripRebuild)
+    settled = datetime.now() - timedelta(seconds=TRIP_REBUILD_SETTLE_SEC)
+    while True:
+        batch = await marks.find({"marked_at": {"$lte": settled}}, sort=[("marked_at", 1)], limit=TRIP_REBUILD_BATCH).to_list(None)
+        if not batch:
+            return
+        for mark in batch:
+            written = await rebuild_imei(db, mark["imei"], mark["since"])
+            # a late packet that arrived during the rebuild moved marked_at: keep the mark
+            await marks.delete_one({"_id": mark["_id"], "marked_at": mark["marked_at"], "since": mark["since"]})
+            yield written, checkpoint
+
+
+TRIP_JOBS = {
+    "trip_rebuild": rebuild_marked,
+}
+
+
+async def _claim(trips, imei: str):
+    """Take the device's open document for a rebuild. Returns (its _id, the open segment's start)."""
+    update = {"$set": {"rebuilding": datetime.now(), "skipped": 0}, "$unset": {"kind": "", "start_ts": ""}}
+    try:
+        before = await trips.find_one_and_update({"imei": imei, "open": True}, update, {"start_ts": 1}, upsert=True)
+    except DuplicateKeyError:
+        # a live packet opened the device's first segment meanwhile
+        before = await trips.find_one_and_update({"imei": imei, "open": True}, update, {"start_ts": 1})
+    if before is None:
+        before = await trips.find_one({"imei": imei, "open": True}, {"_id": 1})
+    return before["_id"], before.get("start_ts")
+
+
+async def rebuild_imei(db, imei: str, since: datetime) -> int:
+    """
+    Re-segment one device from raw telemetry, restarting at the end of the last segment
+    that closed at or before `since` (idempotent). Returns the number of closed segments.
+    """
+    raw = analytics_collection(db)
+    trips = db.get_collection(DeviceTrip)
+    since = to_ist_naive(since)
+    lock_id, open_start = await _claim(trips, imei)
+
+    anchor = await trips.find_one(
+        {"imei": imei, "open": False, "end_ts": {"$lte": since}}, {"end_ts": 1}, sort=[("end_ts", -1)]
+    )
+    if anchor:
+        restart = anchor["end_ts"]
+    else:
+        first = await trips.find_one({"imei": imei, "open": False}, {"start_ts": 1}, sort=[("start_ts", 1)])
+        restart = min([since] + [ts for ts in (first and first["start_ts"], open_start) if ts])
+    await trips.delete_many({"imei": imei, "open": False, "start_ts": {"$gte": restart}})
+
+    segmenter = TripSegmenter()
+    pending, written, newest_id = [], 0, None
+    now = datetime.now()
+
+    async def feed(query):
+        nonlocal pending, written, newest_id
+        cursor = raw.find(query, TRIP_PROJECTION, sort=[("device_timestamp", 1)], batch_size=REBUILD_BATCH)
+        async for doc in cursor:
+            newest_id = doc["_id"] if newest_id is None else max(newest_id, doc["_id"])
+            point = _point(doc)
+            if point is None:
+                continue
+            last_ts = segmenter.last_ts
+            if last_ts is not None and point[0] < last_ts:
+                # inserted during the rebuild but older than what it already segmented
+                await mark_rebuild(db, imei, from_epoch_ms(point[0]))
+                continue
+            pending += segmenter.feed(*point)
+            if len(pending) >= INSERT_CHUNK:
+                await _write_closed(trips, imei, pending, now)
+                written += len(pending)
+                pending = []
+
+    await feed({"imei": imei, "device_timestamp": {"$gte": restart}})
+    while True:
+        lock = await trips.find_one({"_id": lock_id}, {"skipped": 1, "rebuilding": 1})
+        if lock is None or lock.get("rebuilding") is None:
+            # the lock expired and live packets took the device back
+            return written
+        seen = lock.get("skipped", 0)
+        # packets inserted while the rebuild ran (counted in `skipped` by apply_packet)
+        await feed({"imei": imei, "device_timestamp": {"$gte": restart}, **({"_id": {"$gt": newest_id}} if newest_id else {})})
+        if pending:
+            await _write_closed(trips, imei, pending, now)
+            written += len(pending)
+            pending = []
+
+        release = {"_id": lock_id, "skipped": seen}
+        if segmenter.segment is None:
+            done = await trips.delete_one(release)
+            released = done.deleted_count
+        else:
+            done = await trips.replace_one(release, _document(imei, segmenter.segment, now, state=segmenter.state))
+            released = done.matched_count
+        if released:
+            return written
+
+
+async def backfill(imeis=None, days: int = 7):
+    db = get_db()
+    since = to_ist_naive(datetime.now(timezone.utc)) - timedelta(days=days)
+
+    if not imeis:
+        imeis = await analytics_collection(db).distinct("imei", {"device_timestamp": {"$gte": since}})
+
+    total = 0
+    for imei in imeis:
+        if not imei:
+            continue
+        written = await rebuild_imei(db, imei, since)
+        total += written
+        Logger.get_instance().log_info({"message": f"device_trips backfill imei={imei} segments={written}"})
+    return total
+
+
+# -----------------------------
+# READS
+# -----------------------------
+async def device_trips(db, imei: str, start: datetime, end: datetime, kind: str | None = "trip", limit: int = MAX_TRIPS) -> list[dict]:
+    """Segments of `imei` overlapping [start, end), oldest first. kind None returns trips and stops."""
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+
+    trips = db.get_collection(DeviceTrip)
+    start, end = to_ist_naive(start), to_ist_naive(end)
+    base = {"imei": imei, **({"kind": kind} if kind else {})}
+    projection = {"_id": 0, "state": 0, "updated_at": 0}
+
+    # the segment already running at `start`, then everything starting inside the window
+    head = await trips.find_one({**base, "start_ts": {"$lt": start}}, projection, sort=[("start_ts", -1)])
+    rows = [head] if head and head["end_ts"] >= start else []
+    cursor = trips.find(
+        {**base, "start_ts": {"$gte": start, "$lt": end}}, projection, sort=[("start_ts", 1)], limit=limit
+    )
+    rows += [doc async for doc in cursor]
+    return rows[:limit]
@@ -0,0 +1,252 @@
+# app/services/UptimeService.py
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from app.models.AnalyticsData import analytics_collection
+from app.utils.timestamps import IST, to_epoch_ms, to_ist_naive
+
+"""
+Uptime engine: gaps, dropouts, the gap histogram and per-hour counts are computed in Mongo
+($setWindowFields/$shift, then two $group stages), so only one row per device comes back
+however many packets the window holds (a 30-day window of a 10 s device is ~260k packets).
+
+The expected sending interval is the device's own NormalSendingInterval, taken from the
+newest of its last INTERVAL_SCAN_DOCS config_or_misc packets that carries one; devices
+that never reported one (or reported 0, i.e. GPS sending disabled) are scored against
+EXPECTED_INTERVAL_SEC.
+"""
+
+EXPECTED_INTERVAL_SEC = 150     # normal sending interval assumed when the device reported none
+DROPOUT_GAP_SEC = 600           # a gap above 10 min counts as a dropout ...
+DROPOUT_INTERVALS = 4           # ... or above 4 expected intervals, for slow-reporting devices
+GAP_HISTOGRAM_EDGES_SEC = (180, 600, 1800, 3600)   # the gap score's thresholds
+MAX_WINDOW_HOURS = 24 * 30
+INTERVAL_SCAN_DOCS = 5          # newest config packets searched for NormalSendingInterval
+INTERVAL_CONCURRENCY = 32
+
+HOUR_MS = 3600 * 1000
+
+
+# -----------------------------
+# SCORING
+# -----------------------------
+def expected_packets(hours: int, interval_sec: int = EXPECTED_INTERVAL_SEC) -> int:
+    return int(hours * 3600 / interval_sec)
+
+
+def dropout_gap_sec(interval_sec: int = EXPECTED_INTERVAL_SEC) -> int:
+    return max(DROPOUT_GAP_SEC, DROPOUT_INTERVALS * interval_sec)
+
+
+def window_hours(hours: int) -> int:
+    return max(1, min(int(hours), MAX_WINDOW_HOURS))
+
+
+def score_uptime(received: int, expected: int, largest_gap: float, dropouts: int) -> float:
+    consistencyScore = (received / expected) * 100 if expected else 0
+    consistencyScore = min(100, max(0, consistencyScore))
+
+    # Gap score
+    if largest_gap <= 180:
+        gapScore = 100
+    elif largest_gap <= 600:
+        gapScore = 80
+    elif largest_gap <= 1800:
+        gapScore = 50
+    elif largest_gap <= 3600:
+        gapScore = 20
+    else:
+        gapScore = 0
+
+    # Dropout score
+    dropoutScore = max(0, 100 - (dropouts * 15))
+
+    # Final weighted score
+    score = (
+            consistencyScore * 0.5 +
+            gapScore * 0.3 +
+            dropoutScore * 0.2
+    )
+    return round(max(0, min(100, score)), 1)
+
+
+# -----------------------------
+# SERVER-SIDE GAP ANALYSIS
+# -----------------------------
+def _gap_bucket(i: int):
+    """1 when the packet's gap falls in histogram bucket i, i.e. (edge[i-1], edge[i]] ms."""
+    edges = [e * 1000 for e in GAP_HISTOGRAM_EDGES_SEC]
+    lower = {"$ne": ["$gap", None]} if i == 0 else {"$gt": ["$gap", edges[i - 1]]}
+    upper = {"$lte": ["$gap", edges[i]]} if i < len(edges) else True
+    return {"$cond": [{"$and": [lower, upper]}, 1, 0]}
+
+
+def uptime_pipeline(imeis: list[str], cutoff: datetime, dropout_ms: int, end: datetime | None = None):
+    """
+    One row per IMEI: received count, largest gap and dropout count (ms), gap histogram
+    counts h0..hN and per-hour packet counts since `cutoff`. Gaps come from
+    $setWindowFields/$shift (MongoDB 5.0+); sorting newest-first per device matches the
+    (imei 1, device_timestamp -1) index, so the window stage needs no in-memory sort.
+    """
+    start = to_ist_naive(cutoff)
+    buckets = {f"h{i}": _gap_bucket(i) for i in range(len(GAP_HISTOGRAM_EDGES_SEC) + 1)}
+    return [
+        {"$match": uptime_query(imeis, cutoff, end)},
+        {
+            "$setWindowFields": {
+                "partitionBy": "$imei",
+                "sortBy": {"device_timestamp": -1},
+                # the next row newest-first is the previous packet in time
+                "output": {"prev_ts": {"$shift": {"output": "$device_timestamp", "by": 1}}},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "imei": 1,
+                "slot": {"$floor": {"$divide": [{"$subtract": ["$device_timestamp", start]}, HOUR_MS]}},
+                "gap": {
+                    "$cond": [
+                        {"$eq": ["$prev_ts", None]},
+                        None,
+                        {"$subtract": ["$device_timestamp", "$prev_ts"]},
+                    ]
+                },
+            }
+        },
+        {
+            "$group": {
+                "_id": {"imei": "$imei", "slot": "$slot"},
+                "n": {"$sum": 1},
+                "largestGap": {"$max": "$gap"},
+                "dropouts": {"$sum": {"$cond": [{"$gt": ["$gap", dropout_ms]}, 1, 0]}},
+                **{name: {"$sum": expr} for name, expr in buckets.items()},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.imei",
+                "received": {"$sum": "$n"},
+                "largestGap": {"$max": "$largestGap"},
+                "dropouts": {"$sum": "$dropouts"},
+                **{name: {"$sum": f"${name}"} for name in buckets},
+                "perHour": {"$push": {"slot": "$_id.slot", "n": "$n"}},
+            }
+        },
+    ]
+
+
+def uptime_result(imei: str, row: dict | None, start_ms: int, hours: int, interval_sec: int = EXPECTED_INTERVAL_SEC) -> dict:
+    """API payload for one device from its uptime_pipeline row (None = no packets)."""
+    row = row or {}
+    received = int(row.get("received") or 0)
+    largest_gap = (row.get("largestGap") or 0) / 1000
+    dropouts = int(row.get("dropouts") or 0)
+    expected = expected_packets(hours, interval_sec)
+    per_hour_expected = 3600 / interval_sec
+
+    per_hour = [0] * hours
+    for entry in row.get("perHour") or ():
+        slot = int(entry["slot"])
+        if 0 <= slot < hours:
+            per_hour[slot] += int(entry["n"])
+
+    edges = (0, *GAP_HISTOGRAM_EDGES_SEC, None)
+    return {
+        "imei": imei,
+        "score": score_uptime(received, expected, largest_gap, dropouts) if received else 0,
+        "expectedPackets": expected,
+        "receivedPackets": received,
+        "largestGapSec": largest_gap,
+        "dropouts": dropouts,
+        "expectedIntervalSec": interval_sec,
+        "windowHours": hours,
+        "gapHistogram": [
+            {"minSec": edges[i], "maxSec": edges[i + 1], "count": int(row.get(f"h{i}") or 0)} for i in range(len(edges) - 1)
+        ],
+        "hourlyCoverage": [
+            {
+                "hour": datetime.fromtimestamp((start_ms + i * HOUR_MS) / 1000, IST).isoformat(),
+                "receivedPackets": n,
+                "coverage": round(min(1.0, n / per_hour_expected), 3),
+            }
+            for i, n in enumerate(per_hour)
+        ],
+    }
+
+
+# -----------------------------
+# QUERIES
+# -----------------------------
+def uptime_query(imeis: list[str], cutoff: datetime, end: datetime | None = None) -> dict:
+    window = {"$gte": to_ist_naive(cutoff)}
+    if end is not None:
+        window["$lt"] = to_ist_naive(end)
+    return {"imei": {"$in": imeis}, "device_timestamp": window}
+
+
+def interval_query(imei: str) -> dict:
+    """config_or_misc packets of one device, newest first over the (type, topic, device_timestamp) index."""
+    return {"type": "config_or_misc", "topic": f"{imei}/pub"}
+
+
+def _interval_sec(raw):
+    try:
+        sec = int(float(str(raw).strip()))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return sec if sec > 0 else None
+
+
+async def device_intervals(db, imeis: list[str]) -> dict:
+    """
+    imei -> reported normal sending interval in seconds (devices without a usable one are
+    absent). One bounded read of the newest INTERVAL_SCAN_DOCS config packets per device,
+    run concurrently; empty values are skipped here rather than in the query, so no read
+    walks a device's whole config history.
+    """
+    collection = analytics_collection(db)
+    gate = asyncio.Semaphore(INTERVAL_CONCURRENCY)
+
+    async def interval(imei):
+        async with gate:
+            docs = await collection.find(
+                interval_query(imei),
+                {"_id": 0, "raw_NormalSendingInterval": 1},
+                sort=[("device_timestamp", -1)],
+                limit=INTERVAL_SCAN_DOCS,
+            ).to_list(None)
+        raw = next((d["raw_NormalSendingInterval"] for d in docs if d.get("raw_NormalSendingInterval") not in (None, "")), None)
+        return imei, _interval_sec(raw)
+
+    rows = await asyncio.gather(*(interval(imei) for imei in dict.fromkeys(imeis)))
+    return {imei: sec for imei, sec in rows if sec}
+
+
+async def fleet_uptime(db, imeis: list[str], hours: int = 24, end: datetime | None = None):
+    """
+    Uptime report for every IMEI; IMEIs with no packets score 0. The window is the `hours`
+    before `end` (default now; naive values are IST). Devices are grouped by dropout
+    threshold and each group is one aggregation, so only per-device rows leave Mongo.
+    """
+    hours = window_hours(hours)
+    cutoff = (end or datetime.now(timezone.utc)) - timedelta(hours=hours)
+    start_ms = to_epoch_ms(cutoff)
+
+    intervals = await device_intervals(db, imeis)
+    interval_of = {imei: intervals.get(imei, EXPECTED_INTERVAL_SEC) for imei in imeis}
+    groups = defaultdict(list)
+    for imei, interval in interval_of.items():
+        groups[dropout_gap_sec(interval) * 1000].append(imei)
+
+    collection = analytics_collection(db)
+
+    async def run(dropout_ms, group):
+        cursor = collection.aggregate(uptime_pipeline(group, cutoff, dropout_ms, end), allowDiskUse=True)
+        return [row async for row in cursor]
+
+    stats = {}
+    for rows in await asyncio.gather(*(run(dropout_ms, group) for dropout_ms, group in groups.items())):
+        stats.update((row["_id"], row) for row in rows)
+
+    return [uptime_result(imei, stats.get(imei), start_ms, hours, interval_of[imei]) for imei in imeis]
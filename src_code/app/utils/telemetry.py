@@ -0,0 +1,103 @@
+# app/utils/telemetry.py
+import math
+
+"""
+Numeric telemetry fields and the v2 document shape.
+
+Devices send numbers as text: latitude/longitude/Battery/Signal are strings and the
+temperature only exists as raw_temperature ("31.5C"). Those fields are never rewritten;
+they are what the API returns. v2 packets (schema_version 2) add typed copies next to
+them (lat, lon, battery_level, signal_level, temperature, all null when the text does not
+parse) and the GeoJSON `location`, so the upgrade only ever adds fields and can be re-run.
+
+Readers take the typed copy of a v2 packet and only parse the text of packets that are
+not upgraded yet: numeric / temperature_of in Python (project numeric_projection), and
+numeric_expr inside aggregation pipelines.
+"""
+
+SCHEMA_VERSION = 2
+
+# device text field -> typed v2 field
+NUMERIC_FIELDS = {
+    "latitude": "lat",
+    "longitude": "lon",
+    "Battery": "battery_level",
+    "Signal": "signal_level",
+}
+
+
+def to_number(value):
+    """float for numbers and numeric text (v1), None for anything else (never NaN/inf)."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        value = float(value)
+    else:
+        try:
+            value = float(str(value).strip())
+        except ValueError:
+            return None
+    return value if math.isfinite(value) else None
+
+
+def parse_temperature(text):
+    """raw_temperature as the device sends it ("31.5C", "31.5 c") -> 31.5."""
+    if isinstance(text, str):
+        text = text.strip().rstrip("cC")
+    return to_number(text)
+
+
+def temperature_of(doc: dict):
+    if is_v2(doc) or "temperature" in doc:
+        return to_number(doc.get("temperature"))
+    return parse_temperature(doc.get("raw_temperature"))
+
+
+def numeric(doc: dict, field: str):
+    """Typed value of a device text field (a NUMERIC_FIELDS key): the v2 copy, else the text parsed."""
+    if is_v2(doc):
+        return doc.get(NUMERIC_FIELDS[field])
+    return to_number(doc.get(field))
+
+
+def numeric_projection(*fields) -> dict:
+    """Projection entries numeric() needs for `fields`: both shapes plus schema_version."""
+    projection = {"schema_version": 1}
+    for field in fields:
+        projection[field] = 1
+        projection[NUMERIC_FIELDS[field]] = 1
+    return projection
+
+
+def numeric_expr(field: str) -> dict:
+    """numeric() as an aggregation expression (null when the text does not parse)."""
+    return {"$cond": [
+        {"$eq": ["$schema_version", SCHEMA_VERSION]},
+        f"${NUMERIC_FIELDS[field]}",
+        {"$convert": {"input": f"${field}", "to": "double", "onError": None, "onNull": None}},
+    ]}
+
+
+def location_of(doc: dict) -> dict | None:
+    """GeoJSON point of a packet's fix, None without a usable one ((0, 0) is no GPS lock)."""
+    lat, lon = to_number(doc.get("latitude")), to_number(doc.get("longitude"))
+    if lat is None or lon is None or (lat == 0 and lon == 0):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def v2_fields(doc: dict) -> dict:
+    """The fields that turn a v1 packet into v2 ($set them, or merge before inserting)."""
+    fields = {typed: to_number(doc.get(text)) for text, typed in NUMERIC_FIELDS.items() if text in doc}
+    fields["temperature"] = temperature_of(doc)
+    location = doc.get("location") or location_of(doc)
+    if location:
+        fields["location"] = location
+    fields["schema_version"] = SCHEMA_VERSION
+    return fields
+
+
+def is_v2(doc: dict) -> bool:
+    return doc.get("schema_version") == SCHEMA_VERSION
@@ -0,0 +1,110 @@
+# app/utils/timestamps.py
+import numpy as np
+from functools import lru_cache
+from datetime import date, datetime, timedelta, timezone
+
+"""
+Timestamp normalization shared by the analytics services, resolvers and controllers.
+
+device_timestamp is stored as naive IST wall time. IST is a fixed +05:30 offset (no DST),
+so it is modelled as a fixed-offset tzinfo: converting to it is plain arithmetic instead of
+a zoneinfo transition lookup, and hour buckets can be computed on epoch milliseconds.
+
+Values that are already datetimes (what Mongo returns) never go through a parser. Strings
+go through datetime.fromisoformat (ISO 8601, C implementation); dateutil is only the
+fallback for the odd non-ISO string a device sent.
+"""
+
+IST_OFFSET_MS = 19800 * 1000
+IST = timezone(timedelta(milliseconds=IST_OFFSET_MS), "IST")
+
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+_MISSING = np.iinfo(np.int64).min
+
+
+@lru_cache(maxsize=1024)
+def _parse_text(text: str):
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    try:
+        from dateutil import parser
+        return parser.parse(text)
+    except (ValueError, OverflowError):
+        return None
+
+
+def parse_timestamp(value):
+    """datetime as-is, ISO-8601 (or other parseable) string -> datetime, anything else -> None."""
+    if isinstance(value, datetime):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    return _parse_text(value)
+
+
+def to_epoch_ms(value):
+    """Naive datetimes are stored as IST wall time (see device_timestamp)."""
+    if not isinstance(value, datetime):
+        value = parse_timestamp(value)
+        if value is None:
+            return None
+    if value.tzinfo is None:
+        return int((value - _EPOCH).total_seconds() * 1000) - IST_OFFSET_MS
+    return int(value.timestamp() * 1000)
+
+
+def from_epoch_ms(ts_ms):
+    """Inverse of to_epoch_ms: naive IST wall time."""
+    return _EPOCH + timedelta(milliseconds=int(ts_ms) + IST_OFFSET_MS)
+
+
+def to_ist_naive(value: datetime):
+    """Naive IST wall time, the form device_timestamp is stored and compared in."""
+    return from_epoch_ms(to_epoch_ms(value))
+
+
+def to_ist(value):
+    """Aware IST datetime; naive values are taken as IST wall time. None when unparseable."""
+    dt = parse_timestamp(value)
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=IST)
+    return dt.astimezone(IST)
+
+
+def iso_format(value):
+    """API rendering of a timestamp: ISO string, the raw value as text if it cannot be parsed."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    dt = parse_timestamp(value)
+    return dt.isoformat() if dt is not None else str(value)
+
+
+def epoch_ms_column(values):
+    """
+    Whole column -> (epoch ms int64 array, valid bool mask). A column of naive datetimes
+    (the stored form, with None for missing) is converted with integer timedelta arithmetic
+    straight into the array; anything else falls back to to_epoch_ms per value.
+    """
+    values = values if isinstance(values, list) else list(values)
+    try:
+        wall = np.fromiter(
+            ((v - _EPOCH) // _MS if v is not None else _MISSING for v in values), dtype=np.int64, count=len(values)
+        )
+    except TypeError:
+        # aware datetimes or strings in the column
+        converted = [to_epoch_ms(v) for v in values]
+        valid = np.fromiter((t is not None for t in converted), dtype=bool, count=len(converted))
+        ms = np.fromiter((t or 0 for t in converted), dtype=np.int64, count=len(converted))
+        return ms, valid
+
+    valid = wall != _MISSING
+    ms = wall - IST_OFFSET_MS
+    ms[~valid] = 0
+    return ms, valid
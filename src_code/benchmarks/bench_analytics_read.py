@@ -0,0 +1,117 @@
+# benchmarks/bench_analytics_read.py
+"""
+Rows/sec of the analytics read path, from BSON bytes off the wire to AnalyticsDataType:
+  odmantic  — decode full docs → AnalyticsData validation → rec.dict() → serialize() → type (pre-fast-path)
+  raw       — decode full-field projection → compiled field mapper → type (REST / all fields selected)
+  rawbson   — same as raw but decoded as RawBSONDocument (lazy; inflates on first key access)
+  projected — decode a 5-field dashboard projection → compiled mapper → type
+
+Run from src_code/ (imports the schema, so it needs the app .env):
+    python -m benchmarks.bench_analytics_read
+"""
+import time
+import random
+import bson
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from datetime import datetime, timedelta
+
+from app.models.AnalyticsData import AnalyticsData
+from app.utils.telemetry import v2_fields
+from app.graphql.AnalyticsDataSchema import AnalyticsDataType
+from app.controllers.AnalyticsDataController import serialize, projection_for, compile_serializer, SERIALIZE_FIELDS
+
+SIZES = (500, 10_000)
+DASHBOARD_FIELDS = ("imei", "latitude", "longitude", "speed", "timestamp")
+RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def make_docs(n, now):
+    """Packets shaped like production rows: typed fields plus the flattened raw_* copies.
+    Every other packet is upgraded to schema v2, which must not change what the API renders."""
+    docs = []
+    for i in range(n):
+        lat, lon = 28.6 + random.random() / 100, 77.2 + random.random() / 100
+        docs.append({
+            "_id": ObjectId(),
+            "topic": "862360073410007/pub", "imei": "862360073410007", "interval": 150, "Geoid": "0",
+            "packet": "N", "Alert": "0", "type": "normal",
+            "latitude": f"{lat:.6f}", "longitude": f"{lon:.6f}", "speed": random.randint(0, 80),
+            "Battery": "87", "Signal": "92",
+            "device_raw_timestamp": "251018120000", "device_timestamp": now - timedelta(seconds=30 * i),
+            "raw_packet": "N", "raw_imei": "862360073410007", "raw_Alert": "0", "raw_temperature": "38c",
+            "raw_body": "N,862360073410007,...", "raw_phonenum1": "9000000001", "raw_phonenum2": "9000000002",
+            "raw_controlroomnum": "9000000003", "raw_NormalSendingInterval": "150", "raw_SOSSendingInterval": "30",
+            "raw_NormalScanningInterval": "60", "raw_AirplaneInterval": "600", "raw_SpeedLimit": "80",
+            "raw_LowbatLimit": "15",
+        })
+        if i % 2:
+            docs[-1].update(v2_fields(docs[-1]))
+    return docs
+
+
+def wire(docs, projection=None):
+    """BSON payload as the server would send it for `projection`."""
+    if projection is None:
+        return b"".join(bson.encode(d) for d in docs)
+    keep = {k for k, v in projection.items() if v}
+    drop_id = projection.get("_id") == 0
+    return b"".join(
+        bson.encode({k: v for k, v in d.items() if k in keep or (k == "_id" and not drop_id)}) for d in docs
+    )
+
+
+def odmantic_path(payload):
+    return [AnalyticsDataType(**serialize(AnalyticsData.model_validate_doc(d))) for d in bson.decode_all(payload)]
+
+
+def mapper_path(fields, options=None):
+    to_row = compile_serializer(fields)
+
+    def run(payload):
+        docs = bson.decode_all(payload, options) if options else bson.decode_all(payload)
+        return [AnalyticsDataType(**to_row(d)) for d in docs]
+    return run
+
+
+def bench(fn, payload, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    random.seed(3)
+    now = datetime(2026, 1, 1, 12)
+    all_fields = tuple(SERIALIZE_FIELDS)
+
+    paths = [
+        ("odmantic", odmantic_path, None),
+        ("raw", mapper_path(all_fields), projection_for(all_fields)),
+        ("rawbson", mapper_path(all_fields, RAW_OPTIONS), projection_for(all_fields)),
+        ("projected", mapper_path(DASHBOARD_FIELDS), projection_for(DASHBOARD_FIELDS)),
+    ]
+
+    print(f"{'rows':>6} | {'path':<10} | {'bytes':>10} | {'ms':>8} | {'rows/s':>10} | {'vs odmantic':>11} | match")
+    for n in SIZES:
+        docs = make_docs(n, now)
+        baseline, reference = None, None
+        for name, fn, projection in paths:
+            payload = wire(docs, projection)
+            t, rows = bench(fn, payload)
+            if baseline is None:
+                baseline, reference = t, rows
+
+            # every path must agree with the ODMantic path on the fields it built
+            keys = DASHBOARD_FIELDS if name == "projected" else all_fields
+            match = all(getattr(a, k) == getattr(b, k) for a, b in zip(reference, rows) for k in keys)
+            print(f"{n:>6} | {name:<10} | {len(payload):>10,} | {t * 1000:>8.1f} | {n / t:>10,.0f} | {baseline / t:>10.1f}x | {match}")
+
+
+if __name__ == "__main__":
+    main()
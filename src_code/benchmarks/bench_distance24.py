@@ -0,0 +1,139 @@
+# benchmarks/bench_distance24.py
+"""
+Throughput of analyticsDistance24: legacy per-packet loop vs the NumPy trajectory engine.
+
+Run from src_code/:
+    python -m benchmarks.bench_distance24
+"""
+import time
+import random
+from dateutil import parser
+from zoneinfo import ZoneInfo
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import radians, sin, cos, atan2, sqrt
+
+from app.services.TrajectoryService import Trajectory, distance_buckets
+
+IST = ZoneInfo("Asia/Kolkata")
+SIZES = (1_000, 10_000, 100_000)
+
+
+def make_docs(n, now):
+    """Synthetic device walk over the last 24h: string lat/lon, naive IST device_timestamp, some repeats."""
+    step = 86400 / n
+    lat, lon = 28.6139, 77.2090
+    docs = []
+    for i in range(n):
+        if random.random() > 0.2:
+            lat += random.uniform(-0.0005, 0.0005)
+            lon += random.uniform(-0.0005, 0.0005)
+        ts = now - timedelta(seconds=86400 - i * step)
+        docs.append({"latitude": f"{lat:.6f}", "longitude": f"{lon:.6f}", "device_timestamp": ts.replace(tzinfo=None)})
+    return docs
+
+
+# -----------------------------
+# LEGACY LOOP (as shipped before the trajectory engine)
+# -----------------------------
+def parse_iso_to_ist(dt_str):
+    if not dt_str:
+        return None
+    try:
+        dt = parser.parse(str(dt_str))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=IST)
+        return dt.astimezone(IST)
+    except:
+        return None
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    try:
+        lat1 = float(lat1); lon1 = float(lon1)
+        lat2 = float(lat2); lon2 = float(lon2)
+    except:
+        return 0.0
+    R = 6371.0
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+    return 2 * R * atan2(sqrt(a), sqrt(1 - a))
+
+
+def legacy_buckets(docs, cutoff):
+    points = []
+    for r in docs:
+        dt = parse_iso_to_ist(r.get("device_timestamp"))
+        if not dt or dt < cutoff:
+            continue
+        points.append({"dt": dt, "lat": r.get("latitude"), "lon": r.get("longitude")})
+
+    points.sort(key=lambda x: x["dt"])
+
+    unique_pts = []
+    last = (None, None)
+    for p in points:
+        try:
+            latf, lonf = float(p["lat"]), float(p["lon"])
+        except:
+            unique_pts.append(p)
+            last = (p["lat"], p["lon"])
+            continue
+        if last == (latf, lonf):
+            continue
+        unique_pts.append(p)
+        last = (latf, lonf)
+
+    if len(unique_pts) < 2:
+        return []
+
+    buckets = defaultdict(float)
+    for i in range(1, len(unique_pts)):
+        a, b = unique_pts[i-1], unique_pts[i]
+        if not a["lat"] or not a["lon"] or not b["lat"] or not b["lon"]:
+            continue
+        buckets[b["dt"].replace(minute=0, second=0, microsecond=0)] += haversine_km(a["lat"], a["lon"], b["lat"], b["lon"])
+
+    out, running = [], 0.0
+    current = cutoff.replace(minute=0, second=0, microsecond=0)
+    for i in range(24):
+        slot = current + timedelta(hours=i + 1)
+        dist = round(buckets.get(slot, 0.0), 3)
+        running += dist
+        out.append({"hour": slot.strftime("%H:00"), "dateHour": slot.isoformat(), "distance": dist, "cumulative": round(running, 3)})
+    return out
+
+
+def engine_buckets(docs, cutoff):
+    return distance_buckets(Trajectory.from_documents(docs), cutoff)
+
+
+def bench(fn, docs, cutoff, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(docs, cutoff)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    random.seed(7)
+    now = datetime.now(IST)
+    cutoff = now - timedelta(hours=24)
+
+    print(f"{'points':>8} | {'legacy ms':>10} | {'engine ms':>10} | {'legacy pts/s':>13} | {'engine pts/s':>13} | {'speedup':>7} | match")
+    for n in SIZES:
+        docs = make_docs(n, now)
+        t_old, old = bench(legacy_buckets, docs, cutoff)
+        t_new, new = bench(engine_buckets, docs, cutoff)
+        match = len(old) == len(new) and all(
+            a["dateHour"] == b["dateHour"] and abs(a["distance"] - b["distance"]) <= 0.001 for a, b in zip(old, new)
+        )
+        print(f"{n:>8} | {t_old * 1000:>10.1f} | {t_new * 1000:>10.1f} | {n / t_old:>13,.0f} | {n / t_new:>13,.0f} | {t_old / t_new:>6.1f}x | {match}")
+
+
+if __name__ == "__main__":
+    main()
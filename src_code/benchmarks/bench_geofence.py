@@ -0,0 +1,65 @@
+# benchmarks/bench_geofence.py
+"""
+Ingest-path cost of the geofence engine: 10k devices with 3 fences each (5-point polygons
+of roughly 1 km around the device), fed 200k packets in arrival order, half of them near a
+fence. Measures GeofenceService.evaluate (prefilter + ray cast + state), without the
+Mongo write / broadcast that only transitions pay.
+
+Run from src_code/:
+    python -m benchmarks.bench_geofence
+"""
+import time
+import random
+from bson import ObjectId
+from datetime import datetime, timedelta
+
+from app.services import GeofenceService
+from app.services.GeofenceService import _compile, _install, evaluate
+
+DEVICES = 10_000
+FENCES_PER_DEVICE = 3
+PACKETS = 200_000
+
+
+def make_fences(now):
+    docs, homes = [], {}
+    for d in range(DEVICES):
+        imei = f"8623600{d:08d}"
+        lat, lon = 12 + random.random() * 16, 72 + random.random() * 14
+        homes[imei] = (lat, lon)
+        for n in range(FENCES_PER_DEVICE):
+            clat, clon = lat + n * 0.02, lon
+            ring = [(clat + 0.005 * dy, clon + 0.005 * dx) for dy, dx in ((1, 0), (0.3, 1), (-1, 0.6), (-1, -0.6), (0.3, -1))]
+            docs.append({
+                "_id": ObjectId(), "imei": imei, "geofence_number": str(n + 1), "geofence_id": f"G{n}",
+                "coordinates": [{"lat": a, "lng": b} for a, b in ring], "created_at": now - timedelta(days=1),
+            })
+    return docs, homes
+
+
+def main():
+    random.seed(5)
+    now = datetime.now()
+    docs, homes = make_fences(now)
+
+    started = time.perf_counter()
+    _install(_compile(docs))
+    print(f"compiled {len(GeofenceService.FENCES)} devices / {len(docs)} fences in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    imeis = list(homes)
+    packets = []
+    for i in range(PACKETS):
+        imei = random.choice(imeis)
+        lat, lon = homes[imei]
+        spread = 0.01 if i % 2 else 1.0
+        packets.append((imei, 1_700_000_000_000 + i * 10, lat + random.uniform(-spread, spread), lon + random.uniform(-spread, spread)))
+
+    started = time.perf_counter()
+    transitions = sum(len(evaluate(*p)) for p in packets)
+    elapsed = time.perf_counter() - started
+    print(f"{PACKETS} packets in {elapsed * 1000:.0f} ms: {PACKETS / elapsed:,.0f} packets/s, "
+          f"{elapsed / PACKETS * 1e6:.1f} us/packet, {transitions} transitions")
+
+
+if __name__ == "__main__":
+    main()
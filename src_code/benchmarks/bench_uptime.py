@@ -0,0 +1,82 @@
+# benchmarks/bench_uptime.py
+"""
+fleet_uptime against a seeded local mongod for a device reporting every 10 s, over
+1h / 24h / 7d / 30d windows (the 30-day window is ~260k packets). The gap analysis runs
+in the aggregation, so the time is Mongo's and only one row per device crosses the wire.
+
+Run from src_code/ (needs the app .env and a throwaway mongod):
+    python -m benchmarks.bench_uptime --uri mongodb://localhost:27017
+
+The seed database is dropped afterwards.
+"""
+import time
+import random
+import asyncio
+import argparse
+from odmantic import AIOEngine
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.models.IndexRegistry import ensure_indexes
+from app.models.AnalyticsData import analytics_collection
+from app.services.UptimeService import fleet_uptime
+
+DB_NAME = "synquerra_bench_uptime"
+IMEI = "862360073410000"
+INTERVAL_SEC = 10
+WINDOWS = (("1h", 1), ("24h", 24), ("7d", 24 * 7), ("30d", 24 * 30))
+
+
+def make_timestamps(hours, now):
+    """10 s cadence with jitter and occasional outages (0.05% chance of a 5-60 min silence)."""
+    out = []
+    ts = now - timedelta(hours=hours)
+    while ts < now:
+        out.append(ts)
+        step = INTERVAL_SEC + random.uniform(-1, 1)
+        if random.random() < 0.0005:
+            step += random.uniform(300, 3600)
+        ts += timedelta(seconds=step)
+    return out
+
+
+async def run(uri: str):
+    random.seed(7)
+    client = AsyncIOMotorClient(uri)
+    await client.drop_database(DB_NAME)
+    engine = AIOEngine(client=client, database=DB_NAME)
+    now = datetime.now().replace(microsecond=0)
+
+    try:
+        stamps = make_timestamps(WINDOWS[-1][1], now)
+        collection = analytics_collection(engine)
+        for i in range(0, len(stamps), 10_000):
+            await collection.insert_many([
+                {"imei": IMEI, "topic": f"{IMEI}/pub", "type": "normal", "device_timestamp": ts}
+                for ts in stamps[i:i + 10_000]
+            ])
+        await ensure_indexes(engine)
+
+        print(f"{'window':>6} | {'packets':>8} | {'query ms':>10} | {'packets/s':>12} | {'score':>5} | dropouts")
+        for label, hours in WINDOWS:
+            best, result = float("inf"), None
+            for _ in range(3):
+                started = time.perf_counter()
+                result = (await fleet_uptime(engine, [IMEI], hours=hours, end=now))[0]
+                best = min(best, time.perf_counter() - started)
+            packets = result["receivedPackets"]
+            print(f"{label:>6} | {packets:>8} | {best * 1000:>10.1f} | {packets / best:>12,.0f} | {result['score']:>5} | {result['dropouts']}")
+    finally:
+        await client.drop_database(DB_NAME)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fleet_uptime over 1h..30d windows")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    args = parser.parse_args()
+    asyncio.run(run(args.uri))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+# benchmarks/query_plan_guard.py
+"""
+Query-plan guard: explain() every hot resolver / controller query shape against a seeded
+local mongod and fail if any of them falls back to a COLLSCAN or a blocking in-memory SORT,
+or reads far more documents than it returns (totalDocsExamined / nReturned above
+--max-ratio). A few devices get days of history (--depth packets each) so per-device
+shapes that walk a device's whole history instead of a bounded window show up as a ratio.
+
+Shapes are built with the app's own query builders and run against the telemetry collection
+the app reads (analytics_collection), so ANALYTICS_TIMESERIES_ENABLED=true checks the
+time-series collection and its index set. There are no exemptions for sorts.
+
+Run from src_code/ (needs the app .env and a throwaway mongod):
+    python -m benchmarks.query_plan_guard --uri mongodb://localhost:27017 --docs 50000 --depth 20000
+
+The seed database is dropped afterwards unless --keep is given. Exit code is 1 on failure.
+"""
+import sys
+import random
+import asyncio
+import argparse
+from bson import SON, ObjectId
+from odmantic import AIOEngine
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.config import settings
+from app.helpers.CursorHelper import CursorHelper
+from app.models.IndexRegistry import ensure_indexes
+from app.models.AnalyticsData import analytics_collection
+from app.graphql.AnalyticsDataSchema import feed_query, filter_query
+from app.services.AnalyticsBatchService import distance24_query
+from app.services.AnalyticsExportService import export_query
+from app.services.AnalyticsTimeseriesService import ensure_timeseries_collection
+from app.services.UptimeService import interval_query, uptime_pipeline
+from app.services.MaterializationService import alert_pipeline
+from app.services.GeoService import near_pipeline, within_query
+from app.services.GridRollupService import grid_pipeline, heatmap_pipeline
+from app.services.EventService import TYPES as EVENT_TYPES, counts_pipeline
+
+DB_NAME = "synquerra_plan_guard"
+IMEIS = [f"86236007341{i:04d}" for i in range(200)]
+# Devices seeded with deep history; build_shapes() queries IMEIS[7]
+DEEP_IMEIS = IMEIS[:8]
+# Default bound on documents examined per document returned
+MAX_EXAMINED_RATIO = 10
+
+
+# -----------------------------
+# QUERY SHAPES (built with the query builders of the code paths they are named after)
+# -----------------------------
+def build_shapes(now: datetime, raw: str):
+    """`raw` is the telemetry collection the app reads (see analytics_collection)."""
+    imei = IMEIS[7]
+    since = now - timedelta(hours=24)
+    some_id = ObjectId()
+    cursor = CursorHelper.encode(now - timedelta(hours=6), ObjectId())
+
+    def page(query, field, descending=True):
+        return CursorHelper.page_query(query, field, cursor, descending)
+
+    def find(name, coll, filter, sort=None, limit=None, skip=None, **flags):
+        cmd = SON([("find", coll), ("filter", filter)])
+        if sort:
+            cmd["sort"] = SON(sort)
+        if skip:
+            cmd["skip"] = skip
+        if limit:
+            cmd["limit"] = limit
+        return {"name": name, "command": cmd, **flags}
+
+    def aggregate(name, coll, pipeline, **flags):
+        return {"name": name, "command": SON([("aggregate", coll), ("pipeline", pipeline), ("cursor", {})]), **flags}
+
+    ts_desc = [("device_timestamp", -1)]
+    ts_id_desc = CursorHelper.page_sort("device_timestamp")
+    ts_id_asc = CursorHelper.page_sort("device_timestamp", descending=False)
+
+    return [
+        # AnalyticsDataSchema.Query
+        find("analyticsData", raw, {}, ts_desc, 500),
+        find("analyticsDataById", raw, {"_id": some_id}, limit=1),
+        find("analyticsDataByTopic", raw, {"topic": f"{imei}/pub"}, ts_desc, 1000),
+        find("latestAnalyticsData", raw, {"imei": imei}, ts_desc, 1),
+        find("analyticsDataByFilter(imei,type)", raw, filter_query(imei, "normal"), ts_desc, 500),
+        find("analyticsDataByFilter(type)", raw, filter_query(None, "normal"), ts_desc, 500),
+        find("analyticsDataByImei", raw, {"imei": imei}, ts_desc, 500),
+        find("analyticsDataPaginated", raw, {}, ts_desc, 50, skip=100),
+        find("analyticsDataPage", raw, page(feed_query(None, None), "device_timestamp"), ts_id_desc, 101),
+        find("analyticsDataPage(imei)", raw, page(feed_query(imei, None), "device_timestamp"), ts_id_desc, 101),
+        find("analyticsDataPage(topic)", raw, page(feed_query(None, f"{imei}/pub"), "device_timestamp"), ts_id_desc, 101),
+        # AnalyticsBatchService.latest_by_imei: one of these per IMEI
+        find("latestAnalyticsData(Batch)", raw, {"imei": imei}, ts_desc, 1),
+        find("analyticsDistance24(Batch)", raw, distance24_query(IMEIS[:50], since), [("imei", 1), ("device_timestamp", -1)]),
+        find("analyticsDistance24(Batch) rollups", "distance_hourly",
+             {"imei": {"$in": IMEIS[:50]}, "hour": {"$gte": since, "$lt": now}}),
+        # AnalyticsBatchService.recent_by_imei: one of these per IMEI
+        find("analyticsHealth(Batch)", raw, {"imei": imei}, [("device_timestamp", -1)], 200),
+        aggregate("analyticsUptime", raw, uptime_pipeline([imei], since, 600_000),
+                  allow_ratio="one row per device"),
+        aggregate("fleetUptime", raw, uptime_pipeline(IMEIS[:50], since, 600_000),
+                  allow_ratio="one row per device"),
+        # UptimeService.device_intervals: one of these per IMEI
+        find("fleetUptime intervals", raw, interval_query(imei), ts_desc, 5),
+        find("dailyStats", "analytics_daily", {"imei": {"$in": IMEIS[:50]}, "day": {"$gte": since}}, [("imei", 1), ("day", -1)]),
+        find("trips(head)", "device_trips", {"imei": imei, "kind": "trip", "start_ts": {"$lt": since}}, [("start_ts", -1)], 1),
+        find("trips", "device_trips", {"imei": imei, "kind": "trip", "start_ts": {"$gte": since, "$lt": now}}, [("start_ts", 1)], 1000),
+        find("track", raw, {"imei": imei, "device_timestamp": {"$gte": since, "$lt": now}}, [("device_timestamp", 1)]),
+        aggregate("devicesNear", raw, near_pipeline(28.605, 77.205, 2.0, now - timedelta(minutes=10), 500),
+                  allow_ratio="latest fix per device over a 10 min window"),
+        find("packetsWithin", raw,
+             within_query([(28.60, 77.20), (28.60, 77.21), (28.61, 77.21), (28.61, 77.20)], since, now), ts_desc, 500),
+        find("packetsWithin(imei)", raw,
+             within_query([(28.60, 77.20), (28.60, 77.21), (28.61, 77.21), (28.61, 77.20)], since, now, imei), ts_desc, 500),
+        find("GeoService.backfill", raw, {"location": {"$exists": False}, "_id": {"$gt": some_id}}, [("_id", 1)], 5000),
+        find("TelemetrySchemaService.migrate", raw, {"schema_version": {"$ne": 2}, "_id": {"$gt": some_id}}, [("_id", 1)], 5000),
+
+        # Geofence engine
+        aggregate("GeofenceService.reload_all", "geofence_data", [
+            {"$sort": {"imei": 1, "created_at": -1}},
+            {"$group": {"_id": {"imei": "$imei", "number": "$geofence_number"}, "doc": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$doc"}},
+        ]),
+        find("GeofenceService.refresh_imei", "geofence_data", {"imei": imei}, [("created_at", 1)]),
+        find("geofenceDwell(cache)", "geofence_dwell_daily",
+             {"imei": imei, "geofence_id": {"$in": ["G0", "G1"]}, "day": {"$in": [since.replace(hour=0, minute=0, second=0)]}}),
+
+        # Trip segmentation
+        find("TripService.apply_packet", "device_trips", {"imei": imei, "open": True}, limit=1),
+        find("TripService.rebuild_imei(anchor)", "device_trips",
+             {"imei": imei, "open": False, "end_ts": {"$lte": since}}, [("end_ts", -1)], 1),
+        find("trip_rebuild", "trip_rebuilds", {"marked_at": {"$lte": now}}, [("marked_at", 1)], 100),
+        find("TripService.rebuild_imei(stream)", raw, {"imei": imei, "device_timestamp": {"$gte": since}}, [("device_timestamp", 1)]),
+        find("TripService.rebuild_imei(catch-up)", raw,
+             {"imei": imei, "device_timestamp": {"$gte": since}, "_id": {"$gt": some_id}}, [("device_timestamp", 1)]),
+
+        # Event extraction
+        find("events", "device_events", {"imei": imei, "type": {"$in": list(EVENT_TYPES)}, "start_ts": {"$gte": since, "$lt": now}},
+             [("start_ts", -1)], 200),
+        aggregate("eventCounts", "device_events",
+                  counts_pipeline({"type": {"$in": list(EVENT_TYPES)}, "start_ts": {"$gte": since, "$lt": now}}),
+                  allow_ratio="counts per type"),
+        find("EventService.apply_packet(resume)", "device_events", {"imei": imei, "open": True}),
+        find("EventService.rebuild_imei(running)", "device_events",
+             {"imei": imei, "start_ts": {"$lt": since}, "$or": [{"open": True}, {"end_ts": {"$gte": since}}]}, [("start_ts", 1)], 1),
+
+        # Scheduled materialization jobs
+        aggregate("daily_uptime", raw, uptime_pipeline(IMEIS[:50], since, 600_000, now),
+                  allow_ratio="one row per device"),
+        find("daily_distance", raw, {"imei": imei, "device_timestamp": {"$gte": since, "$lt": now}}, [("device_timestamp", 1)]),
+        aggregate("daily_alerts", raw, alert_pipeline(since), allow_ratio="counts per (imei, alert)"),
+        aggregate("geo_grid", raw, grid_pipeline(now.replace(minute=0, second=0) - timedelta(hours=1)),
+                  allow_ratio="one row per occupied cell"),
+        aggregate("gridHeatmap", "geo_grid_daily",
+                  heatmap_pipeline(2, since.replace(hour=0, minute=0, second=0), now, (28.5, 77.0, 28.8, 77.4)),
+                  allow_ratio="cells merged to the requested zoom"),
+
+        # REST controllers
+        find("AnalyticsDataController.all", raw, {}, allow_collscan="full dump endpoint"),
+        find("AnalyticsDataController.by_topic", raw, {"topic": f"{imei}/pub"}),
+        find("AnalyticsDataController.by_imei", raw, {"imei": imei}),
+        find("AnalyticsDataController.paginated", raw, {}, ts_desc, 50, skip=100),
+        find("AnalyticsExportController.export(imei,range)", raw, export_query(imei, None, since, now), ts_id_asc),
+        find("AnalyticsExportController.export(resume)", raw,
+             page(export_query(imei, None, None, None), "device_timestamp", descending=False), ts_id_asc),
+        find("CommandResponseController.get_config_or_misc", raw,
+             {"type": "config_or_misc", "topic": f"{imei}/pub"}, ts_desc, 1000),
+        find("CommandSentController.list_by_imei", "device_commands", {"imei": imei}, [("created_at", -1)], 1000),
+        find("CommandSentController.page_by_imei", "device_commands",
+             page({"imei": imei}, "created_at"), CursorHelper.page_sort("created_at"), 101),
+        find("CommandSentController.latest_by_imei", "device_commands", {"imei": imei}, [("created_at", -1)], 1),
+        find("GeofenceController.list_by_imei", "geofence_data", {"imei": imei}, [("created_at", 1)]),
+        find("GeofenceController.page_by_imei", "geofence_data",
+             page({"imei": imei}, "created_at", descending=False), CursorHelper.page_sort("created_at", descending=False), 101),
+        find("DeviceMasterController.list_devices", "devices_master", {}, allow_collscan="full device listing"),
+        find("DeviceMasterController.device_by_topic", "devices_master", {"topic": f"{imei}/pub"}, limit=1),
+
+        # Auth lookups
+        find("SigninController.login_user", "sq_users", {"EMAIL": "user7@example.com"}, limit=1),
+        find("SignupController.register_user", "sq_users",
+             {"$or": [{"EMAIL": "user7@example.com"}, {"MOBILE": "9000000007"}]}, limit=1),
+    ]
+
+
+# -----------------------------
+# SEEDING
+# -----------------------------
+async def seed(db, raw, docs: int, depth: int, now: datetime):
+    random.seed(11)
+    per_device = max(1, docs // len(IMEIS))
+    batch = []
+    for imei in IMEIS:
+        # 30 s spacing: --depth 20000 is about a week of one device's packets
+        for i in range(max(per_device, depth) if imei in DEEP_IMEIS else per_device):
+            lat, lon = 28.6 + random.random() / 100, 77.2 + random.random() / 100
+            batch.append({
+                "imei": imei,
+                "topic": f"{imei}/pub",
+                "type": "config_or_misc" if i % 20 == 0 else "normal",
+                "packet": "N",
+                "latitude": f"{lat:.6f}",
+                "longitude": f"{lon:.6f}",
+                "location": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+                "speed": random.randint(0, 60),
+                "device_timestamp": now - timedelta(seconds=30 * i),
+                "raw_phonenum1": "9000000001" if i % 3 else "",
+                "raw_phonenum2": "9000000002",
+                "raw_controlroomnum": "9000000003",
+                "raw_NormalSendingInterval": "60" if i % 40 == 0 else "",
+            })
+            if len(batch) >= 10_000:
+                await raw.insert_many(batch)
+                batch = []
+    if batch:
+        await raw.insert_many(batch)
+
+    await db.device_commands.insert_many([
+        {"imei": imei, "command": "QUERY_NORMAL", "payload": {}, "qos": 0, "status": "PUBLISHED", "created_at": now - timedelta(minutes=i)}
+        for imei in IMEIS for i in range(10)
+    ])
+    await db.geofence_data.insert_many([
+        {"imei": imei, "geofence_number": "1", "geofence_id": f"G{i}", "coordinates": [], "created_at": now - timedelta(days=i)}
+        for imei in IMEIS for i in range(3)
+    ])
+    await db.devices_master.insert_many([{"topic": f"{imei}/pub", "imei": imei} for imei in IMEIS])
+    await db.sq_users.insert_many([
+        {"UNIQUE_ID": f"SQ_{i}", "EMAIL": f"user{i}@example.com", "MOBILE": f"90000000{i:02d}"} for i in range(100)
+    ])
+
+
+# -----------------------------
+# EXPLAIN ANALYSIS
+# -----------------------------
+def _walk(node, found):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and isinstance(value, str):
+                found.append(value)
+            _walk(value, found)
+    elif isinstance(node, list):
+        for item in node:
+            _walk(item, found)
+
+
+def _first(node, key):
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        for value in node.values():
+            hit = _first(value, key)
+            if hit is not None:
+                return hit
+    elif isinstance(node, list):
+        for item in node:
+            hit = _first(item, key)
+            if hit is not None:
+                return hit
+    return None
+
+
+def analyse(explain: dict):
+    stages = []
+    _walk(_first(explain, "queryPlanner") or explain, stages)
+
+    # Aggregation stages that were not pushed down into the query layer
+    pipeline_sort = any(isinstance(s, dict) and "$sort" in s for s in explain.get("stages", []))
+
+    stats = _first(explain, "executionStats") or {}
+    # For a pipeline the query layer's nReturned counts documents handed to the first
+    # aggregation stage; what the shape actually returns is the last stage's nReturned.
+    stage_returns = [s["nReturned"] for s in explain.get("stages", []) if isinstance(s, dict) and "nReturned" in s]
+    returned = stage_returns[-1] if stage_returns else stats.get("nReturned")
+    return {
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "blocking_sort": "SORT" in stages or pipeline_sort,
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": returned,
+    }
+
+
+async def run(uri: str, docs: int, depth: int, max_ratio: float, keep: bool):
+    client = AsyncIOMotorClient(uri)
+    await client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+    now = datetime.now().replace(microsecond=0)
+
+    try:
+        engine = AIOEngine(client=client, database=DB_NAME)
+        if settings.ANALYTICS_TIMESERIES_ENABLED:
+            await ensure_timeseries_collection(engine)
+        raw = analytics_collection(engine)
+        await seed(db, raw, docs, depth, now)
+        await ensure_indexes(engine)
+
+        failures = 0
+        print(f"{'shape':<48} {'plan':<34} {'examined':>9} {'returned':>9} {'ratio':>7}  sort   result")
+        for shape in build_shapes(now, raw.name):
+            explain = await db.command(SON([("explain", shape["command"]), ("verbosity", "executionStats")]))
+            r = analyse(explain)
+
+            ratio = (r["docs_examined"] or 0) / max(r["returned"] or 0, 1)
+            allowed = shape.get("allow_collscan") or shape.get("allow_ratio")
+            problems = []
+            if r["collscan"] and not shape.get("allow_collscan"):
+                problems.append("COLLSCAN")
+            if r["blocking_sort"]:
+                problems.append("BLOCKING SORT")
+            if ratio > max_ratio and not allowed:
+                problems.append(f"EXAMINED x{ratio:.0f}")
+
+            if not problems:
+                verdict = "ok" if not allowed else f"ok (allowed: {allowed})"
+            else:
+                verdict = f"FAIL {'+'.join(problems)}"
+                failures += 1
+
+            plan = ">".join(dict.fromkeys(r["stages"]))[:34]
+            print(f"{shape['name']:<48} {plan:<34} {str(r['docs_examined']):>9} {str(r['returned']):>9} {ratio:>7.1f}  "
+                  f"{'mem ' if r['blocking_sort'] else 'idx '}  {verdict}")
+
+        print(f"\n{failures} failing shape(s)")
+        return failures
+    finally:
+        if not keep:
+            await client.drop_database(DB_NAME)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail on COLLSCAN / blocking SORT / examined-per-returned blowups for hot query shapes")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--docs", type=int, default=50_000, help="telemetry documents to seed, spread over all devices")
+    parser.add_argument("--depth", type=int, default=20_000, help="packets of history for each of the deep devices")
+    parser.add_argument("--max-ratio", type=float, default=MAX_EXAMINED_RATIO, help="max docs examined per doc returned")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args.uri, args.docs, args.depth, args.max_ratio, args.keep))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()